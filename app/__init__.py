@@ -12,6 +12,11 @@ from .services.ssh_service import SSHService
 from .services.crypto_service import CryptoService
 from .services.api_service import APIService
 from .services.data_manager_service import DataManagerService
+from .services.fleet_service import FleetCollector
+from .services.metrics_store import MetricsStore
+from .services.monitoring_hub import MonitoringHub
+from .services.result_cache import parse_ttls
+from .services.collection_scheduler import CollectionScheduler
 
 def get_translations_path() -> str:
     """Возвращает путь к каталогу переводов с учётом упакованного приложения (PyInstaller)."""
@@ -246,7 +251,45 @@ def register_services(app):
     import logging
     logger = logging.getLogger(__name__)
     
-    registry.register('ssh', SSHService())
+    SSHService.configure_pool(
+        max_size=app.config.get('SSH_POOL_MAX_SIZE'),
+        idle_ttl=app.config.get('SSH_POOL_IDLE_TTL'),
+        max_sessions=app.config.get('SSH_MAX_SESSIONS'),
+        capabilities_ttl=app.config.get('SSH_CAPABILITIES_TTL'),
+        facts_ttl=app.config.get('SSH_FACTS_TTL'),
+    )
+    SSHService.configure_shell_sessions(enabled=app.config.get('SSH_SHELL_SESSIONS'))
+    SSHService.configure_streams(
+        enabled=app.config.get('METRICS_STREAM_ENABLED'),
+        interval=app.config.get('METRICS_STREAM_INTERVAL'),
+        idle_timeout=app.config.get('METRICS_STREAM_IDLE_TIMEOUT'),
+    )
+    SSHService.configure_result_cache(
+        enabled=app.config.get('COLLECTOR_CACHE_ENABLED'),
+        ttls=parse_ttls(app.config.get('COLLECTOR_CACHE_TTLS')),
+    )
+    # История метрик серверов хранится локально в APP_DATA_DIR
+    metrics_dir = (
+        os.path.join(app.config['APP_DATA_DIR'], 'metrics')
+        if app.config.get('APP_DATA_DIR') else None
+    )
+    metrics_store = MetricsStore(metrics_dir)
+    registry.register('metrics_store', metrics_store)
+    ssh_service = SSHService(metrics_store=metrics_store)
+    registry.register('ssh', ssh_service)
+    registry.register('fleet', FleetCollector(
+        ssh_service,
+        max_concurrency=app.config.get('FLEET_MAX_CONCURRENCY', 16),
+        timeout=app.config.get('FLEET_HOST_TIMEOUT', 15),
+        deadline=app.config.get('FLEET_DEADLINE', 60),
+    ))
+    registry.register('monitoring_hub', MonitoringHub())
+    registry.register('scheduler', CollectionScheduler(
+        ssh_service,
+        intervals=parse_ttls(app.config.get('SCHEDULER_INTERVALS')),
+        max_workers=app.config.get('SCHEDULER_MAX_WORKERS', 4),
+        idle_timeout=app.config.get('SCHEDULER_IDLE_TIMEOUT', 600),
+    ))
     registry.register('crypto', CryptoService())
     registry.register('api', APIService())
     
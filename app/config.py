@@ -137,6 +137,39 @@ class Config:
     UPLOAD_FOLDER = os.path.join(APP_DATA_DIR, 'uploads')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', '16777216'))  # 16MB
     
+    # Параллельный опрос парка серверов (/api/fleet/stats)
+    FLEET_MAX_CONCURRENCY = int(os.getenv('FLEET_MAX_CONCURRENCY', '16'))
+    FLEET_HOST_TIMEOUT = int(os.getenv('FLEET_HOST_TIMEOUT', '15'))
+    FLEET_DEADLINE = int(os.getenv('FLEET_DEADLINE', '60'))  # общий предел /api/fleet/stream
+    
+    # Пул SSH-подключений: максимум соединений и время простоя до закрытия (сек)
+    SSH_POOL_MAX_SIZE = int(os.getenv('SSH_POOL_MAX_SIZE', '32'))
+    SSH_POOL_IDLE_TTL = int(os.getenv('SSH_POOL_IDLE_TTL', '600'))
+    # Одновременных каналов на подключение (держать ниже MaxSessions sshd, по умолчанию 10)
+    SSH_MAX_SESSIONS = int(os.getenv('SSH_MAX_SESSIONS', '8'))
+    # Короткие пробы через постоянную shell-сессию хоста вместо канала на команду
+    SSH_SHELL_SESSIONS = os.getenv('SSH_SHELL_SESSIONS', 'false').lower() == 'true'
+    # Через сколько секунд заново определять утилиты хоста (ss/netstat, vnstat, docker, ufw, ...)
+    SSH_CAPABILITIES_TTL = int(os.getenv('SSH_CAPABILITIES_TTL', '3600'))
+    # Предельный возраст фактов хоста (ОС, ядро, адреса); перезагрузка сбрасывает раньше
+    SSH_FACTS_TTL = int(os.getenv('SSH_FACTS_TTL', '86400'))
+    
+    # Поток метрик: один долгоживущий exec на открытый в мониторинге хост
+    METRICS_STREAM_ENABLED = os.getenv('METRICS_STREAM_ENABLED', 'true').lower() == 'true'
+    METRICS_STREAM_INTERVAL = int(os.getenv('METRICS_STREAM_INTERVAL', '5'))
+    METRICS_STREAM_IDLE_TIMEOUT = int(os.getenv('METRICS_STREAM_IDLE_TIMEOUT', '600'))
+    
+    # Кэш результатов SSH-коллекторов (TTL по умолчанию — SSHService._COLLECTOR_TTLS);
+    # переопределение TTL: "network_stats=5,security_events=60" (0 — без кэша)
+    COLLECTOR_CACHE_ENABLED = os.getenv('COLLECTOR_CACHE_ENABLED', 'true').lower() == 'true'
+    COLLECTOR_CACHE_TTLS = os.getenv('COLLECTOR_CACHE_TTLS', '')
+    
+    # Фоновый сбор статистики открытых в интерфейсе серверов: размер пула,
+    # простой до снятия задания (сек) и интервалы коллекторов "network_stats=15,..."
+    SCHEDULER_MAX_WORKERS = int(os.getenv('SCHEDULER_MAX_WORKERS', '4'))
+    SCHEDULER_IDLE_TIMEOUT = int(os.getenv('SCHEDULER_IDLE_TIMEOUT', '600'))
+    SCHEDULER_INTERVALS = os.getenv('SCHEDULER_INTERVALS', '')
+    
     # Настройки логирования
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     # Используем правильный путь для логов в зависимости от режима
@@ -172,6 +205,8 @@ class TestingConfig(Config):
     # Используем временные файлы для тестов
     DATA_DIR = 'test_data'
     SERVERS_FILE = 'test_servers.json.enc'
+    # Кэш классовый: тесты SSHService ждут реального вызова на каждый опрос
+    COLLECTOR_CACHE_ENABLED = False
     
 config_by_name = {
     'development': DevelopmentConfig,
@@ -4,6 +4,7 @@ from datetime import datetime
 import json
 import logging
 import os
+import re
 from ..services import registry
 from ..utils.decorators import require_auth, require_pin, validate_json, handle_errors
 from ..utils.validators import Validators
@@ -16,6 +17,9 @@ logger = logging.getLogger(__name__)
 # Создать лимитер (макс 10 запросов в минуту на сервер)
 rate_limiter = RateLimiter(max_requests=10, time_window=60)
 
+# Через сколько секунд повторить запрос, если первый сбор ещё идёт
+SNAPSHOT_RETRY_AFTER = 5
+
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 # PIN endpoints (без /api префикса)
@@ -316,10 +320,10 @@ def get_server_status(server_id):
 def get_server_stats(server_id):
     """Получение статистики сервера через SSH"""
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
         
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
         
         # Получаем данные сервера
@@ -334,6 +338,8 @@ def get_server_stats(server_id):
         
         # Получаем timeout из параметров запроса
         timeout = int(request.args.get('timeout', 30))
+        # batched=0 — прежний последовательный сбор (команда на раздел)
+        batched = request.args.get('batched', '1') != '0'
         
         # Получаем SSH credentials из правильной структуры
         ssh_creds = server.get('ssh_credentials', {})
@@ -355,19 +361,25 @@ def get_server_stats(server_id):
                 'error': 'SSH password not available. Please edit server and set SSH credentials.'
             }), 400
         
-        # Получаем статистику через SSH
-        stats = ssh_service.get_server_stats(
-            ip=server.get('ip_address', server.get('ip', '')),
-            user=ssh_user,
-            password=ssh_password,
-            port=ssh_port,  # Передаем SSH порт
-            timeout=timeout
+        # Статистику собирает планировщик в фоне; отдаём последний снимок
+        # (первый запрос ждёт первого сбора не дольше timeout). timeout — и
+        # дедлайн самого сбора: разделы, не успевшие за свой бюджет,
+        # приходят в stats.timed_out, остальные отдаются
+        creds = {
+            'ip': server.get('ip_address', server.get('ip', '')),
+            'user': ssh_user,
+            'password': ssh_password,
+            'port': ssh_port
+        }
+        snapshot = scheduler.request(
+            server_id, 'server_stats', creds, params={'batched': batched},
+            wait=timeout, timeout=timeout
         )
-        
-        return jsonify({
-            'success': True,
-            'stats': stats
-        })
+        # facts=0 — у клиента уже есть факты хоста (ОС, ядро, адреса): только метрики
+        if request.args.get('facts') == '0' and snapshot and not snapshot['error']:
+            from app.services.host_facts import volatile_stats
+            snapshot = dict(snapshot, data=volatile_stats(snapshot['data']))
+        return _snapshot_response(snapshot, field='stats')
         
     except Exception as e:
         logger.error(f"Error getting server stats {server_id}: {str(e)}")
@@ -387,6 +399,64 @@ def get_server_stats(server_id):
             'error': error_message
         }), 500
 
+@api_bp.route('/server/<server_id>/stats/stream', methods=['GET'])
+@require_auth
+@require_pin
+def stream_server_stats(server_id):
+    """Статистика сервера NDJSON-потоком: строка на поле по мере выполнения разделов"""
+    from flask import Response, stream_with_context
+    
+    try:
+        ssh_service = registry.get('ssh')
+        data_manager = registry.get('data_manager')
+        scheduler = registry.get('scheduler')
+        
+        if not ssh_service or not data_manager:
+            raise APIError('Required services not available')
+        
+        server, creds = _get_server_ssh_credentials(server_id, data_manager)
+        
+        if not server or not creds:
+            return jsonify({
+                'success': False,
+                'error': f'Server {server_id} not found or credentials invalid'
+            }), 404
+        
+        timeout = request.args.get('timeout', 30, type=int)
+        
+        def generate():
+            stats = {}
+            try:
+                for item in ssh_service.stream_server_stats(timeout=timeout, **creds):
+                    if item.get('done'):
+                        stats['timed_out'] = item['timed_out']
+                        stats['facts_id'] = item['facts_id']
+                    else:
+                        stats[item['section']] = item['data']
+                    yield json.dumps(item, ensure_ascii=False) + '\n'
+            except Exception as e:
+                logger.error(f"Error streaming stats for server {server_id}: {str(e)}")
+                yield json.dumps({'success': False, 'error': str(e)}, ensure_ascii=False) + '\n'
+                return
+            # Собранное — снимок планировщика: следующие обновления модалки без SSH
+            if scheduler:
+                scheduler.offer(
+                    server_id, 'server_stats', creds, stats,
+                    params={'batched': True}, timeout=timeout
+                )
+        
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error streaming stats for server {server_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @api_bp.route('/snapshot/save', methods=['POST'])
 @require_auth
 @require_pin
@@ -519,15 +589,8 @@ def test_speed():
         }), 500
 
 # Monitoring Endpoints
-def _get_server_ssh_credentials(server_id, data_manager):
-    """Helper: Получить SSH credentials с расшифровкой пароля"""
-    from flask import current_app
-    servers = data_manager.load_servers(current_app.config)
-    server = next((s for s in servers if str(s.get('id')) == str(server_id)), None)
-    
-    if not server:
-        return None, None
-    
+def _resolve_ssh_credentials(server, data_manager):
+    """Helper: SSH credentials сервера с расшифровкой пароля (None при ошибке)"""
     ssh_creds = server.get('ssh_credentials', {})
     password = ssh_creds.get('password_decrypted', '')
     
@@ -536,16 +599,153 @@ def _get_server_ssh_credentials(server_id, data_manager):
         try:
             password = data_manager.decrypt_data(ssh_creds['password'])
         except Exception as e:
-            logger.error(f"Failed to decrypt password for server {server_id}: {e}")
-            return None, None
+            logger.error(f"Failed to decrypt password for server {server.get('id')}: {e}")
+            return None
     
-    return server, {
+    return {
         'ip': server.get('ip_address'),
         'user': ssh_creds.get('user', 'root'),
         'password': password,
         'port': ssh_creds.get('port', 22)
     }
 
+def _get_server_ssh_credentials(server_id, data_manager):
+    """Helper: Получить SSH credentials с расшифровкой пароля"""
+    from flask import current_app
+    servers = data_manager.load_servers(current_app.config)
+    server = next((s for s in servers if str(s.get('id')) == str(server_id)), None)
+    
+    if not server:
+        return None, None
+    
+    creds = _resolve_ssh_credentials(server, data_manager)
+    if not creds:
+        return None, None
+    
+    return server, creds
+
+def _get_fleet_targets(data_manager):
+    """Helper: цели опроса для всех серверов (сервер без пароля — с полем error)"""
+    from flask import current_app
+    targets = []
+    for server in data_manager.load_servers(current_app.config):
+        creds = _resolve_ssh_credentials(server, data_manager) or {}
+        target = {
+            'id': server.get('id'),
+            'name': server.get('name', ''),
+            'ip': server.get('ip_address', ''),
+        }
+        if creds.get('password') and creds.get('ip'):
+            target.update(creds)
+        else:
+            target['error'] = 'SSH credentials not available'
+        targets.append(target)
+    return targets
+
+def _snapshot_response(snapshot, field='data'):
+    """Helper: JSON-ответ из снимка планировщика (данные + возраст снимка)
+
+    Пока первого снимка нет, отвечает 202 с Retry-After: сбор не упал, а
+    ещё идёт, и клиент повторяет запрос.
+    """
+    if snapshot is None:
+        response = jsonify({
+            'success': False,
+            'pending': True,
+            'error': 'Data collection is still in progress, try again shortly',
+            'retry_after': SNAPSHOT_RETRY_AFTER
+        })
+        response.status_code = 202
+        response.headers['Retry-After'] = str(SNAPSHOT_RETRY_AFTER)
+        return response
+    if snapshot['error']:
+        # str(APIError) пуст — текст ошибки сбора отдаём напрямую
+        return jsonify({
+            'success': False,
+            'error': snapshot['error'],
+            'age': snapshot['age']
+        }), 500
+    return jsonify({
+        'success': True,
+        field: snapshot['data'],
+        'age': snapshot['age'],
+        'collected_at': snapshot['collected_at']
+    })
+
+@api_bp.route('/fleet/stats', methods=['GET'])
+@require_auth
+@require_pin
+def get_fleet_stats():
+    """Статистика всех серверов парка, собранная параллельно"""
+    try:
+        fleet = registry.get('fleet')
+        data_manager = registry.get('data_manager')
+        
+        if not fleet or not data_manager:
+            raise APIError('Required services not available')
+        
+        concurrency = request.args.get('concurrency', type=int)
+        timeout = request.args.get('timeout', type=int)
+        
+        result = fleet.collect(
+            _get_fleet_targets(data_manager),
+            max_concurrency=concurrency,
+            timeout=timeout
+        )
+        
+        return jsonify({
+            'success': True,
+            'servers': result['servers'],
+            'summary': result['summary']
+        })
+        
+    except Exception as e:
+        logger.error(f"Error collecting fleet stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/fleet/stream', methods=['GET'])
+@require_auth
+@require_pin
+def stream_fleet_stats():
+    """Обзор парка NDJSON-потоком: строка на сервер по мере ответа, в конце сводка"""
+    from flask import Response, stream_with_context
+    
+    try:
+        fleet = registry.get('fleet')
+        data_manager = registry.get('data_manager')
+        
+        if not fleet or not data_manager:
+            raise APIError('Required services not available')
+        
+        targets = _get_fleet_targets(data_manager)
+        concurrency = request.args.get('concurrency', type=int)
+        timeout = request.args.get('timeout', type=int)
+        deadline = request.args.get('deadline', type=int)
+        
+        def generate():
+            for item in fleet.stream(
+                targets,
+                max_concurrency=concurrency,
+                timeout=timeout,
+                deadline=deadline
+            ):
+                yield json.dumps(item, ensure_ascii=False) + '\n'
+        
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error streaming fleet stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @api_bp.route('/monitoring/<server_id>/network-stats', methods=['GET'])
 @require_auth
 @require_pin
@@ -559,10 +759,10 @@ def get_network_stats(server_id):
         }), 429
     
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
         
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
         
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -573,18 +773,8 @@ def get_network_stats(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
         
-        stats = ssh_service.get_network_stats(
-            ip=creds['ip'],
-            user=creds['user'],
-            password=creds['password'],
-            port=creds['port'],
-            timeout=30
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': stats
-        })
+        snapshot = scheduler.request(server_id, 'network_stats', creds, wait=30)
+        return _snapshot_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error getting network stats for server {server_id}: {str(e)}")
@@ -606,10 +796,10 @@ def get_firewall_stats(server_id):
         }), 429
     
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
         
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
         
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -620,18 +810,8 @@ def get_firewall_stats(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
         
-        stats = ssh_service.get_firewall_stats(
-            ip=creds['ip'],
-            user=creds['user'],
-            password=creds['password'],
-            port=creds['port'],
-            timeout=30
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': stats
-        })
+        snapshot = scheduler.request(server_id, 'firewall_stats', creds, wait=30)
+        return _snapshot_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error getting firewall stats for server {server_id}: {str(e)}")
@@ -653,10 +833,10 @@ def get_services_stats(server_id):
         }), 429
     
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
         
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
         
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -667,18 +847,8 @@ def get_services_stats(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
         
-        stats = ssh_service.get_services_stats(
-            ip=creds['ip'],
-            user=creds['user'],
-            password=creds['password'],
-            port=creds['port'],
-            timeout=30
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': stats
-        })
+        snapshot = scheduler.request(server_id, 'services_stats', creds, wait=30)
+        return _snapshot_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error getting services stats for server {server_id}: {str(e)}")
@@ -699,10 +869,10 @@ def get_reticulum_status(server_id):
         }), 429
 
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
 
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
 
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -713,18 +883,8 @@ def get_reticulum_status(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
 
-        data = ssh_service.get_reticulum_status(
-            ip=creds['ip'],
-            user=creds['user'],
-            password=creds['password'],
-            port=creds['port'],
-            timeout=30
-        )
-
-        return jsonify({
-            'success': True,
-            'data': data
-        })
+        snapshot = scheduler.request(server_id, 'reticulum_status', creds, wait=30)
+        return _snapshot_response(snapshot)
 
     except Exception as e:
         logger.error(f"Error getting reticulum status for server {server_id}: {str(e)}")
@@ -745,10 +905,10 @@ def get_webpanels(server_id):
         }), 429
 
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
 
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
 
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -759,18 +919,8 @@ def get_webpanels(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
 
-        data = ssh_service.get_webpanels_status(
-            ip=creds['ip'],
-            user=creds['user'],
-            password=creds['password'],
-            port=creds['port'],
-            timeout=30
-        )
-
-        return jsonify({
-            'success': True,
-            'data': data
-        })
+        snapshot = scheduler.request(server_id, 'webpanels_status', creds, wait=30)
+        return _snapshot_response(snapshot)
 
     except Exception as e:
         logger.error(f"Error getting webpanels for server {server_id}: {str(e)}")
@@ -792,10 +942,10 @@ def get_security_events(server_id):
         }), 429
     
     try:
-        ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
         
-        if not ssh_service or not data_manager:
+        if not scheduler or not data_manager:
             raise APIError('Required services not available')
         
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -806,18 +956,8 @@ def get_security_events(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
         
-        stats = ssh_service.get_security_events(
-            ip=creds['ip'],
-            user=creds['user'],
-            password=creds['password'],
-            port=creds['port'],
-            timeout=30
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': stats
-        })
+        snapshot = scheduler.request(server_id, 'security_events', creds, wait=30)
+        return _snapshot_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error getting security events for server {server_id}: {str(e)}")
@@ -826,6 +966,16 @@ def get_security_events(server_id):
             'error': str(e)
         }), 500
 
+def _parse_range_seconds(value):
+    """'90s', '1h', '7d' или число секунд -> секунды (None, если не задано/не распознано)"""
+    if not value:
+        return None
+    match = re.fullmatch(r'(\d+)([smhd]?)', value.strip().lower())
+    if not match:
+        return None
+    multiplier = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    return min(int(match.group(1)) * multiplier, 30 * 86400)
+
 @api_bp.route('/monitoring/<server_id>/metrics-history', methods=['GET'])
 @require_auth
 @require_pin
@@ -840,9 +990,10 @@ def get_metrics_history(server_id):
     
     try:
         ssh_service = registry.get('ssh')
+        scheduler = registry.get('scheduler')
         data_manager = registry.get('data_manager')
         
-        if not ssh_service or not data_manager:
+        if not ssh_service or not scheduler or not data_manager:
             raise APIError('Required services not available')
         
         server, creds = _get_server_ssh_credentials(server_id, data_manager)
@@ -853,21 +1004,197 @@ def get_metrics_history(server_id):
                 'error': f'Server {server_id} not found or credentials invalid'
             }), 404
         
-        history = ssh_service.get_metrics_history(
+        # ?range=1h|24h|7d|30d (или секунды) и ?points=N — ряд за период,
+        # прореженный до N точек; без range — последние 60 точек
+        range_seconds = _parse_range_seconds(request.args.get('range'))
+        points = request.args.get('points', type=int)
+        if points is not None:
+            points = max(10, min(points, 2000))
+        
+        # Открытая страница мониторинга держит поток метрик хоста: дальше
+        # история читается из памяти (поток сам закроется после простоя)
+        ssh_service.ensure_metrics_stream(
             ip=creds['ip'],
             user=creds['user'],
             password=creds['password'],
-            port=creds['port'],
-            timeout=30
+            port=creds['port']
         )
         
+        snapshot = scheduler.request(
+            server_id,
+            'metrics_history',
+            creds,
+            params={'range_seconds': range_seconds, 'points': points},
+            wait=30
+        )
+        return _snapshot_response(snapshot)
+        
+    except Exception as e:
+        logger.error(f"Error getting metrics history for server {server_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Панели страницы мониторинга: тип SSE-события -> (интервал, сек; коллектор планировщика)
+MONITORING_PANELS = (
+    ('network', 30, 'network_stats'),
+    ('firewall', 30, 'firewall_stats'),
+    ('services', 30, 'services_stats'),
+    ('reticulum', 30, 'reticulum_status'),
+    ('webpanels', 60, 'webpanels_status'),
+    ('security', 60, 'security_events'),
+)
+MONITORING_HISTORY_INTERVAL = 120
+
+def _monitoring_panels(scheduler, ssh_service, server_id, creds, range_seconds, points, wait=30):
+    """Helper: {панель: (интервал, функция сбора, параметры)} для stream и all
+
+    Функции читают снимки планировщика, как маршруты отдельных панелей, и
+    не ходят по SSH в запросе. Задания всех панелей заводятся сразу, чтобы
+    их первые сборы шли параллельно в пуле планировщика.
+    """
+    from app.services.monitoring_hub import PendingError, Snapshot
+
+    history_params = {'range_seconds': range_seconds, 'points': points}
+    for _, _, collector in MONITORING_PANELS:
+        scheduler.request(server_id, collector, creds, wait=0)
+    scheduler.request(server_id, 'metrics_history', creds, params=history_params, wait=0)
+
+    def snapshot_reader(collector, params=None):
+        def read():
+            snapshot = scheduler.request(server_id, collector, creds, params=params, wait=wait)
+            if snapshot is None:
+                raise PendingError('Data collection is still in progress, try again shortly')
+            if snapshot['error']:
+                raise RuntimeError(snapshot['error'])
+            return Snapshot(snapshot['data'], snapshot['age'])
+        return read
+
+    read_history = snapshot_reader('metrics_history', history_params)
+
+    def history():
+        # Открытая страница мониторинга держит поток метрик хоста
+        ssh_service.ensure_metrics_stream(
+            ip=creds['ip'],
+            user=creds['user'],
+            password=creds['password'],
+            port=creds['port']
+        )
+        return read_history()
+
+    panels = {
+        event: (interval, snapshot_reader(collector), '')
+        for event, interval, collector in MONITORING_PANELS
+    }
+    # У каждого периода графика свой ряд — период входит в ключ результата
+    panels['history'] = (MONITORING_HISTORY_INTERVAL, history, f'{range_seconds}:{points}')
+    return panels
+
+@api_bp.route('/monitoring/<server_id>/stream', methods=['GET'])  # EventSource использует GET!
+@require_auth
+@require_pin
+def monitoring_stream(server_id):
+    """Все панели мониторинга одним SSE-потоком (события network, firewall, ...)"""
+    from flask import Response, stream_with_context
+
+    if not rate_limiter.is_allowed(f"server_{server_id}"):
+        return jsonify({
+            'success': False,
+            'error': 'Rate limit exceeded. Please wait a moment.'
+        }), 429
+
+    try:
+        ssh_service = registry.get('ssh')
+        data_manager = registry.get('data_manager')
+        hub = registry.get('monitoring_hub')
+        scheduler = registry.get('scheduler')
+
+        if not ssh_service or not data_manager or not hub or not scheduler:
+            raise APIError('Required services not available')
+
+        # Файл данных читается и расшифровывается один раз на соединение
+        server, creds = _get_server_ssh_credentials(server_id, data_manager)
+
+        if not server or not creds:
+            return jsonify({
+                'success': False,
+                'error': f'Server {server_id} not found or credentials invalid'
+            }), 404
+
+        range_seconds = _parse_range_seconds(request.args.get('range'))
+        points = request.args.get('points', type=int)
+        if points is not None:
+            points = max(10, min(points, 2000))
+
+        panels = _monitoring_panels(scheduler, ssh_service, server_id, creds, range_seconds, points)
+        response = Response(
+            stream_with_context(hub.events(str(server_id), panels)),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except Exception as e:
+        logger.error(f"Error opening monitoring stream for server {server_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/monitoring/<server_id>/all', methods=['GET'])
+@require_auth
+@require_pin
+def get_monitoring_all(server_id):
+    """Все панели мониторинга одним ответом (для клиентов без SSE)"""
+    if not rate_limiter.is_allowed(f"server_{server_id}"):
+        return jsonify({
+            'success': False,
+            'error': 'Rate limit exceeded. Please wait a moment.'
+        }), 429
+
+    try:
+        ssh_service = registry.get('ssh')
+        data_manager = registry.get('data_manager')
+        hub = registry.get('monitoring_hub')
+        scheduler = registry.get('scheduler')
+
+        if not ssh_service or not data_manager or not hub or not scheduler:
+            raise APIError('Required services not available')
+
+        server, creds = _get_server_ssh_credentials(server_id, data_manager)
+
+        if not server or not creds:
+            return jsonify({
+                'success': False,
+                'error': f'Server {server_id} not found or credentials invalid'
+            }), 404
+
+        range_seconds = _parse_range_seconds(request.args.get('range'))
+        points = request.args.get('points', type=int)
+        if points is not None:
+            points = max(10, min(points, 2000))
+        timeout = max(1, min(request.args.get('timeout', 30, type=int), 60))
+
+        # Панели — снимки планировщика: ждём только ещё не готовые первые сборы
+        result = hub.collect_all(
+            str(server_id),
+            _monitoring_panels(
+                scheduler, ssh_service, server_id, creds, range_seconds, points, wait=timeout
+            ),
+            timeout=timeout
+        )
+
         return jsonify({
             'success': True,
-            'data': history
+            'data': result['sections'],
+            'elapsed_ms': result['elapsed_ms'],
+            'slowest_ms': result['slowest_ms']
         })
-        
+
     except Exception as e:
-        logger.error(f"Error getting metrics history for server {server_id}: {str(e)}")
+        logger.error(f"Error collecting monitoring data for server {server_id}: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -966,25 +1293,23 @@ def check_monitoring_installed(server_id):
         # Проверяем наличие скрипта мониторинга на сервере
         logger.info(f"Checking if monitoring is installed on server {server_id}")
         
-        # Проверяем существование главного скрипта с коротким таймаутом (быстрая проверка)
-        check_cmd = "[ -f /usr/local/bin/monitoring/get-all-stats.sh ] && echo 'EXISTS' || echo 'NOT_FOUND'"
-        result = ssh_service.execute_remote_command(
+        # Быстрая проверка главного скрипта; заодно узнаём, агент ли это (его
+        # документ SSHService дальше использует вместо отдельных команд)
+        agent = ssh_service.detect_monitoring_agent(
             ip=server.get('ip_address'),
             user=ssh_creds.get('user', 'root'),
             password=password,
-            command=check_cmd,
             port=ssh_creds.get('port', 22),
-            timeout=8,              # Таймаут выполнения команды
-            connection_timeout=10   # Быстрый таймаут подключения для проверки (вместо 30)
         )
+        is_installed = agent['installed']
         
-        is_installed = 'EXISTS' in result.get('output', '')
-        
-        logger.info(f"Monitoring installed on server {server_id}: {is_installed}")
+        logger.info(f"Monitoring installed on server {server_id}: {is_installed} (agent {agent['agent_version']})")
         
         return jsonify({
             'success': True,
-            'installed': is_installed
+            'installed': is_installed,
+            'agent_version': agent['agent_version'],
+            'agent_current': agent['agent_current']
         })
         
     except Exception as e:
@@ -1215,12 +1540,8 @@ def install_monitoring(server_id):
                 _, stdout, _ = client.exec_command(f'{SUDO}mkdir -p /usr/local/bin/monitoring', timeout=10)
                 stdout.channel.recv_exit_status()
                 
-                # 1. Главный скрипт get-all-stats.sh (для получения данных)
-                main_script = '''#!/bin/bash
-# VPN Server Manager - Main Monitoring Script
-echo "Monitoring data collected at $(date)"
-exit 0
-'''
+                # 1. Агент get-all-stats.sh: один запуск печатает JSON со всеми разделами
+                main_script = ssh_service.monitoring_agent_script()
                 import base64
                 main_b64 = base64.b64encode(main_script.encode()).decode()
                 _, stdout, _ = client.exec_command(f'echo {main_b64} | base64 -d | {SUDO}tee /usr/local/bin/monitoring/get-all-stats.sh > /dev/null', timeout=10)
@@ -1386,6 +1707,7 @@ def uninstall_monitoring(server_id):
                 stdout.channel.recv_exit_status()
                 _, stdout, stderr = client.exec_command(f'{SUDO}rm -rf /usr/local/bin/monitoring', timeout=10)
                 stdout.channel.recv_exit_status()
+                ssh_service.forget_monitoring_agent(ip, port, user)
                 yield f"data: {json.dumps({'step': 3, 'total': 5, 'message': '✅ Файлы мониторинга удалены', 'status': 'success'})}\n\n"
                 
                 # Шаг 4: Удаление cron задачи
@@ -1428,29 +1750,23 @@ def monitoring_system_stats():
     from ..services.ssh_service import SSHService
     
     try:
-        # Количество открытых SSH соединений
-        active_connections = len(SSHService._connection_pool)
-        
-        # Список активных соединений
-        connections = []
-        for key, conn in SSHService._connection_pool.items():
-            try:
-                is_alive = conn.get_transport() and conn.get_transport().is_active()
-                connections.append({
-                    'key': key,
-                    'alive': is_alive
-                })
-            except:
-                connections.append({
-                    'key': key,
-                    'alive': False
-                })
+        pool = SSHService.pool_stats()
+        hub = registry.get('monitoring_hub')
+        scheduler = registry.get('scheduler')
         
         return jsonify({
             'success': True,
             'stats': {
-                'active_ssh_connections': active_connections,
-                'connections': connections,
+                'active_ssh_connections': pool['size'],
+                'connections': pool['connections'],
+                'pool_max_size': pool['max_size'],
+                'pool_idle_ttl': pool['idle_ttl'],
+                'metrics_streams': SSHService.metrics_stream_stats(),
+                'monitoring_hub': hub.stats() if hub else None,
+                'result_cache': SSHService.result_cache_stats(),
+                'capabilities': SSHService.capability_stats(),
+                'host_facts': SSHService.facts_stats(),
+                'scheduler': scheduler.stats() if scheduler else None,
                 'connection_pool_enabled': True,
                 'rate_limiting_enabled': True,
                 'max_requests_per_minute': rate_limiter.max_requests,
@@ -1479,19 +1795,14 @@ def health_check():
     
     # Проверка SSH Connection Pool
     try:
-        pool_size = len(SSHService._connection_pool)
-        active_count = 0
-        for key, conn in SSHService._connection_pool.items():
-            try:
-                if conn.get_transport() and conn.get_transport().is_active():
-                    active_count += 1
-            except:
-                pass
+        pool = SSHService.pool_stats()
+        active_count = sum(1 for conn in pool['connections'] if conn['alive'])
         
         health['checks']['ssh_pool'] = {
             'status': 'ok',
-            'total_connections': pool_size,
-            'active_connections': active_count
+            'total_connections': pool['size'],
+            'active_connections': active_count,
+            'max_size': pool['max_size']
         }
     except Exception as e:
         health['checks']['ssh_pool'] = {
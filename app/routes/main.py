@@ -245,6 +245,7 @@ def delete_server(server_id):
             active_file = data_manager.get_active_data_path(current_app.config)
             if active_file:
                 data_manager.save_servers(servers_to_keep, active_file)
+                _forget_scheduled_server(server_id)
                 flash(_('Сервер успешно удален.'), 'success')
             else:
                 flash(_('Нет активного файла данных для сохранения изменений.'), 'error')
@@ -257,6 +258,12 @@ def delete_server(server_id):
         flash(f'Ошибка при удалении сервера: {str(e)}', 'danger')
         return redirect(url_for('main.index'))
 
+def _forget_scheduled_server(server_id):
+    """Сбросить фоновый сбор сервера: адрес или credentials могли измениться"""
+    scheduler = registry.get('scheduler')
+    if scheduler:
+        scheduler.forget(server_id)
+
 @main_bp.route('/edit_server/<server_id>', methods=['GET', 'POST'])
 @require_auth
 @require_pin
@@ -356,6 +363,7 @@ def edit_server(server_id):
                 active_file = data_manager.get_active_data_path(current_app.config)
                 if active_file:
                     data_manager.save_servers(servers, active_file)
+                    _forget_scheduled_server(server_id)
                     flash(_('Изменения успешно сохранены.'), 'success')
                     return redirect(url_for('main.index'))
                 else:
@@ -0,0 +1,311 @@
+"""
+Collection Scheduler
+Фоновый сбор статистики серверов, отвязанный от HTTP-запросов.
+
+Маршрут не ходит по SSH сам: он сообщает планировщику, какие данные
+сервера нужны (request), и сразу получает последний снимок с его возрастом.
+Планировщик по интервалу коллектора отправляет сбор в ограниченный пул
+потоков и складывает результат в SnapshotStore. Первый запрос ещё не
+собранных данных ждёт первого сбора не дольше wait секунд. Задание, которое
+никто не запрашивал idle_timeout секунд, снимается (после текущего сбора),
+поэтому фоном опрашиваются только серверы, открытые в интерфейсе.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Коллектор планировщика -> метод SSHService
+COLLECTOR_METHODS = {
+    "server_stats": "get_server_stats",
+    "network_stats": "get_network_stats",
+    "firewall_stats": "get_firewall_stats",
+    "services_stats": "get_services_stats",
+    "reticulum_status": "get_reticulum_status",
+    "webpanels_status": "get_webpanels_status",
+    "security_events": "get_security_events",
+    "metrics_history": "get_metrics_history",
+}
+
+# Интервал сбора по коллектору, сек
+DEFAULT_INTERVALS = {
+    "server_stats": 30,
+    "network_stats": 30,
+    "firewall_stats": 30,
+    "services_stats": 30,
+    "reticulum_status": 30,
+    "webpanels_status": 60,
+    "security_events": 60,
+    "metrics_history": 30,
+}
+
+
+class SnapshotStore:
+    """Последние результаты коллекторов в памяти"""
+
+    def __init__(self):
+        # ключ задания -> {"data", "error", "collected_at" (unix), "monotonic"}
+        self._snapshots: Dict[Hashable, Dict] = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: Hashable, data=None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._snapshots[key] = {
+                "data": data,
+                "error": error,
+                "collected_at": time.time(),
+                "monotonic": time.monotonic(),
+            }
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """Снимок с полем age (сек) или None, если сбора ещё не было."""
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                return None
+            result = dict(snapshot)
+        result["age"] = round(time.monotonic() - result.pop("monotonic"), 1)
+        return result
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._snapshots.pop(key, None)
+
+    def drop(self, server_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._snapshots if k[0] == server_id]:
+                del self._snapshots[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._snapshots)
+
+
+class _Job:
+    """Периодический сбор одного коллектора одного сервера"""
+
+    def __init__(self, key: Tuple, collector: str, creds: Dict, params: Dict):
+        self.key = key
+        self.collector = collector
+        self.creds = creds
+        self.params = params
+        self.timeout: Optional[int] = None  # дедлайн сбора из запроса (иначе общий)
+        self.next_run = 0.0  # monotonic
+        self.last_request = time.monotonic()
+        self.running = False
+        self.first_done = threading.Event()
+        self.runs = 0
+        self.failures = 0
+
+
+class CollectionScheduler:
+    """Планировщик фонового сбора с ограниченным пулом и хранилищем снимков"""
+
+    def __init__(
+        self,
+        ssh_service,
+        intervals: Optional[Dict[str, float]] = None,
+        max_workers: int = 4,
+        idle_timeout: float = 600.0,
+        timeout: int = 30,
+        tick: float = 1.0,
+        store: Optional[SnapshotStore] = None,
+    ):
+        """
+        Args:
+            ssh_service: SSHService, методы которого вызываются в фоне
+            intervals: интервал сбора по коллектору, сек (дополняет DEFAULT_INTERVALS)
+            max_workers: максимум одновременных сборов
+            idle_timeout: снять задание, если его не запрашивали столько секунд
+            timeout: SSH-таймаут одного сбора, сек
+            tick: период проверки расписания, сек
+        """
+        self.ssh_service = ssh_service
+        self.intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+        self.max_workers = max(1, int(max_workers))
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.tick = tick
+        self.store = store or SnapshotStore()
+        self._jobs: Dict[Tuple, _Job] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # --- запросы маршрутов ---
+
+    def request(
+        self,
+        server_id: str,
+        collector: str,
+        creds: Dict,
+        params: Optional[Dict] = None,
+        wait: float = 30.0,
+        timeout: Optional[int] = None,
+    ) -> Optional[Dict]:
+        """Последний снимок коллектора сервера (заводит задание при первом запросе).
+
+        Если снимка ещё нет, ждёт первого сбора до wait секунд; None — не успел.
+        timeout — дедлайн следующих сборов задания (по умолчанию общий
+        self.timeout); действует последний запрошенный.
+        """
+        job = self._touch_job(server_id, collector, creds, params, timeout)
+        self._ensure_started()
+
+        snapshot = self.store.get(job.key)
+        if snapshot is not None:
+            return snapshot
+        self._submit_due()
+        job.first_done.wait(wait)
+        return self.store.get(job.key)
+
+    def offer(
+        self,
+        server_id: str,
+        collector: str,
+        creds: Dict,
+        data: Dict,
+        params: Optional[Dict] = None,
+        timeout: Optional[int] = None,
+    ) -> None:
+        """Результат, собранный маршрутом сам (потоковый сбор), как снимок задания.
+
+        Задание заводится, если его ещё не было; следующий фоновый сбор —
+        через обычный интервал коллектора.
+        """
+        job = self._touch_job(server_id, collector, creds, params, timeout)
+        self.store.put(job.key, data=data)
+        with self._lock:
+            job.next_run = time.monotonic() + self.intervals.get(collector, 60)
+        job.first_done.set()
+        self._ensure_started()
+
+    def _touch_job(
+        self,
+        server_id: str,
+        collector: str,
+        creds: Dict,
+        params: Optional[Dict],
+        timeout: Optional[int],
+    ) -> _Job:
+        if collector not in COLLECTOR_METHODS:
+            raise ValueError(f"Unknown collector: {collector}")
+        params = dict(params or {})
+        key = (str(server_id), collector, tuple(sorted(params.items())))
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = _Job(key, collector, dict(creds), params)
+            else:
+                job.creds = dict(creds)
+            if timeout is not None:
+                job.timeout = timeout
+            job.last_request = time.monotonic()
+        return job
+
+    def forget(self, server_id: str) -> None:
+        """Снять задания, снимки и SSH-подключение сервера (удалён или сменились credentials)."""
+        with self._lock:
+            jobs = [self._jobs.pop(k) for k in list(self._jobs) if k[0] == str(server_id)]
+        self.store.drop(str(server_id))
+        hosts = {(job.creds["ip"], job.creds["port"], job.creds["user"]) for job in jobs}
+        for ip, port, user in hosts:
+            try:
+                self.ssh_service.close_pooled_connection(ip, port, user)
+            except Exception as e:
+                logger.warning(f"Failed to close connection of server {server_id}: {e}")
+
+    # --- фоновый цикл ---
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="collector"
+            )
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop,), name="collection-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                self._submit_due()
+            except Exception as e:
+                logger.error(f"Collection scheduler tick failed: {e}")
+            stop.wait(self.tick)
+
+    def _submit_due(self) -> None:
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, job in list(self._jobs.items()):
+                # Идущий сбор не прерываем: задание снимется на следующем тике
+                if not job.running and now - job.last_request > self.idle_timeout:
+                    logger.info(f"Collection job {key} is idle, removing")
+                    del self._jobs[key]
+                    self.store.discard(key)
+                    continue
+                if not job.running and job.next_run <= now:
+                    job.running = True
+                    due.append(job)
+            executor = self._executor
+        for job in due:
+            executor.submit(self._collect, job)
+
+    def _collect(self, job: _Job) -> None:
+        creds = job.creds
+        try:
+            data = getattr(self.ssh_service, COLLECTOR_METHODS[job.collector])(
+                ip=creds["ip"],
+                user=creds["user"],
+                password=creds["password"],
+                port=creds["port"],
+                timeout=job.timeout or self.timeout,
+                **job.params,
+            )
+            self._store_result(job, data=data)
+        except Exception as e:
+            job.failures += 1
+            logger.warning(f"Background {job.collector} for server {job.key[0]} failed: {e}")
+            self._store_result(job, error=str(e))
+        finally:
+            job.runs += 1
+            job.next_run = time.monotonic() + self.intervals.get(job.collector, 60)
+            job.running = False
+            job.first_done.set()
+
+    def _store_result(self, job: _Job, data=None, error: Optional[str] = None) -> None:
+        """Снимок сбора; результат задания, снятого во время сбора (forget), не сохраняется."""
+        with self._lock:
+            if self._jobs.get(job.key) is not job:
+                logger.debug(f"Collection job {job.key} was removed while collecting, result dropped")
+                return
+            self.store.put(job.key, data=data, error=error)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "max_workers": self.max_workers,
+            "jobs": len(jobs),
+            "collecting": sum(1 for job in jobs if job.running),
+            "snapshots": len(self.store),
+            "runs": sum(job.runs for job in jobs),
+            "failures": sum(job.failures for job in jobs),
+            "intervals": dict(self.intervals),
+        }
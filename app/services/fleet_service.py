@@ -0,0 +1,232 @@
+"""
+Fleet Collector
+Параллельный сбор статистики со всех серверов парка.
+
+paramiko блокирующий, поэтому каждый хост опрашивается в потоке из
+ограниченного пула, а asyncio собирает результаты и следит за таймаутами.
+Полное обновление занимает примерно столько, сколько самый медленный хост,
+а не сумму времени всех хостов.
+
+stream() отдаёт результаты по мере ответа хостов (для NDJSON-обзора парка):
+быстрые серверы видны сразу, а не после самого медленного. Хосты, не
+успевшие к общему дедлайну, отдаются с ошибкой таймаута.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def fleet_overview(stats: Dict) -> Dict:
+    """Короткая сводка хоста для карточки: CPU, RAM, диск, load, uptime."""
+    disks = stats.get("disks") or []
+    root = next((d for d in disks if d.get("mount") == "/"), None)
+    disk_pct = None
+    try:
+        if root:
+            disk_pct = float(root.get("used_pct") or 0)
+        elif disks:
+            disk_pct = max(float(d.get("used_pct") or 0) for d in disks)
+    except ValueError:
+        disk_pct = None
+    return {
+        "cpu_pct": (stats.get("cpu") or {}).get("used_pct"),
+        "mem_pct": (stats.get("mem") or {}).get("used_pct"),
+        "disk_pct": disk_pct,
+        "load_1m": (stats.get("load") or {}).get("1m"),
+        "uptime": stats.get("uptime"),
+    }
+
+
+class FleetCollector:
+    """Сборщик статистики по всем серверам с ограничением параллелизма"""
+
+    def __init__(
+        self, ssh_service, max_concurrency: int = 16, timeout: int = 15, deadline: int = 60
+    ):
+        """
+        Args:
+            ssh_service: SSHService (нужен метод get_fleet_host_stats)
+            max_concurrency: максимум одновременно опрашиваемых хостов
+            timeout: таймаут на один хост, секунд
+            deadline: общий предел для stream(), секунд
+        """
+        self.ssh_service = ssh_service
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+
+    def _collect_host(self, target: Dict, timeout: int) -> Dict:
+        return self.ssh_service.get_fleet_host_stats(
+            ip=target["ip"],
+            user=target["user"],
+            password=target["password"],
+            port=target["port"],
+            timeout=timeout,
+        )
+
+    async def _collect_one(
+        self, target: Dict, executor, semaphore: asyncio.Semaphore, timeout: int
+    ) -> Dict:
+        result = {
+            "id": target.get("id"),
+            "name": target.get("name", ""),
+            "ip": target.get("ip", ""),
+        }
+        if target.get("error"):
+            result.update({"success": False, "error": target["error"], "elapsed_ms": 0})
+            return result
+
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            started = time.monotonic()
+            try:
+                stats = await asyncio.wait_for(
+                    loop.run_in_executor(executor, self._collect_host, target, timeout),
+                    timeout=timeout,
+                )
+                result.update({"success": True, "stats": stats})
+            except asyncio.TimeoutError:
+                result.update({"success": False, "error": f"Timeout after {timeout}s"})
+            except Exception as e:
+                logger.warning(f"Fleet collection failed for {target.get('ip')}: {e}")
+                result.update({"success": False, "error": str(e)})
+            result["elapsed_ms"] = int((time.monotonic() - started) * 1000)
+        return result
+
+    async def collect_async(
+        self,
+        targets: List[Dict],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[int] = None,
+    ) -> List[Dict]:
+        """Опросить все хосты параллельно; порядок результатов = порядок targets."""
+        concurrency = max(1, int(max_concurrency or self.max_concurrency))
+        timeout = timeout or self.timeout
+        semaphore = asyncio.Semaphore(concurrency)
+        executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="fleet"
+        )
+        try:
+            return await asyncio.gather(
+                *(self._collect_one(t, executor, semaphore, timeout) for t in targets)
+            )
+        finally:
+            # Зависшие paramiko-вызовы не держат ответ: ждать их не нужно
+            executor.shutdown(wait=False)
+
+    def collect(
+        self,
+        targets: List[Dict],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[int] = None,
+    ) -> Dict:
+        """Синхронная обёртка для Flask-обработчиков: результаты + сводка"""
+        started = time.monotonic()
+        results = asyncio.run(self.collect_async(targets, max_concurrency, timeout))
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        ok = sum(1 for r in results if r["success"])
+        return {
+            "servers": results,
+            "summary": {
+                "total": len(results),
+                "ok": ok,
+                "failed": len(results) - ok,
+                "elapsed_ms": elapsed_ms,
+                "slowest_ms": max((r["elapsed_ms"] for r in results), default=0),
+                "max_concurrency": max(1, int(max_concurrency or self.max_concurrency)),
+            },
+        }
+
+    @staticmethod
+    def _host_result(target: Dict, **fields) -> Dict:
+        result = {
+            "id": target.get("id"),
+            "name": target.get("name", ""),
+            "ip": target.get("ip", ""),
+        }
+        result.update(fields)
+        return result
+
+    def _collect_host_result(self, target: Dict, timeout: int) -> Dict:
+        started = time.monotonic()
+        try:
+            stats = self._collect_host(target, timeout)
+            result = self._host_result(target, success=True, overview=fleet_overview(stats))
+        except Exception as e:
+            logger.warning(f"Fleet collection failed for {target.get('ip')}: {e}")
+            result = self._host_result(target, success=False, error=str(e))
+        result["elapsed_ms"] = int((time.monotonic() - started) * 1000)
+        return result
+
+    def stream(
+        self,
+        targets: List[Dict],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> Iterator[Dict]:
+        """Результаты хостов в порядке ответа; последним — {"summary": ...}.
+
+        Хост без ответа к deadline (или так и не дождавшийся слота в пуле)
+        отдаётся с ошибкой таймаута; его поток дорабатывает в фоне.
+        """
+        concurrency = max(1, int(max_concurrency or self.max_concurrency))
+        timeout = timeout or self.timeout
+        deadline = deadline or self.deadline
+        started = time.monotonic()
+        counts = {"ok": 0, "failed": 0}
+
+        def counted(result: Dict) -> Dict:
+            counts["ok" if result["success"] else "failed"] += 1
+            return result
+
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fleet")
+        futures = {}
+        try:
+            for target in targets:
+                if target.get("error"):
+                    yield counted(
+                        self._host_result(target, success=False, error=target["error"], elapsed_ms=0)
+                    )
+                    continue
+                futures[executor.submit(self._collect_host_result, target, timeout)] = target
+
+            pending = set(futures)
+            try:
+                for future in as_completed(futures, timeout=deadline):
+                    pending.discard(future)
+                    yield counted(future.result())
+            except FuturesTimeoutError:
+                for future in [f for f in futures if f in pending]:
+                    if future.done():
+                        # Ответил в момент дедлайна — отдаём настоящий результат
+                        yield counted(future.result())
+                        continue
+                    future.cancel()
+                    yield counted(self._host_result(
+                        futures[future],
+                        success=False,
+                        error=f"Deadline of {deadline}s exceeded",
+                        elapsed_ms=int((time.monotonic() - started) * 1000),
+                    ))
+            yield {
+                "summary": {
+                    "total": counts["ok"] + counts["failed"],
+                    "ok": counts["ok"],
+                    "failed": counts["failed"],
+                    "elapsed_ms": int((time.monotonic() - started) * 1000),
+                    "max_concurrency": concurrency,
+                    "deadline": deadline,
+                }
+            }
+        finally:
+            # Отменяем ещё не начатые опросы; зависшие paramiko-вызовы не ждём
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,140 @@
+"""
+Host Capabilities
+Кэш возможностей хоста: какие утилиты есть и каким способом снимать метрики.
+
+Коллекторы проверяли возможности хоста на каждом вызове: `command -v` перед
+vnstat и docker, ufw -> firewalld -> nft -> iptables для брандмауэра,
+ss -> netstat для портов, /proc/stat -> top -> vmstat для CPU. Скрипт
+DETECT_SCRIPT проверяет всё сразу и печатает строки `имя=0|1`. Он
+добавляется разделом в первый пакетный скрипт к хосту (лишнего round trip
+нет), а результат живёт в кэше по ключу пула до TTL или до закрытия
+подключения. С известными возможностями коллекторы сразу берут рабочий
+способ и не шлют разделы для того, чего на хосте нет.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+# Утилиты ищем и в sbin: PATH неинтерактивной SSH-сессии его часто не содержит
+_SBIN_PATH = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+_TOOLS = (
+    "ss", "netstat", "jq", "vnstat", "docker", "ufw", "firewall-cmd",
+    "nft", "iptables", "journalctl", "top", "vmstat",
+)
+
+# В подоболочке: PATH не меняется для соседних разделов пакетного скрипта
+DETECT_SCRIPT = "( " + "; ".join(
+    [f'PATH="{_SBIN_PATH}:$PATH"']
+    + [
+        f"command -v {tool} >/dev/null 2>&1 && echo {tool}=1 || echo {tool}=0"
+        for tool in _TOOLS
+    ]
+    + [
+        "[ -r /proc/stat ] && echo proc_stat=1 || echo proc_stat=0",
+        "{ [ \"$(id -u)\" = 0 ] || sudo -n true 2>/dev/null; } && echo sudo=1 || echo sudo=0",
+    ]
+) + " )"
+
+
+def parse_capabilities(output: Optional[str]) -> Optional[Dict]:
+    """Вывод DETECT_SCRIPT -> {утилита: bool, ..., cpu_method, listeners, firewall}.
+
+    None — вывода нет или он не похож на результат скрипта.
+    """
+    flags = {}
+    for line in (output or "").splitlines():
+        name, sep, value = line.strip().partition("=")
+        if sep and value in ("0", "1"):
+            flags[name.replace("-", "_")] = value == "1"
+    if "proc_stat" not in flags or "ss" not in flags:
+        return None
+
+    if flags["proc_stat"]:
+        cpu_method = "proc_stat"
+    elif flags.get("top"):
+        cpu_method = "top"
+    elif flags.get("vmstat"):
+        cpu_method = "vmstat"
+    else:
+        cpu_method = "none"
+
+    if flags["ss"]:
+        listeners = "ss"
+    elif flags.get("netstat"):
+        listeners = "netstat"
+    else:
+        listeners = "none"
+
+    firewall = "none"
+    for tool, backend in (
+        ("ufw", "ufw"),
+        ("firewall_cmd", "firewalld"),
+        ("nft", "nftables"),
+        ("iptables", "iptables"),
+    ):
+        if flags.get(tool):
+            firewall = backend
+            break
+
+    return dict(flags, cpu_method=cpu_method, listeners=listeners, firewall=firewall)
+
+
+class CapabilityCache:
+    """Возможности хостов по ключу пула с TTL"""
+
+    def __init__(self, ttl: float = 3600.0):
+        """
+        Args:
+            ttl: через сколько секунд возможности хоста определяются заново
+        """
+        self.ttl = ttl
+        # ключ пула -> (monotonic определения, возможности)
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[str]) -> Optional[Dict]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def put(self, key: Optional[str], capabilities: Optional[Dict]) -> None:
+        if key is None or capabilities is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), capabilities)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._entries.items())
+        return {
+            "ttl": self.ttl,
+            "hosts": {
+                key: {
+                    "age": round(now - detected, 1),
+                    "cpu_method": caps["cpu_method"],
+                    "listeners": caps["listeners"],
+                    "firewall": caps["firewall"],
+                    "tools": sorted(
+                        name for name, value in caps.items() if value is True
+                    ),
+                }
+                for key, (detected, caps) in entries
+            },
+        }
@@ -0,0 +1,106 @@
+"""
+Host Facts
+Редко меняющиеся сведения о хосте, отделённые от метрик опроса.
+
+ОС, ядро, число ядер, адреса интерфейсов и версия docker почти не меняются,
+а модалка статуса перезапрашивала их каждые 30 секунд. Эти разделы
+пакетного скрипта (FACT_SECTIONS) собираются один раз и хранятся локально
+с длинным TTL. В каждый опрос добавляется дешёвый раздел boot_id: если он
+изменился (хост перезагрузился — могли смениться ядро, адреса, docker),
+факты собираются заново в том же запросе.
+
+Клиент, у которого факты уже есть, запрашивает /api/server/<id>/stats?facts=0
+и получает только метрики (volatile_stats) и facts_id. Смена facts_id —
+сигнал перезапросить полную статистику.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+# Разделы _STATS_SECTIONS, которые считаются фактами хоста
+FACT_SECTIONS = ("os", "nproc", "kernel", "net", "docker_version")
+BOOT_ID_CMD = "cat /proc/sys/kernel/random/boot_id 2>/dev/null"
+
+
+def volatile_stats(stats: Dict) -> Dict:
+    """Статистика без полей, которые строятся из FACT_SECTIONS."""
+    result = {k: v for k, v in stats.items() if k not in ("os", "net")}
+    if isinstance(stats.get("cpu"), dict):
+        result["cpu"] = {
+            k: v for k, v in stats["cpu"].items() if k not in ("cores", "kernel")
+        }
+    if isinstance(stats.get("docker"), dict):
+        result["docker"] = {
+            k: v for k, v in stats["docker"].items() if k not in ("present", "version")
+        }
+    return result
+
+
+class HostFactsCache:
+    """Сырые выводы разделов-фактов по ключу пула + boot_id, при котором собраны"""
+
+    def __init__(self, ttl: float = 86400.0):
+        """
+        Args:
+            ttl: предельный возраст фактов, сек (перезагрузка сбрасывает их раньше)
+        """
+        self.ttl = ttl
+        # ключ пула -> {"boot_id", "sections", "collected_at" (unix), "monotonic"}
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.reboots = 0
+
+    def get(self, key: Optional[str]) -> Optional[Dict]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["monotonic"] > self.ttl:
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, key: Optional[str], boot_id: Optional[str], sections: Dict) -> Optional[Dict]:
+        """Запомнить факты; без boot_id (не Linux, нет /proc) не кэшируем."""
+        if key is None or not boot_id:
+            return None
+        entry = {
+            "boot_id": boot_id,
+            "sections": {name: sections.get(name) for name in FACT_SECTIONS},
+            "collected_at": time.time(),
+            "monotonic": time.monotonic(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: str, reboot: bool = False) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None and reboot:
+                self.reboots += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def facts_id(entry: Optional[Dict]) -> Optional[str]:
+        """Идентификатор версии фактов: boot_id + время сбора."""
+        if entry is None:
+            return None
+        return f"{entry['boot_id'][:8]}-{int(entry['collected_at'])}"
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._entries.items())
+            reboots = self.reboots
+        return {
+            "ttl": self.ttl,
+            "hosts": len(entries),
+            "reboots_detected": reboots,
+            "ages": {key: round(now - entry["monotonic"], 1) for key, entry in entries},
+        }
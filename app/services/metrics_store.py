@@ -0,0 +1,320 @@
+"""
+Metrics Store
+Локальное хранилище временных рядов метрик серверов (CPU, память и т.п.).
+
+Каждая метрика хоста хранится в нескольких уровнях детализации (tiers):
+10 с за последний час, 1 мин за сутки, 15 мин за 30 дней. Уровень — кольцевой
+буфер на NumPy-массивах с агрегатами min/avg/max по интервалу, поэтому
+неделя или месяц отдаются из грубого уровня, а не из тысяч сырых точек.
+Для графиков ряд дополнительно прореживается LTTB до нужного числа точек.
+
+На диске (APP_DATA_DIR/metrics) у хоста снимок уровней (.npz) и журнал
+точек после снимка (append-only .log); журнал периодически сворачивается в
+снимок. На удалённые серверы ничего не пишется.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (имя, шаг интервала в секундах, сколько хранить в секундах)
+DEFAULT_TIERS = (
+    ("10s", 10, 3600),
+    ("1m", 60, 86400),
+    ("15m", 900, 30 * 86400),
+)
+
+
+class TierRing:
+    """Кольцевой буфер интервалов одного уровня с агрегатами min/avg/max"""
+
+    def __init__(self, step: int, slots: int):
+        self.step = step
+        self.slots = slots
+        self._ts = np.zeros(slots)
+        self._min = np.zeros(slots)
+        self._avg = np.zeros(slots)
+        self._max = np.zeros(slots)
+        self._start = 0
+        self._size = 0
+        # Незакрытый интервал: [начало, min, max, сумма, количество]
+        self._current = np.array([np.nan, 0.0, 0.0, 0.0, 0.0])
+
+    def __len__(self) -> int:
+        return self._size + (0 if np.isnan(self._current[0]) else 1)
+
+    def _push(self, ts: float, mn: float, avg: float, mx: float) -> None:
+        end = (self._start + self._size) % self.slots
+        self._ts[end], self._min[end], self._avg[end], self._max[end] = ts, mn, avg, mx
+        if self._size < self.slots:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.slots
+
+    def _flush(self) -> None:
+        start, mn, mx, total, count = self._current
+        if not np.isnan(start) and count:
+            self._push(start, mn, total / count, mx)
+        self._current = np.array([np.nan, 0.0, 0.0, 0.0, 0.0])
+
+    def add(self, timestamp: float, value: float) -> None:
+        bucket = timestamp - timestamp % self.step
+        current = self._current
+        if np.isnan(current[0]):
+            self._current = np.array([bucket, value, value, value, 1.0])
+            return
+        if bucket < current[0]:
+            return  # точка старше открытого интервала — не переписываем историю
+        if bucket > current[0]:
+            self._flush()
+            self._current = np.array([bucket, value, value, value, 1.0])
+            return
+        current[1] = min(current[1], value)
+        current[2] = max(current[2], value)
+        current[3] += value
+        current[4] += 1
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(время, min, avg, max) от старых к новым, включая открытый интервал."""
+        order = (self._start + np.arange(self._size)) % self.slots
+        ts, mn, avg, mx = self._ts[order], self._min[order], self._avg[order], self._max[order]
+        start, cur_min, cur_max, total, count = self._current
+        if not np.isnan(start) and count:
+            ts = np.append(ts, start)
+            mn = np.append(mn, cur_min)
+            avg = np.append(avg, total / count)
+            mx = np.append(mx, cur_max)
+        return ts, mn, avg, mx
+
+    def state(self) -> Dict[str, np.ndarray]:
+        ts, mn, avg, mx = self.arrays()
+        n = self._size
+        return {"ts": ts[:n], "min": mn[:n], "avg": avg[:n], "max": mx[:n], "current": self._current.copy()}
+
+    def restore(self, state: Dict[str, np.ndarray]) -> None:
+        for ts, mn, avg, mx in zip(state["ts"], state["min"], state["avg"], state["max"]):
+            self._push(float(ts), float(mn), float(avg), float(mx))
+        self._current = np.array(state["current"], dtype=float)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: индексы точек, сохраняющих форму ряда."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    prev = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Опорная точка — среднее следующей корзины (для последней — последняя точка)
+        if i + 2 < len(edges):
+            nxt_lo, nxt_hi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        indices[i + 1] = prev
+    return indices
+
+
+class MetricsStore:
+    """Временные ряды метрик по хостам: уровни детализации + снимок на диске"""
+
+    def __init__(self, data_dir: Optional[str] = None, tiers=DEFAULT_TIERS):
+        """
+        Args:
+            data_dir: каталог снимков и журналов (None — только в памяти)
+            tiers: уровни детализации (имя, шаг, срок хранения), от мелкого к крупному
+        """
+        self.data_dir = data_dir
+        self.tiers = tuple(tiers)
+        self._series: Dict[str, Dict[str, Dict[str, TierRing]]] = {}
+        self._journal_lines: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+
+    # --- диск ---
+
+    def _path(self, host: str, suffix: str) -> Optional[str]:
+        if not self.data_dir:
+            return None
+        return os.path.join(self.data_dir, re.sub(r"[^A-Za-z0-9.-]", "_", host) + suffix)
+
+    def _new_rings(self) -> Dict[str, TierRing]:
+        return {name: TierRing(step, retention // step) for name, step, retention in self.tiers}
+
+    def _host_series_locked(self, host: str) -> Dict[str, Dict[str, TierRing]]:
+        series = self._series.get(host)
+        if series is None:
+            series = self._series[host] = {}
+            self._load_snapshot_locked(host, series)
+            self._journal_lines[host] = self._replay_journal_locked(host, series)
+        return series
+
+    def _load_snapshot_locked(self, host: str, series: Dict[str, Dict[str, TierRing]]) -> None:
+        path = self._path(host, ".npz")
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with np.load(path) as data:
+                for key in data.files:
+                    metric, tier, field = key.rsplit("|", 2)
+                    if field != "ts":
+                        continue
+                    rings = series.setdefault(metric, self._new_rings())
+                    if tier in rings:
+                        rings[tier].restore(
+                            {f: data[f"{metric}|{tier}|{f}"] for f in ("ts", "min", "avg", "max", "current")}
+                        )
+        except Exception as e:
+            logger.warning(f"Cannot load metrics snapshot {path}: {e}")
+
+    def _replay_journal_locked(self, host: str, series: Dict[str, Dict[str, TierRing]]) -> int:
+        path = self._path(host, ".log")
+        if not path or not os.path.exists(path):
+            return 0
+        lines = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 3:
+                        continue
+                    try:
+                        timestamp, value = float(parts[0]), float(parts[2])
+                    except ValueError:
+                        continue
+                    self._add_locked(series, parts[1], timestamp, value)
+                    lines += 1
+        except OSError as e:
+            logger.warning(f"Cannot read metrics journal {path}: {e}")
+        return lines
+
+    def _snapshot_locked(self, host: str, series: Dict[str, Dict[str, TierRing]]) -> None:
+        """Сохранить уровни в .npz (атомарно) и начать журнал заново."""
+        path = self._path(host, ".npz")
+        arrays = {}
+        for metric, rings in series.items():
+            for tier, ring in rings.items():
+                for field, values in ring.state().items():
+                    arrays[f"{metric}|{tier}|{field}"] = values
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        open(self._path(host, ".log"), "w").close()
+        self._journal_lines[host] = 0
+
+    # --- запись / чтение ---
+
+    def _add_locked(self, series, metric: str, timestamp: float, value: float) -> None:
+        rings = series.get(metric)
+        if rings is None:
+            rings = series[metric] = self._new_rings()
+        for ring in rings.values():
+            ring.add(timestamp, value)
+
+    def append(
+        self, host: str, point: Dict[str, float], timestamp: Optional[float] = None
+    ) -> None:
+        """Добавить значения метрик (одна отметка времени на все)."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            series = self._host_series_locked(host)
+            for metric, value in point.items():
+                self._add_locked(series, metric, timestamp, float(value))
+
+            path = self._path(host, ".log")
+            if not path:
+                return
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    for metric, value in point.items():
+                        f.write(f"{timestamp:.3f} {metric} {float(value):g}\n")
+                self._journal_lines[host] += len(point)
+                # Журнал покрыл час сырых точек — сворачиваем в снимок
+                first_tier = self.tiers[0]
+                if self._journal_lines[host] > (first_tier[2] // first_tier[1]) * max(1, len(series)):
+                    self._snapshot_locked(host, series)
+            except OSError as e:
+                logger.warning(f"Cannot write metrics journal {path}: {e}")
+
+    def _tier_for_range(self, range_seconds: Optional[float]) -> Tuple[str, int, int]:
+        if range_seconds is None:
+            return self.tiers[0]
+        for tier in self.tiers:
+            if range_seconds <= tier[2]:
+                return tier
+        return self.tiers[-1]
+
+    def window(
+        self,
+        host: str,
+        metrics: List[str],
+        limit: Optional[int] = None,
+        since: Optional[float] = None,
+    ) -> List[Dict]:
+        """Точки самого детального уровня: [{"timestamp": ..., metric: avg, ...}]."""
+        rows = self.query(host, metrics, since=since)["points"]
+        for row in rows:
+            for metric in metrics:
+                row.pop(f"{metric}_min", None)
+                row.pop(f"{metric}_max", None)
+        return rows[-limit:] if limit else rows
+
+    def query(
+        self,
+        host: str,
+        metrics: List[str],
+        range_seconds: Optional[float] = None,
+        points: Optional[int] = None,
+        since: Optional[float] = None,
+        now: Optional[float] = None,
+    ) -> Dict:
+        """Ряд за range_seconds из подходящего уровня, прореженный LTTB до points.
+
+        points — целевое число точек на каждую метрику; строки объединяются по
+        времени, поэтому их может быть больше. В строке — avg и {metric}_min/_max.
+        """
+        tier_name, step, _ = self._tier_for_range(range_seconds)
+        if range_seconds is not None:
+            since = (time.time() if now is None else now) - range_seconds
+        with self._lock:
+            series = self._host_series_locked(host)
+            data = {
+                metric: series[metric][tier_name].arrays()
+                for metric in metrics
+                if metric in series
+            }
+
+        rows: Dict[float, Dict] = {}
+        for metric, (ts, mn, avg, mx) in data.items():
+            if since is not None:
+                keep = ts >= since - step
+                ts, mn, avg, mx = ts[keep], mn[keep], avg[keep], mx[keep]
+            selected = lttb(ts, avg, points) if points else np.arange(len(ts))
+            for i in selected:
+                row = rows.get(ts[i])
+                if row is None:
+                    row = rows[ts[i]] = {"timestamp": int(ts[i])}
+                row[metric] = round(float(avg[i]), 1)
+                row[f"{metric}_min"] = round(float(mn[i]), 1)
+                row[f"{metric}_max"] = round(float(mx[i]), 1)
+        return {
+            "resolution": tier_name,
+            "step": step,
+            "points": [rows[ts] for ts in sorted(rows)],
+        }
@@ -0,0 +1,135 @@
+"""
+Metrics Stream
+Поток чтения долгоживущего exec-канала с метриками хоста.
+
+Вместо опроса «открыть канал — выполнить команды — закрыть» на хосте один раз
+запускается цикл, который каждые N секунд печатает строку JSON с сырыми
+счётчиками (NDJSON). MetricsStream держит этот канал в фоновом потоке:
+отдаёт строки обработчику, при обрыве переподключается с экспоненциальной
+паузой и сам останавливается, если метрики хоста давно никто не читал.
+Что именно открывать и как разбирать строки, решает вызывающий (SSHService).
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsStream:
+    """Фоновое чтение NDJSON-канала одного хоста с переподключением"""
+
+    def __init__(
+        self,
+        name: str,
+        open_lines: Callable[[threading.Event], Iterable[str]],
+        on_line: Callable[[str], None],
+        idle_timeout: float = 600.0,
+        backoff_initial: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        """
+        Args:
+            name: имя потока для логов (ключ хоста)
+            open_lines: открыть канал и вернуть итератор строк; получает stop-событие
+            on_line: обработчик одной строки (исключение — строка пропускается)
+            idle_timeout: остановиться, если touch() не вызывался столько секунд
+            backoff_initial: первая пауза перед переподключением, сек
+            backoff_max: предел паузы, сек
+        """
+        self.name = name
+        self.open_lines = open_lines
+        self.on_line = on_line
+        self.idle_timeout = idle_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_access = time.monotonic()
+        self.connected = False
+        self.samples = 0
+        self.reconnects = 0
+        self.last_sample_at: Optional[float] = None  # monotonic
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self._last_access = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name=f"metrics-stream-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, wait: float = 0.0) -> None:
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join(wait)
+
+    def touch(self) -> None:
+        """Отметить, что метрики хоста читают (продлевает жизнь потока)."""
+        self._last_access = time.monotonic()
+
+    def sample_age(self) -> Optional[float]:
+        if self.last_sample_at is None:
+            return None
+        return time.monotonic() - self.last_sample_at
+
+    def status(self) -> Dict:
+        age = self.sample_age()
+        return {
+            "name": self.name,
+            "running": self.running,
+            "connected": self.connected,
+            "samples": self.samples,
+            "reconnects": self.reconnects,
+            "last_sample_age": round(age, 1) if age is not None else None,
+            "last_error": self.last_error,
+        }
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self._last_access > self.idle_timeout
+
+    def _run(self, stop: threading.Event) -> None:
+        delay = self.backoff_initial
+        while not stop.is_set():
+            try:
+                for line in self.open_lines(stop):
+                    if stop.is_set():
+                        break
+                    if self._idle():
+                        logger.info(f"Metrics stream {self.name} is idle, stopping")
+                        stop.set()
+                        break
+                    try:
+                        self.on_line(line)
+                    except Exception as e:
+                        logger.debug(f"Metrics stream {self.name}: bad sample skipped: {e}")
+                        continue
+                    self.connected = True
+                    self.samples += 1
+                    self.last_sample_at = time.monotonic()
+                    delay = self.backoff_initial
+                if stop.is_set():
+                    break
+                raise EOFError("stream closed by remote side")
+            except Exception as e:
+                self.connected = False
+                self.last_error = str(e)
+                if stop.is_set() or self._idle():
+                    break
+                self.reconnects += 1
+                logger.warning(
+                    f"Metrics stream {self.name} lost ({e}), reconnecting in {delay:.0f}s"
+                )
+                if stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.backoff_max)
+        self.connected = False
@@ -0,0 +1,126 @@
+"""
+Monitoring Agent
+Скрипт-агент мониторинга, который install_monitoring кладёт на сервер.
+
+Один запуск /usr/local/bin/monitoring/get-all-stats.sh печатает версионный
+JSON-документ со всеми разделами, нужными странице мониторинга (CPU, память,
+диски, сеть, сервисы, docker, брандмауэр, безопасность, веб-панели).
+Агент не разбирает вывод команд сам: в документ попадает сырой вывод
+каждого раздела, а разбор делают те же парсеры SSHService, что и для
+пакетного скрипта. Поэтому формат разделов у агента и у прямых команд один.
+
+Скрипт генерируется из списка (имя, команда), который даёт
+SSHService.agent_section_commands(); build — хэш этого списка, по нему
+check-installed понимает, что установленный агент устарел.
+"""
+
+import hashlib
+import json
+import re
+import shlex
+from typing import Dict, List, Optional
+
+AGENT_VERSION = 1
+AGENT_PATH = "/usr/local/bin/monitoring/get-all-stats.sh"
+
+_VERSION_RE = re.compile(r"^vsm-agent (\d+) ([0-9a-f]+)$", re.MULTILINE)
+
+# Позиция чтения журнала: курсор из окружения или последние сутки
+JOURNAL_POSITION_FUNC = "vsm_journal_pos"
+
+_SCRIPT_HEADER = r"""#!/bin/bash
+# VPN Server Manager - monitoring agent (сгенерирован, не редактировать)
+# Печатает JSON: {"agent":"vsm","version":N,"build":"...","generated_at":unix,"sections":{...}}
+# Окружение: VSM_AUTH_CURSOR / VSM_ERRORS_CURSOR — курсоры journalctl,
+# VSM_FIRST_SAMPLE=1 — два снимка счётчиков CPU/сети (первый опрос хоста).
+VSM_AGENT_VERSION=__VERSION__
+VSM_AGENT_BUILD=__BUILD__
+export PATH="/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:$PATH"
+export LC_ALL=C
+
+if [ "$1" = "--version" ]; then
+    echo "vsm-agent $VSM_AGENT_VERSION $VSM_AGENT_BUILD"
+    exit 0
+fi
+
+vsm_journal_pos() {
+    if [ -n "$1" ]; then printf '%s' "--after-cursor=$1"; else printf '%s' "--since=24 hours ago"; fi
+}
+
+# Вывод раздела -> содержимое JSON-строки (управляющие символы выбрасываем)
+vsm_json() {
+    tr -d '\000-\010\013\014\016-\037' \
+        | sed -e 's/\\/\\\\/g' -e 's/"/\\"/g' -e 's/\t/\\t/g' -e 's/\r/\\r/g' \
+        | awk '{ printf "%s%s", sep, $0; sep = "\\n" }'
+}
+
+vsm_sep=""
+vsm_section() {
+    printf '%s"%s":"' "$vsm_sep" "$1"
+    eval "$2" 2>/dev/null | vsm_json
+    printf '"'
+    vsm_sep=","
+}
+
+printf '{"agent":"vsm","version":%s,"build":"%s","generated_at":%s,"sections":{' \
+    "$VSM_AGENT_VERSION" "$VSM_AGENT_BUILD" "$(date +%s)"
+"""
+
+_SCRIPT_FOOTER = "printf '}}\\n'\n"
+
+
+def _script_body(sections: List[tuple]) -> str:
+    return "".join(
+        f"vsm_section {name} {shlex.quote(command)}\n" for name, command in sections
+    )
+
+
+def agent_build(sections: List[tuple]) -> str:
+    """Хэш списка разделов: меняется вместе с командами."""
+    digest = hashlib.sha1(f"{AGENT_VERSION}\n{_script_body(sections)}".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def build_agent_script(sections: List[tuple]) -> str:
+    header = _SCRIPT_HEADER.replace("__VERSION__", str(AGENT_VERSION)).replace(
+        "__BUILD__", agent_build(sections)
+    )
+    return header + _script_body(sections) + _SCRIPT_FOOTER
+
+
+def agent_env(cursors: Dict[str, str], first_sample: bool) -> str:
+    """Префикс окружения для запуска агента (курсоры уже провалидированы)."""
+    assignments = []
+    for stream, variable in (("auth", "VSM_AUTH_CURSOR"), ("errors", "VSM_ERRORS_CURSOR")):
+        if cursors.get(stream):
+            assignments.append(f"{variable}={shlex.quote(cursors[stream])}")
+    if first_sample:
+        assignments.append("VSM_FIRST_SAMPLE=1")
+    return " ".join(assignments)
+
+
+def parse_agent_version(output: str) -> Optional[Dict]:
+    """Вывод `get-all-stats.sh --version` -> {"version", "build"}; None — не агент."""
+    match = _VERSION_RE.search(output or "")
+    if not match:
+        return None
+    return {"version": int(match.group(1)), "build": match.group(2)}
+
+
+def parse_agent_document(output: str) -> Optional[Dict]:
+    """JSON агента -> документ; None, если формат не наш или версия другая."""
+    try:
+        document = json.loads(output)
+    except (TypeError, ValueError):
+        return None
+    if (
+        not isinstance(document, dict)
+        or document.get("agent") != "vsm"
+        or document.get("version") != AGENT_VERSION
+        or not isinstance(document.get("sections"), dict)
+    ):
+        return None
+    document["sections"] = {
+        name: (value or "").strip() for name, value in document["sections"].items()
+    }
+    return document
@@ -0,0 +1,263 @@
+"""
+Monitoring Hub
+Общий сбор данных панелей страницы мониторинга для SSE-потоков.
+
+Страница мониторинга держит один EventSource (/api/monitoring/<id>/stream),
+а сервер шлёт в него типизированные события панелей (network, firewall,
+services, ...), каждую со своей периодичностью. Результат панели хранится
+в хабе по ключу сервера: второй открытый таб получает уже собранные данные,
+а не запускает те же SSH-команды ещё раз. Пока одна панель собирается,
+остальные потоки ждут её результат на блокировке ключа. Результаты, которые
+никто не обновлял STALE_INTERVALS интервалов панели (закрытые табы, удалённые
+серверы), убираются при закрытии потока и после collect_all.
+
+Для клиентов без SSE collect_all собирает все панели одним запросом,
+параллельно.
+
+Маршруты передают хабу функции сбора, которые читают снимки
+CollectionScheduler: по SSH ходит только планировщик, а функция возвращает
+Snapshot с возрастом данных. Пока первый сбор панели не готов, функция
+бросает PendingError; такой ответ хаб повторяет через PENDING_RETRY секунд.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(NamedTuple):
+    """Данные, собранные раньше (снимок планировщика); age — их возраст, сек"""
+
+    data: Any
+    age: float
+
+
+class PendingError(Exception):
+    """Первый сбор панели ещё идёт: ответ не ошибка, его нужно повторить"""
+
+
+def format_event(event: str, payload: Dict) -> str:
+    """Событие SSE с типом панели и JSON-данными."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class MonitoringHub:
+    """Последние результаты панелей по серверам + генератор SSE-событий"""
+
+    # Результат старше стольких интервалов своей панели больше не раздаётся
+    STALE_INTERVALS = 3
+    # Через сколько секунд повторить панель, первый сбор которой ещё идёт
+    PENDING_RETRY = 5
+
+    def __init__(self, heartbeat: float = 15.0, retry_ms: int = 5000):
+        """
+        Args:
+            heartbeat: пауза без событий, после которой шлётся комментарий keep-alive, сек
+            retry_ms: через сколько браузер переподключает оборвавшийся EventSource
+        """
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        # (ключ сервера, панель, параметры) ->
+        # {"payload": dict, "collected_at": monotonic, "max_age": сек, "age": возраст данных при сборе}
+        self._results: Dict[Tuple[str, str, str], Dict] = {}
+        self._locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._active_streams = 0
+        self.collections = 0
+        self.shared = 0
+
+    def _key_lock(self, key: Tuple[str, str, str]) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _fresh(self, key: Tuple[str, str, str], max_age: float) -> Optional[Dict]:
+        entry = self._results.get(key)
+        if entry and time.monotonic() - entry["collected_at"] < min(max_age, entry["max_age"]):
+            return entry
+        return None
+
+    @staticmethod
+    def age(entry: Dict) -> float:
+        """Возраст данных записи сейчас, сек."""
+        return round(time.monotonic() - entry["collected_at"] + entry["age"], 1)
+
+    def collect(
+        self,
+        server_key: str,
+        panel: str,
+        collector: Callable[[], Dict],
+        max_age: float,
+        params: str = "",
+    ) -> Dict:
+        """Результат панели не старше max_age: из хаба или новым сбором.
+
+        Возвращает {"payload": {"success", "data" | "error"}, "collected_at",
+        "max_age", "age"}. Ошибка сбора тоже запоминается на max_age, чтобы
+        недоступный сервер не опрашивался каждым табом заново; PendingError —
+        только на PENDING_RETRY секунд.
+        """
+        key = (server_key, panel, params)
+        entry = self._fresh(key, max_age)
+        if entry:
+            self.shared += 1
+            return entry
+        with self._key_lock(key):
+            entry = self._fresh(key, max_age)
+            if entry:
+                self.shared += 1
+                return entry
+            age = 0.0
+            entry_max_age = max_age
+            try:
+                data = collector()
+                if isinstance(data, Snapshot):
+                    data, age = data
+                payload = {"success": True, "data": data}
+            except PendingError as e:
+                payload = {"success": False, "pending": True, "error": str(e)}
+                entry_max_age = min(max_age, self.PENDING_RETRY)
+            except Exception as e:
+                logger.error(f"Error collecting {panel} for server {server_key}: {e}")
+                payload = {"success": False, "error": str(e)}
+            entry = {
+                "payload": payload,
+                "collected_at": time.monotonic(),
+                "max_age": entry_max_age,
+                "age": age,
+            }
+            with self._lock:
+                self._results[key] = entry
+            self.collections += 1
+            return entry
+
+    def events(
+        self,
+        server_key: str,
+        panels: Dict[str, Tuple[float, Callable[[], Dict], str]],
+        stop: Optional[threading.Event] = None,
+    ) -> Iterator[str]:
+        """SSE-события панелей сервера, каждая со своим интервалом.
+
+        panels — {тип события: (интервал, сек; функция сбора; параметры)};
+        параметры (например, период графика) входят в ключ результата. Следующее
+        событие панели планируется от момента сбора результата, поэтому все
+        табы одного сервера попадают на общий сбор. Генератор бесконечный:
+        останавливается событием stop или закрытием соединения клиентом.
+        """
+        stop = stop or threading.Event()
+        next_due = {panel: 0.0 for panel in panels}
+        with self._lock:
+            self._active_streams += 1
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            last_sent = time.monotonic()
+            while not stop.is_set():
+                for panel, (interval, collector, params) in panels.items():
+                    if next_due[panel] > time.monotonic():
+                        continue
+                    entry = self.collect(server_key, panel, collector, interval, params)
+                    now = time.monotonic()
+                    next_due[panel] = max(
+                        entry["collected_at"] + entry["max_age"], now + min(interval, 1.0)
+                    )
+                    payload = dict(entry["payload"], age=self.age(entry))
+                    yield format_event(panel, payload)
+                    last_sent = time.monotonic()
+                    if stop.is_set():
+                        return
+
+                now = time.monotonic()
+                if now - last_sent >= self.heartbeat:
+                    yield ": keep-alive\n\n"
+                    last_sent = now
+                wake_at = min(min(next_due.values()), last_sent + self.heartbeat)
+                stop.wait(max(0.0, wake_at - now))
+        finally:
+            with self._lock:
+                self._active_streams -= 1
+            self._evict_stale()
+
+    def _evict_stale(self) -> None:
+        """Убрать результаты (и блокировки ключей), устаревшие на STALE_INTERVALS интервалов."""
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in list(self._results.items()):
+                if now - entry["collected_at"] <= entry["max_age"] * self.STALE_INTERVALS:
+                    continue
+                del self._results[key]
+                lock = self._locks.get(key)
+                # Идущий сбор сам положит свежий результат
+                if lock is not None and not lock.locked():
+                    del self._locks[key]
+
+    def collect_all(
+        self,
+        server_key: str,
+        panels: Dict[str, Tuple[float, Callable[[], Dict], str]],
+        timeout: float = 30.0,
+    ) -> Dict:
+        """Все панели сервера параллельно; у каждой — время сбора и ошибка.
+
+        Возвращает {"sections": {панель: {"success", "data" | "error",
+        "elapsed_ms", "age"}}, "elapsed_ms", "slowest_ms"}. Панель, не успевшая
+        за timeout, получает ошибку; её поток дорабатывает в фоне и кладёт
+        результат в хаб для следующих запросов.
+        """
+        started = time.monotonic()
+
+        def run(panel, interval, collector, params):
+            panel_started = time.monotonic()
+            entry = self.collect(server_key, panel, collector, interval, params)
+            finished = time.monotonic()
+            return dict(
+                entry["payload"],
+                elapsed_ms=int((finished - panel_started) * 1000),
+                age=self.age(entry),
+            )
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, len(panels)), thread_name_prefix="monitoring-all"
+        )
+        try:
+            futures = {
+                panel: executor.submit(run, panel, interval, collector, params)
+                for panel, (interval, collector, params) in panels.items()
+            }
+            wait(futures.values(), timeout=timeout)
+        finally:
+            # Зависшие paramiko-вызовы не держат ответ: ждать их не нужно
+            executor.shutdown(wait=False)
+
+        sections = {}
+        for panel, future in futures.items():
+            if future.done():
+                sections[panel] = future.result()
+            else:
+                sections[panel] = {
+                    "success": False,
+                    "error": f"Timeout after {timeout}s",
+                    "elapsed_ms": int(timeout * 1000),
+                }
+        self._evict_stale()
+        return {
+            "sections": sections,
+            "elapsed_ms": int((time.monotonic() - started) * 1000),
+            "slowest_ms": max((s["elapsed_ms"] for s in sections.values()), default=0),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active_streams": self._active_streams,
+                "panels_cached": len(self._results),
+                "collections": self.collections,
+                "shared": self.shared,
+            }
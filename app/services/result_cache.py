@@ -0,0 +1,157 @@
+"""
+Result Cache
+TTL-кэш результатов SSH-коллекторов с объединением одновременных запросов.
+
+Ключ — (хост, коллектор, параметры). Пока результат свежее TTL своего
+коллектора, он отдаётся без SSH. Если результата нет, первый запрос
+выполняет сбор, а одновременные запросы с тем же ключом ждут его
+(single-flight) вместо того, чтобы запускать те же команды параллельно.
+Счётчики hits / misses / coalesced видны в /api/monitoring/stats/system.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def parse_ttls(value: Optional[str]) -> Dict[str, float]:
+    """'network_stats=10,security_events=60' -> {"network_stats": 10.0, ...}"""
+    ttls = {}
+    for item in (value or "").split(","):
+        name, _, seconds = item.partition("=")
+        try:
+            ttls[name.strip()] = float(seconds)
+        except ValueError:
+            continue
+    return ttls
+
+
+class _Flight:
+    """Выполняющийся сбор: остальные запросы ждут его результат"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """TTL-кэш + single-flight по ключу (хост, коллектор, параметры)"""
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        enabled: bool = True,
+        max_entries: int = 1024,
+    ):
+        """
+        Args:
+            ttls: TTL по имени коллектора, сек (0 или нет в словаре — без кэша)
+            enabled: False — вызовы идут напрямую, без кэша и объединения
+            max_entries: предел числа результатов (старые вытесняются)
+        """
+        self.ttls = dict(ttls or {})
+        self.enabled = enabled
+        self.max_entries = max_entries
+        # ключ -> (monotonic истечения, результат)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._by_collector: Dict[str, Dict[str, int]] = {}
+
+    def ttl(self, collector: str) -> float:
+        return self.ttls.get(collector, 0.0) if self.enabled else 0.0
+
+    def _count_locked(self, collector: str, counter: str) -> None:
+        self._counters[counter] += 1
+        stats = self._by_collector.setdefault(
+            collector, {"hits": 0, "misses": 0, "coalesced": 0}
+        )
+        stats[counter] += 1
+
+    def _store_locked(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            now = time.monotonic()
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        collector: str,
+        compute: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """Свежий результат из кэша, результат идущего сбора или новый сбор.
+
+        Каждый вызывающий получает свою копию результата. Исключение сбора
+        получают все ожидавшие его запросы; в кэш оно не попадает, как и
+        результат, для которого cacheable вернул False.
+        """
+        ttl = self.ttl(collector)
+        if ttl <= 0:
+            return compute()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._count_locked(collector, "hits")
+                return copy.deepcopy(entry[1])
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._count_locked(collector, "misses")
+            else:
+                self._count_locked(collector, "coalesced")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and cacheable(flight.value):
+                    self._store_locked(key, flight.value, ttl)
+                self._inflight.pop(key, None)
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def invalidate(self, match: Callable[[Hashable], bool]) -> int:
+        """Удалить результаты, ключ которых подходит под match."""
+        with self._lock:
+            keys = [key for key in self._entries if match(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters = {"hits": 0, "misses": 0, "coalesced": 0}
+            self._by_collector.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                **self._counters,
+                "collectors": copy.deepcopy(self._by_collector),
+                "ttls": dict(self.ttls),
+            }
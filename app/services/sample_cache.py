@@ -0,0 +1,112 @@
+"""
+Sample Cache
+Кэш последних сырых счётчиков по хостам для расчёта скоростей без sleep.
+
+Скорости сети и загрузка CPU считаются по разнице между двумя опросами:
+предыдущие значения счётчиков (rx/tx байты, jiffies из /proc/stat) хранятся
+здесь вместе с отметкой времени, поэтому каждый запрос делает одно чтение
+счётчиков вместо «прочитать — подождать секунду — прочитать».
+
+Снимок общий для всех потребителей подключения (статистика, история,
+сеть, фоновые задания, поток метрик). Снимок, пришедший меньше чем через
+min_interval после базового, не заменяет его: дельта за доли секунды даёт
+мусорную скорость, а второй потребитель сбил бы базу первому.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class CounterSampleCache:
+    """Последний снимок монотонных счётчиков на (хост, метрика)"""
+
+    def __init__(
+        self, max_age: float = 300.0, max_entries: int = 4096, min_interval: float = 0.9
+    ):
+        """
+        Args:
+            max_age: снимок старше этого (сек) считается устаревшим
+            max_entries: порог, после которого из кэша выметаются устаревшие снимки
+            min_interval: минимальный интервал (время хоста, сек) для новой дельты;
+                чуть меньше секунды, чтобы опрос раз в секунду проходил с учётом
+                округления /proc/uptime
+        """
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.min_interval = min_interval
+        # (хост, метрика) -> (счётчики, время хоста, monotonic, последний результат)
+        self._samples: Dict[Tuple[str, str], tuple] = {}
+        self._lock = threading.Lock()
+
+    def is_fresh(self, host: str, metric: str) -> bool:
+        """Есть ли снимок, относительно которого можно посчитать дельту."""
+        with self._lock:
+            sample = self._samples.get((host, metric))
+        return sample is not None and time.monotonic() - sample[2] <= self.max_age
+
+    def update(
+        self, host: str, metric: str, counters: Dict[str, int], timestamp: float
+    ) -> Optional[Tuple[Dict[str, int], float]]:
+        """Сохранить новый снимок и вернуть (дельты, прошедшее время) к предыдущему.
+
+        timestamp — время снимка на стороне хоста (например, /proc/uptime), чтобы
+        задержка сети не искажала интервал. Счётчик, которого не было в прошлом
+        снимке или который пошёл назад (сброс интерфейса), в дельты не попадает.
+        None возвращается, если предыдущего снимка нет, он устарел, хост
+        перезагрузился или сравнить нечего. Повторно поданный тот же снимок
+        (один документ агента читают несколько панелей) возвращает прошлый
+        результат, а не пустую дельту к самому себе. Так же снимок ближе
+        min_interval к предыдущему (другой потребитель только что опросил хост)
+        возвращает прошлый результат и не трогает базовый снимок; пока
+        результата нет (первый опрос, два снимка с паузой), дельта считается.
+        """
+        now = time.monotonic()
+        key = (host, metric)
+        with self._lock:
+            previous = self._samples.get(key)
+            if (
+                previous is not None
+                and previous[1] == timestamp
+                and previous[0] == counters
+            ):
+                return previous[3]
+            if (
+                previous is not None
+                and previous[3] is not None
+                and abs(timestamp - previous[1]) < self.min_interval
+                and now - previous[2] <= self.max_age
+            ):
+                return previous[3]
+            result = self._delta(previous, counters, timestamp, now)
+            self._samples[key] = (dict(counters), timestamp, now, result)
+            if len(self._samples) > self.max_entries:
+                self._prune_locked(now)
+        return result
+
+    def _delta(
+        self, previous, counters: Dict[str, int], timestamp: float, now: float
+    ) -> Optional[Tuple[Dict[str, int], float]]:
+        if previous is None or now - previous[2] > self.max_age:
+            return None
+        prev_counters, prev_timestamp = previous[0], previous[1]
+        elapsed = timestamp - prev_timestamp
+        if elapsed <= 0:
+            return None
+        deltas = {
+            name: value - prev_counters[name]
+            for name, value in counters.items()
+            if name in prev_counters and value >= prev_counters[name]
+        }
+        if not deltas:
+            return None
+        return deltas, elapsed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def _prune_locked(self, now: float) -> None:
+        stale = [k for k, v in self._samples.items() if now - v[2] > self.max_age]
+        for key in stale:
+            del self._samples[key]
@@ -0,0 +1,118 @@
+"""
+Section Budget
+Общий дедлайн сбора статистики, поделённый на бюджеты разделов.
+
+Таймаут канала срабатывает только при полной тишине, а пакетный скрипт
+ждёт каждую команду: один зависший `docker ps` или `df` на отвалившемся
+NFS-монтировании держал весь запрос. Deadline отмеряет время запроса,
+budgets() делит остаток между разделами по весам. На хосте каждый раздел
+запускается функцией _vsm_run из guard_preamble(): `timeout` снимает
+команду по её бюджету, а общий конец (_vsm_end) не даёт скрипту пережить
+дедлайн, даже если бюджеты округлились вверх. Раздел, не уложившийся в
+бюджет, печатает TIMEOUT_MARKER и помечается timed_out; остальные разделы
+возвращаются как обычно. Если хост всё же не уложился (нет `timeout`,
+зависла сама сессия), сервис закрывает канал в момент дедлайна и берёт
+то, что успело прийти: дольше дедлайна ответ не ждут.
+"""
+
+import shlex
+import time
+from typing import Dict, List, Optional
+
+TIMEOUT_MARKER = "@@VSM-TIMEOUT@@"
+
+# Относительная цена разделов: первый замер CPU/сети спит, df/ps/docker медленнее прочих
+SECTION_WEIGHTS = {
+    "cpu": 2,
+    "net_counters": 2,
+    "disks": 2,
+    "processes": 2,
+    "docker_version": 2,
+    "docker_ps": 3,
+    "vnstat": 2,
+    "capabilities": 2,
+}
+MIN_BUDGET = 1
+
+
+def guard_preamble(total: int) -> str:
+    """Функция _vsm_run <бюджет> <команда> и общий конец скрипта через total секунд.
+
+    timeout есть не везде (и у старого busybox другой синтаксис): без
+    рабочего `timeout -k` команда выполняется без ограничения, а разделы
+    после общего конца всё равно пропускаются.
+    """
+    return "\n".join(
+        [
+            f"_vsm_end=$(( $(date +%s) + {int(total)} ))",
+            "timeout -k 1 1 true >/dev/null 2>&1 && _vsm_timeout=1 || _vsm_timeout=0",
+            "_vsm_run() {",
+            "  _vsm_left=$((_vsm_end - $(date +%s)))",
+            '  [ "$_vsm_left" -gt "$1" ] && _vsm_left=$1',
+            f'  if [ "$_vsm_left" -le 0 ]; then echo \'{TIMEOUT_MARKER}\'; return 0; fi',
+            '  if [ "$_vsm_timeout" = 1 ]; then timeout -k 1 "$_vsm_left" sh -c "$2"; else sh -c "$2"; fi',
+            f"  case $? in 124|137) printf '\\n%s\\n' '{TIMEOUT_MARKER}' ;; esac",
+            "}",
+        ]
+    )
+
+
+def guard(command: str, budget: int) -> str:
+    return f"_vsm_run {int(budget)} {shlex.quote(command)}"
+
+
+def split_timed_out(output: Optional[str]) -> tuple:
+    """(вывод раздела, True если раздел снят по бюджету); вывод снятого — None."""
+    if output is not None and output.rstrip().endswith(TIMEOUT_MARKER):
+        return None, True
+    return output, False
+
+
+class Deadline:
+    """Дедлайн одного сбора и список разделов, которые в него не уложились"""
+
+    # Запас на round trip и разбор ответа
+    RESERVE = 1.0
+    # `timeout -k 1` добивает команду, не завершившуюся по TERM, через секунду
+    KILL_GRACE = 1.0
+
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: сколько времени есть у всего сбора, сек
+        """
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.timed_out: List[str] = []
+
+    def remaining(self) -> float:
+        return self.seconds - (time.monotonic() - self.started)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def mark(self, *names: str) -> None:
+        for name in names:
+            if name not in self.timed_out:
+                self.timed_out.append(name)
+
+    def available(self) -> float:
+        """Сколько может идти скрипт на хосте, чтобы ответ пришёл до дедлайна."""
+        remaining = self.remaining()
+        return remaining - min(self.RESERVE, remaining * 0.2) - self.KILL_GRACE
+
+    def script_total(self) -> int:
+        """Общий конец скрипта для guard_preamble(), целые секунды."""
+        return max(MIN_BUDGET, int(self.available()))
+
+    def budgets(self, names: List[str], parallel: bool = False) -> Dict[str, int]:
+        """Целые секунды на раздел: по весам (разделы идут подряд) или весь остаток каждому."""
+        available = self.available()
+        if parallel:
+            return {name: max(MIN_BUDGET, int(available)) for name in names}
+        total = sum(SECTION_WEIGHTS.get(name, 1) for name in names) or 1
+        return {
+            name: max(MIN_BUDGET, int(available * SECTION_WEIGHTS.get(name, 1) / total))
+            for name in names
+        }
@@ -0,0 +1,127 @@
+"""
+Security Event Aggregator
+Скользящие 24-часовые агрегаты событий журнала по хостам.
+
+get_security_events читает journalctl инкрементально: с `--after-cursor`
+приходят только новые записи, а счётчики (неудачные входы по IP, ошибки)
+раскладываются по временным корзинам. Сумма корзин за последние 24 часа
+заменяет повторное чтение суток журнала на каждом опросе.
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class _HostWindow:
+    """Корзины одного хоста + курсоры потоков journalctl"""
+
+    def __init__(self):
+        self.cursors: Dict[str, str] = {}
+        # начало корзины (unix) -> {"failures": int, "ips": Counter, "errors": int}
+        self.buckets: Dict[int, Dict] = {}
+
+
+class SecurityEventAggregator:
+    """Хранилище скользящих окон событий безопасности по хостам"""
+
+    def __init__(self, window: int = 86400, bucket_size: int = 300):
+        """
+        Args:
+            window: ширина окна, секунд (24 часа)
+            bucket_size: размер временной корзины, секунд
+        """
+        self.window = window
+        self.bucket_size = bucket_size
+        self._hosts: Dict[str, _HostWindow] = {}
+        self._lock = threading.Lock()
+
+    def cursors(self, host: str) -> Dict[str, str]:
+        """Курсоры потоков для хоста; пустой словарь — первый опрос."""
+        with self._lock:
+            state = self._hosts.get(host)
+            return dict(state.cursors) if state else {}
+
+    def _bucket(self, state: _HostWindow, timestamp: float) -> Dict:
+        start = int(timestamp) - int(timestamp) % self.bucket_size
+        bucket = state.buckets.get(start)
+        if bucket is None:
+            bucket = state.buckets[start] = {"failures": 0, "ips": Counter(), "errors": 0}
+        return bucket
+
+    def ingest(
+        self,
+        host: str,
+        previous_cursors: Dict[str, str],
+        new_cursors: Dict[str, str],
+        failures: Iterable[Tuple[float, str]],
+        errors: Iterable[float],
+        now: float,
+    ) -> bool:
+        """Добавить новые записи журнала.
+
+        failures — (время, IP или ""), errors — времена записей err..alert.
+        Если курсоры успели измениться (параллельный опрос уже применил эти
+        записи), данные отбрасываются, чтобы не посчитать их дважды.
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                if previous_cursors:
+                    return False
+                state = self._hosts[host] = _HostWindow()
+            if state.cursors != previous_cursors:
+                return False
+
+            horizon = now - self.window
+            for timestamp, ip in failures:
+                if timestamp < horizon:
+                    continue
+                bucket = self._bucket(state, timestamp)
+                bucket["failures"] += 1
+                if ip:
+                    bucket["ips"][ip] += 1
+            for timestamp in errors:
+                if timestamp >= horizon:
+                    self._bucket(state, timestamp)["errors"] += 1
+
+            for stream, cursor in new_cursors.items():
+                if cursor:
+                    state.cursors[stream] = cursor
+            self._prune_locked(state, now)
+            return True
+
+    def summary(self, host: str, now: float, top: int = 3) -> Optional[Dict]:
+        """Агрегаты за окно или None, если хост ещё не опрашивался."""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                return None
+            self._prune_locked(state, now)
+            failures = 0
+            errors = 0
+            ips: Counter = Counter()
+            for bucket in state.buckets.values():
+                failures += bucket["failures"]
+                errors += bucket["errors"]
+                ips.update(bucket["ips"])
+        top_ips: List[Dict] = [
+            {"ip": ip, "count": count} for ip, count in ips.most_common(top)
+        ]
+        return {
+            "ssh_failures_24h": failures,
+            "top_failed_ips": top_ips,
+            "error_events_24h": errors,
+        }
+
+    def reset(self, host: Optional[str] = None) -> None:
+        with self._lock:
+            if host is None:
+                self._hosts.clear()
+            else:
+                self._hosts.pop(host, None)
+
+    def _prune_locked(self, state: _HostWindow, now: float) -> None:
+        oldest = now - self.window - self.bucket_size
+        for start in [s for s in state.buckets if s < oldest]:
+            del state.buckets[start]
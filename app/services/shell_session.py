@@ -0,0 +1,127 @@
+"""
+Shell Session
+Постоянная shell-сессия на пуловом подключении вместо канала на команду.
+
+Каждый exec_command стоит round trip на открытие канала и ещё один на
+запрос exec. ShellSession открывает канал один раз, запускает в нём
+неинтерактивный sh и пишет команды в его stdin. Команда выполняется как
+`"$SHELL" -c '<команда>' </dev/null` — так же, как её запускает sshd при
+exec: своё окружение, `exit`, `cd` и синтаксические ошибки не задевают
+сессию, а stdin команды не съедает следующие. После команды shell печатает
+в stdout и stderr строку-метку с уникальным токеном (в stdout — с кодом
+возврата). Пакет команд пишется одним send: ответы читаются подряд, без
+round trip на команду.
+"""
+
+import shlex
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+
+class ShellSessionError(Exception):
+    """Сессия сломана (канал закрыт, таймаут): её нужно закрыть и открыть заново"""
+
+
+class ShellSession:
+    """Один sh в одном канале; команды выполняются по очереди под lock"""
+
+    _MARKER = "__VSM_SHELL_END__"
+    _RECV_SIZE = 32768
+
+    def __init__(self, channel, shell_command: str = "sh"):
+        """
+        Args:
+            channel: открытый, ещё не использованный канал сессии (paramiko.Channel)
+            shell_command: что запустить в канале; читает команды из stdin
+        """
+        self.channel = channel
+        self.lock = threading.Lock()
+        self.commands = 0
+        self.created_at = time.time()
+        self._buffers = {"stdout": b"", "stderr": b""}
+        channel.exec_command(shell_command)
+
+    @property
+    def alive(self) -> bool:
+        return not self.channel.closed and not self.channel.exit_status_ready()
+
+    def close(self) -> None:
+        try:
+            self.channel.close()
+        except Exception:
+            pass
+
+    @classmethod
+    def _frame(cls, command: str, marker: str) -> str:
+        return (
+            f'"${{SHELL:-/bin/sh}}" -c {shlex.quote(command)} </dev/null; '
+            f"printf '\\n{marker} %d\\n' $?; printf '\\n{marker} \\n' >&2\n"
+        )
+
+    def _recv(self, stream: str, deadline: float) -> bytes:
+        while True:
+            if stream == "stdout" and self.channel.recv_stderr_ready():
+                # Забираем stderr, пока ждём stdout: иначе встанет окно канала
+                self._buffers["stderr"] += self.channel.recv_stderr(self._RECV_SIZE)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ShellSessionError("Timeout waiting for shell session output")
+            self.channel.settimeout(min(remaining, 0.5))
+            try:
+                if stream == "stdout":
+                    data = self.channel.recv(self._RECV_SIZE)
+                else:
+                    data = self.channel.recv_stderr(self._RECV_SIZE)
+            except socket.timeout:
+                continue
+            if not data:
+                raise ShellSessionError("Shell session closed")
+            return data
+
+    def _read_frame(self, stream: str, marker: bytes, deadline: float) -> tuple:
+        """Данные потока до строки-метки и остаток этой строки."""
+        while True:
+            buffer = self._buffers[stream]
+            start = buffer.find(marker)
+            if start >= 0:
+                end = buffer.find(b"\n", start + len(marker))
+                if end >= 0:
+                    self._buffers[stream] = buffer[end + 1:]
+                    return buffer[:start], buffer[start + len(marker):end]
+            data = self._recv(stream, deadline)
+            self._buffers[stream] += data
+
+    def run_many(self, commands: List[str], timeout: float = 30) -> List[Dict]:
+        """Выполнить команды по порядку; [{"stdout", "stderr", "exit_code"}, ...].
+
+        timeout — на весь пакет. При ShellSessionError состояние сессии
+        неизвестно: вызывающий должен её закрыть.
+        """
+        token = uuid.uuid4().hex
+        markers = [f"{self._MARKER}{token}_{i}" for i in range(len(commands))]
+        payload = "".join(self._frame(c, m) for c, m in zip(commands, markers))
+        deadline = time.monotonic() + timeout
+        try:
+            self.channel.sendall(payload.encode("utf-8"))
+            results = []
+            for marker in markers:
+                marker_bytes = b"\n" + marker.encode("utf-8") + b" "
+                stdout, code = self._read_frame("stdout", marker_bytes, deadline)
+                stderr, _ = self._read_frame("stderr", marker_bytes, deadline)
+                results.append(
+                    {
+                        "stdout": stdout.decode("utf-8", "replace"),
+                        "stderr": stderr.decode("utf-8", "replace"),
+                        "exit_code": int(code),
+                    }
+                )
+        except (OSError, EOFError, ValueError) as e:
+            raise ShellSessionError(str(e)) from e
+        self.commands += len(commands)
+        return results
+
+    def run(self, command: str, timeout: float = 30) -> Dict:
+        return self.run_many([command], timeout=timeout)[0]
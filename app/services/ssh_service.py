@@ -1,22 +1,139 @@
+import functools
+import inspect
 import logging
 import re
+import socket
 import threading
-from typing import Dict, List, Optional
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
 
 import paramiko
 from paramiko.ssh_exception import AuthenticationException, SSHException
 
 from ..exceptions import AuthenticationError, SSHConnectionError
+from .sample_cache import CounterSampleCache
+from . import monitoring_agent
+from .host_capabilities import DETECT_SCRIPT, CapabilityCache, parse_capabilities
+from .host_facts import BOOT_ID_CMD, FACT_SECTIONS, HostFactsCache
+from .metrics_store import MetricsStore
+from .metrics_stream import MetricsStream
+from .result_cache import ResultCache
+from .section_budget import Deadline, guard, guard_preamble, split_timed_out
+from .security_aggregator import SecurityEventAggregator
+from .shell_session import ShellSession, ShellSessionError
 
 logger = logging.getLogger(__name__)
 
+# Строка /proc/net/dev: "iface: rx_bytes rx_packets ... (8 полей rx) tx_bytes ..."
+_PROC_NET_DEV_RE = re.compile(r"^\s*([^\s:]+):\s*(\d+)\s+(?:\d+\s+){7}(\d+)")
+# Мониторим физические (eth0, ens3) и VPN-интерфейсы (tun0, wg0, tap0), без lo
+_NET_IFACE_RE = re.compile(r"^(eth|ens|eno|enp|wlan|wlp|tun|tap|wg|ppp|ipsec)")
+
+# Аргументы коллекторов, которые не входят в ключ кэша результатов
+_CACHE_KEY_EXCLUDED = {"self", "ip", "user", "password", "port", "timeout"}
+
+
+def _cacheable_result(result) -> bool:
+    # Ответ с ошибкой или с неуспевшими разделами не кэшируем: следующий
+    # запрос попробует ещё раз
+    return not (
+        isinstance(result, dict) and (result.get("error") or result.get("timed_out"))
+    )
+
+
+def _cached_collector(name: str):
+    """Коллектор через кэш результатов SSHService._results.
+
+    Ключ — (host:port:user, имя коллектора, остальные параметры вызова);
+    одновременные вызовы с одним ключом ждут один сбор.
+    """
+
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = type(self)._results
+            if cache.ttl(name) <= 0:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            call = bound.arguments
+            params = tuple(
+                sorted((k, v) for k, v in call.items() if k not in _CACHE_KEY_EXCLUDED)
+            )
+            key = (type(self)._pool_key(call["ip"], call["port"], call["user"]), name, params)
+            return cache.get_or_compute(
+                key, name, lambda: method(self, *args, **kwargs), _cacheable_result
+            )
+
+        return wrapper
+
+    return decorate
+
 
 class SSHService:
     """Сервис для работы с SSH/SFTP с connection pooling"""
 
-    # Кэш подключений
-    _connection_pool = {}
+    # Кэш подключений: _pool_lock защищает словари, _key_locks — установку
+    # подключения к конкретному host:port:user. Порядок OrderedDict — LRU
+    # (последний элемент — самый свежий).
+    _connection_pool: "OrderedDict[str, paramiko.SSHClient]" = OrderedDict()
     _pool_lock = threading.Lock()
+    _key_locks: Dict[str, threading.Lock] = {}
+    # Метаданные подключений пула: статистика и параметры connect() для
+    # прозрачного переподключения (ключ — тот же host:port:user)
+    _pool_meta: Dict[str, Dict] = {}
+    _client_keys: Dict[int, str] = {}  # id(SSHClient) -> ключ пула
+    # Transport keepalive: держит NAT-маппинг и ловит мёртвый пир без exec
+    _KEEPALIVE_INTERVAL = 30
+    # Активная проверка (exec `true`) — только после такого простоя, сек
+    _IDLE_PROBE_AFTER = 60
+    _IDLE_PROBE_TIMEOUT = 5
+    # Границы пула: LRU-вытеснение сверх max size, reaper закрывает простаивающие
+    _POOL_MAX_SIZE = 32
+    _POOL_IDLE_TTL = 600
+    # Одновременных каналов на подключение в _run_pipelined. sshd по умолчанию
+    # разрешает MaxSessions=10; запас — потоку метрик и соседним коллекторам
+    _MAX_SESSIONS = 8
+    _session_slots: Dict[str, threading.BoundedSemaphore] = {}
+    # Общий пул потоков _run_pipelined: _MAX_SESSIONS каналов на столько
+    # подключений одновременно (фоновые сборы, обзор парка)
+    _PIPE_HOSTS = 4
+    _pipe_executor: Optional[ThreadPoolExecutor] = None
+    # Постоянные shell-сессии по ключу пула (см. shell_session.py): короткие
+    # пробы идут без открытия канала. Включаются configure_shell_sessions
+    _SHELL_SESSIONS_ENABLED = False
+    _shell_sessions: Dict[str, ShellSession] = {}
+    # Возможности хостов (утилиты, способ снятия CPU, брандмауэр) по ключу
+    # пула: определяются разделом первого пакетного скрипта, см. _collect_sections
+    _capabilities = CapabilityCache()
+    # Факты хостов (ОС, ядро, ядра CPU, адреса, версия docker): собираются один
+    # раз и живут до смены boot_id или TTL, см. _collect_stats_sections_batched
+    _facts = HostFactsCache()
+    _reaper_thread: Optional[threading.Thread] = None
+    _reaper_stop = threading.Event()
+    # Предыдущие сырые счётчики (jiffies CPU, rx/tx байты) по хостам:
+    # скорости считаются между соседними опросами, без sleep в запросе
+    _samples = CounterSampleCache()
+    # Скользящие 24ч агрегаты журнала по хостам + курсоры journalctl
+    _security_events = SecurityEventAggregator()
+    # Кэш результатов коллекторов: TTL по коллектору, сек. Включается
+    # configure_result_cache при регистрации сервисов
+    _COLLECTOR_TTLS = {
+        "server_stats": 10,
+        "fleet_host_stats": 10,
+        "network_stats": 10,
+        "firewall_stats": 30,
+        "services_stats": 15,
+        "reticulum_status": 30,
+        "webpanels_status": 30,
+        "security_events": 30,
+        "metrics_history": 5,
+    }
+    _results = ResultCache(_COLLECTOR_TTLS, enabled=False)
     _process_exclusions = {"ps", "head", "bash", "sh", "sudo", "timeout"}
     _known_port_labels = {
         "22": "SSH",
@@ -165,9 +282,11 @@ class SSHService:
         "docker-socket-proxy": "Docker socket proxy",
     }
 
-    def __init__(self):
+    def __init__(self, metrics_store: Optional[MetricsStore] = None):
         self.client: Optional[paramiko.SSHClient] = None
         self.sftp_client: Optional[paramiko.SFTPClient] = None
+        # История метрик хранится локально; без явного хранилища — только в памяти
+        self.metrics_store = metrics_store if metrics_store is not None else MetricsStore()
 
     @staticmethod
     def _sort_ports(ports: List[str]) -> List[str]:
@@ -224,8 +343,59 @@ class SSHService:
         return processes
 
     def _read_command_output(self, client, command: str, timeout: int = 30) -> str:
-        _, stdout, _ = client.exec_command(command, timeout=timeout)
-        return stdout.read().decode("utf-8").strip()
+        shell_results = self._run_in_shell(client, [command], timeout)
+        if shell_results is not None:
+            return shell_results[0]["stdout"].strip()
+        _, stdout, _ = self._exec_command(client, command, timeout=timeout)
+        data = stdout.read()
+        self._record_io(client, bytes_in=len(data))
+        return data.decode("utf-8").strip()
+
+    @staticmethod
+    def _cut_at_deadline(stdout, deadline: Deadline) -> tuple:
+        """Закрыть канал stdout в момент дедлайна: чтение вернёт то, что успело прийти.
+
+        Возвращает (timer, cut): timer отменяется после чтения, cut.is_set() —
+        вывод обрезан по дедлайну.
+        """
+        cut = threading.Event()
+
+        def close():
+            cut.set()
+            try:
+                stdout.channel.close()
+            except Exception as e:
+                logger.debug(f"Closing channel at deadline failed: {e}")
+
+        timer = threading.Timer(max(deadline.remaining(), 0), close)
+        timer.daemon = True
+        timer.start()
+        return timer, cut
+
+    def _read_until_deadline(self, client, command: str, deadline: Deadline) -> tuple:
+        """(вывод, полный ли он): ответ команды ждётся не дольше остатка дедлайна.
+
+        Shell-сессия получает тот же остаток; если она сломалась, а дедлайн
+        уже вышел, команда через exec повторно не запускается.
+        """
+        shell_results = self._run_in_shell(client, [command], deadline.remaining(), min_timeout=0)
+        if shell_results is not None:
+            return shell_results[0]["stdout"].strip(), True
+        if deadline.expired:
+            return "", False
+        _, stdout, _ = self._exec_command(
+            client, command, timeout=deadline.remaining() + Deadline.KILL_GRACE
+        )
+        timer, cut = self._cut_at_deadline(stdout, deadline)
+        try:
+            data = stdout.read()
+        except socket.timeout:
+            data = b""
+            cut.set()
+        finally:
+            timer.cancel()
+        self._record_io(client, bytes_in=len(data))
+        return data.decode("utf-8", "replace").strip(), not cut.is_set()
 
     @classmethod
     def _label_port(cls, port: str) -> str:
@@ -236,82 +406,119 @@ class SSHService:
     def _label_ports(cls, ports: List[str]) -> List[str]:
         return [cls._label_port(port) for port in ports]
 
-    def _probe_service(self, client, descriptor: Dict) -> Dict:
-        """Проверить наличие и статус systemd unit по набору candidate names."""
-        matched_name = None
-        for candidate in descriptor.get("unit_candidates", []):
-            output = self._read_command_output(
-                client,
-                f'systemctl list-unit-files --type=service 2>/dev/null | grep -E "^{candidate}\\.service\\s"',
-                timeout=10,
-            )
-            if output:
-                matched_name = candidate
-                break
+    _UNIT_PROPERTIES = "Id,LoadState,ActiveState,UnitFileState,ActiveEnterTimestampMonotonic"
 
-        if not matched_name:
-            return {
-                "name": descriptor["name"],
-                "display_name": descriptor["display_name"],
-                "group": descriptor["group"],
-                "status": "not_installed",
-                "enabled": "not-found",
-                "uptime": "-",
-                "unit_name": None,
-            }
+    @classmethod
+    def _catalog_units(cls) -> List[str]:
+        """Все candidate-юниты каталога в порядке проверки, без повторов."""
+        units: List[str] = []
+        for descriptor in cls._service_catalog:
+            for candidate in descriptor.get("unit_candidates", []):
+                if candidate not in units:
+                    units.append(candidate)
+        return units
 
-        status = (
-            self._read_command_output(
-                client, f"systemctl is-active {matched_name} 2>/dev/null", timeout=10
-            )
-            or "unknown"
-        )
-        enabled = (
-            self._read_command_output(
-                client, f"systemctl is-enabled {matched_name} 2>/dev/null", timeout=10
-            )
-            or "unknown"
-        )
-        uptime_str = "stopped"
+    @classmethod
+    def _services_section_commands(cls) -> List[tuple]:
+        """Один `systemctl show` по всем юнитам + /proc/uptime для расчёта аптайма."""
+        unit_args = " ".join(u + ".service" for u in cls._catalog_units())
+        return [
+            ("service_units", f"systemctl show -p {cls._UNIT_PROPERTIES} {unit_args} 2>/dev/null"),
+            ("proc_uptime", "cat /proc/uptime"),
+        ]
 
-        if status == "active":
-            try:
-                import time
+    @staticmethod
+    def _parse_systemctl_show(output: str) -> List[Dict[str, str]]:
+        """Разобрать вывод `systemctl show` по нескольким юнитам (блоки через пустую строку)."""
+        blocks: List[Dict[str, str]] = []
+        current: Dict[str, str] = {}
+        for line in output.splitlines():
+            line = line.strip()
+            if not line:
+                if current:
+                    blocks.append(current)
+                    current = {}
+                continue
+            if "=" in line:
+                key, value = line.split("=", 1)
+                current[key] = value
+        if current:
+            blocks.append(current)
+        return blocks
 
-                timestamp_line = self._read_command_output(
-                    client,
-                    f"systemctl show {matched_name} --property=ActiveEnterTimestamp",
-                    timeout=10,
+    @staticmethod
+    def _format_service_uptime(seconds: int) -> str:
+        days = seconds // 86400
+        hours = (seconds % 86400) // 3600
+        mins = (seconds % 3600) // 60
+        if days > 0:
+            return f"{days}d {hours}h"
+        if hours > 0:
+            return f"{hours}h {mins}m"
+        return f"{mins}m"
+
+    @classmethod
+    def _parse_services_sections(cls, sections: Dict[str, Optional[str]]) -> List[Dict]:
+        units = cls._catalog_units()
+        blocks = cls._parse_systemctl_show(sections.get("service_units") or "")
+        # systemctl show печатает блоки в порядке аргументов; для алиасов
+        # (sshd -> ssh) Id отличается от запрошенного имени, поэтому сопоставляем
+        # по позиции, а по Id — только если число блоков не совпало.
+        if len(blocks) == len(units):
+            by_unit = dict(zip(units, blocks))
+        else:
+            by_unit = {b.get("Id", "").replace(".service", ""): b for b in blocks}
+
+        try:
+            boot_seconds = float((sections.get("proc_uptime") or "").split()[0])
+        except (IndexError, ValueError):
+            boot_seconds = None
+
+        services = []
+        for descriptor in cls._service_catalog:
+            matched_name = None
+            props: Dict[str, str] = {}
+            for candidate in descriptor.get("unit_candidates", []):
+                props = by_unit.get(candidate, {})
+                if props.get("LoadState") not in (None, "", "not-found"):
+                    matched_name = candidate
+                    break
+
+            if not matched_name:
+                services.append(
+                    {
+                        "name": descriptor["name"],
+                        "display_name": descriptor["display_name"],
+                        "group": descriptor["group"],
+                        "status": "not_installed",
+                        "enabled": "not-found",
+                        "uptime": "-",
+                        "unit_name": None,
+                    }
                 )
-                if timestamp_line and "=" in timestamp_line:
-                    timestamp_str = timestamp_line.split("=", 1)[1].strip()
-                    if timestamp_str:
-                        start_time = self._read_command_output(
-                            client, f'date -d "{timestamp_str}" +%s', timeout=10
-                        )
-                        if start_time.isdigit():
-                            seconds = int(time.time()) - int(start_time)
-                            days = seconds // 86400
-                            hours = (seconds % 86400) // 3600
-                            mins = (seconds % 3600) // 60
-                            if days > 0:
-                                uptime_str = f"{days}d {hours}h"
-                            elif hours > 0:
-                                uptime_str = f"{hours}h {mins}m"
-                            else:
-                                uptime_str = f"{mins}m"
-            except Exception:
+                continue
+
+            status = props.get("ActiveState") or "unknown"
+            uptime_str = "stopped"
+            if status == "active":
                 uptime_str = "active"
+                entered = props.get("ActiveEnterTimestampMonotonic", "")
+                if boot_seconds is not None and entered.isdigit() and int(entered) > 0:
+                    seconds = int(boot_seconds - int(entered) / 1_000_000)
+                    uptime_str = cls._format_service_uptime(max(0, seconds))
 
-        return {
-            "name": descriptor["name"],
-            "display_name": descriptor["display_name"],
-            "group": descriptor["group"],
-            "status": status,
-            "enabled": enabled,
-            "uptime": uptime_str,
-            "unit_name": matched_name,
-        }
+            services.append(
+                {
+                    "name": descriptor["name"],
+                    "display_name": descriptor["display_name"],
+                    "group": descriptor["group"],
+                    "status": status,
+                    "enabled": props.get("UnitFileState") or "unknown",
+                    "uptime": uptime_str,
+                    "unit_name": matched_name,
+                }
+            )
+        return services
 
     @staticmethod
     def _parse_cpu_used_pct(cpu_line: str) -> float:
@@ -323,19 +530,105 @@ class SSHService:
         idle_pct = float(match.group(1))
         return round(max(0.0, min(100.0, 100.0 - idle_pct)), 1)
 
-    def _get_cpu_used_pct(self, client, timeout: int = 30) -> float:
-        proc_stat_used = self._read_command_output(
-            client,
-            'sh -c \'read cpu u n s i io irq sirq st rest < /proc/stat; total1=$((u+n+s+i+io+irq+sirq+st)); idle1=$((i+io)); sleep 1; read cpu u n s i io irq sirq st rest < /proc/stat; total2=$((u+n+s+i+io+irq+sirq+st)); idle2=$((i+io)); dt=$((total2-total1)); di=$((idle2-idle1)); awk "BEGIN { if ($dt > 0) printf \\"%.1f\\", (100*($dt-$di)/$dt); else print 0 }"\'',
-            timeout=max(timeout, 5),
+    # Снимок счётчиков: отметка времени хоста (/proc/uptime) + сами счётчики.
+    # Без предыдущего снимка (первый опрос хоста) делаем два снимка с короткой
+    # паузой внутри одной команды.
+    _FIRST_SAMPLE_PAUSE = 0.25
+    _CPU_STAT_CMD = "cat /proc/uptime; head -n1 /proc/stat"
+    _CPU_FIRST_SAMPLE_CMD = f"{_CPU_STAT_CMD}; sleep {_FIRST_SAMPLE_PAUSE}; {_CPU_STAT_CMD}"
+
+    @classmethod
+    def _sample_key(cls, client) -> str:
+        return cls._pool_key_for(client) or f"client:{id(client)}"
+
+    @classmethod
+    def _cpu_stat_command(cls, sample_key: Optional[str]) -> str:
+        if sample_key and cls._samples.is_fresh(sample_key, "cpu"):
+            return cls._CPU_STAT_CMD
+        return cls._CPU_FIRST_SAMPLE_CMD
+
+    @staticmethod
+    def _split_counter_samples(output: str) -> List[tuple]:
+        """Разбить вывод на снимки [(uptime, [строки счётчиков])] по строкам /proc/uptime."""
+        samples: List[tuple] = []
+        for line in (output or "").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if re.match(r"^\d+\.\d+\s+\d+\.\d+$", line):
+                samples.append((float(line.split()[0]), []))
+            elif samples:
+                samples[-1][1].append(line)
+        return samples
+
+    @classmethod
+    def _cpu_pct_from_output(cls, sample_key: str, output: str) -> Optional[float]:
+        """Загрузка CPU по снимкам /proc/stat.
+
+        ValueError — строки cpu нет (нужен fallback на top/vmstat);
+        None — счётчики прочитаны, но сравнивать пока не с чем.
+        """
+        cpu_used = None
+        parsed = False
+        for timestamp, lines in cls._split_counter_samples(output):
+            cpu_line = next((l for l in lines if l.startswith("cpu ")), None)
+            if cpu_line is None:
+                continue
+            fields = [int(v) for v in cpu_line.split()[1:9]]
+            cpu_used = cls._update_cpu_sample(sample_key, fields, timestamp)
+            parsed = True
+        if not parsed:
+            raise ValueError("no /proc/stat cpu line")
+        return cpu_used
+
+    @classmethod
+    def _update_cpu_sample(
+        cls, sample_key: str, fields: List[int], timestamp: float
+    ) -> Optional[float]:
+        """Снимок строки cpu из /proc/stat -> загрузка к прошлому снимку или None."""
+        # user nice system idle iowait irq softirq steal
+        counters = {"total": sum(fields), "idle": fields[3] + fields[4]}
+        result = cls._samples.update(sample_key, "cpu", counters, timestamp)
+        if result is None or not result[0].get("total"):
+            return None
+        deltas = result[0]
+        used = 100.0 * (deltas["total"] - deltas.get("idle", 0)) / deltas["total"]
+        return round(max(0.0, min(100.0, used)), 1)
+
+    def _get_cpu_used_pct(
+        self, client, timeout: int = 30, force_sample: bool = False
+    ) -> float:
+        capabilities = self._known_capabilities(client)
+        if capabilities and capabilities["cpu_method"] != "proc_stat":
+            return self._get_cpu_used_pct_fallback(client, timeout=timeout)
+        sample_key = self._sample_key(client)
+        command = (
+            self._CPU_FIRST_SAMPLE_CMD
+            if force_sample
+            else self._cpu_stat_command(sample_key)
         )
         try:
-            cpu_used = float((proc_stat_used or "0").replace(",", "."))
-            if 0.0 <= cpu_used <= 100.0:
-                return round(cpu_used, 1)
+            output = self._read_command_output(client, command, timeout=max(timeout, 5))
+            cpu_used = self._cpu_pct_from_output(sample_key, output)
+            if cpu_used is None and command != self._CPU_FIRST_SAMPLE_CMD:
+                # Счётчики сбросились (перезагрузка) — короткий замер в этом запросе
+                output = self._read_command_output(
+                    client, self._CPU_FIRST_SAMPLE_CMD, timeout=max(timeout, 5)
+                )
+                cpu_used = self._cpu_pct_from_output(sample_key, output)
+            if cpu_used is not None:
+                return cpu_used
         except ValueError:
             pass
 
+        return self._get_cpu_used_pct_fallback(client, timeout=timeout)
+
+    def _get_cpu_used_pct_fallback(self, client, timeout: int = 30) -> float:
+        """CPU через top/vmstat — когда /proc/stat не дал результата."""
+        capabilities = self._known_capabilities(client)
+        if capabilities and capabilities["cpu_method"] == "vmstat":
+            return self._get_cpu_used_pct_vmstat(client, timeout=timeout)
+
         cpu_line = self._read_command_output(
             client,
             "LANG=C LC_ALL=C top -bn1 | sed -n 's/^%\\?Cpu(s)\\?:\\s*//p' | head -n1",
@@ -354,6 +647,9 @@ class SSHService:
         if cpu_used > 0:
             return cpu_used
 
+        return self._get_cpu_used_pct_vmstat(client, timeout=timeout)
+
+    def _get_cpu_used_pct_vmstat(self, client, timeout: int = 30) -> float:
         idle_raw = self._read_command_output(
             client,
             "LANG=C LC_ALL=C vmstat 1 2 | tail -1 | awk '{print $15}'",
@@ -366,10 +662,82 @@ class SSHService:
 
         return round(max(0.0, min(100.0, 100.0 - idle_pct)), 1)
 
+    # Счётчики всех интерфейсов одним чтением /proc/net/dev (+ время хоста)
+    _NET_COUNTERS_CMD = "cat /proc/uptime; cat /proc/net/dev"
+    _NET_FIRST_SAMPLE_CMD = (
+        f"{_NET_COUNTERS_CMD}; sleep {_FIRST_SAMPLE_PAUSE}; {_NET_COUNTERS_CMD}"
+    )
+
+    @classmethod
+    def _network_section_commands(
+        cls, sample_key: Optional[str] = None, capabilities: Optional[Dict] = None
+    ) -> List[tuple]:
+        if sample_key and cls._samples.is_fresh(sample_key, "net"):
+            counters = cls._NET_COUNTERS_CMD
+        else:
+            counters = cls._NET_FIRST_SAMPLE_CMD
+        commands = [("net_counters", counters)]
+        if capabilities is None or capabilities.get("vnstat"):
+            commands.append(
+                ("vnstat", "command -v vnstat >/dev/null 2>&1 && { vnstat --json 2>/dev/null || echo '{}'; }")
+            )
+        return commands
+
+    @staticmethod
+    def _parse_proc_net_dev(lines: List[str]) -> Dict[str, tuple]:
+        """{iface: (rx_bytes, tx_bytes)} для мониторимых интерфейсов."""
+        counters = {}
+        for line in lines:
+            match = _PROC_NET_DEV_RE.match(line)
+            if match and _NET_IFACE_RE.match(match.group(1)):
+                counters[match.group(1)] = (int(match.group(2)), int(match.group(3)))
+        return counters
+
+    @classmethod
+    def _net_rates_from_output(cls, sample_key: str, output: str) -> tuple:
+        """(интерфейсы, {iface: (rx MB/s, tx MB/s)} или None) по снимкам счётчиков."""
+        interfaces: List[str] = []
+        rates = None
+        for timestamp, lines in cls._split_counter_samples(output):
+            per_iface = cls._parse_proc_net_dev(lines)
+            interfaces = list(per_iface)
+            rates = cls._update_net_sample(sample_key, per_iface, timestamp)
+        return interfaces, rates
+
+    @classmethod
+    def _update_net_sample(
+        cls, sample_key: str, per_iface: Dict[str, tuple], timestamp: float
+    ) -> Optional[Dict[str, tuple]]:
+        """Снимок {iface: (rx, tx)} -> {iface: (rx MB/s, tx MB/s)} к прошлому снимку или None."""
+        counters = {}
+        for iface, (rx, tx) in per_iface.items():
+            counters[f"{iface}:rx"] = rx
+            counters[f"{iface}:tx"] = tx
+        result = cls._samples.update(sample_key, "net", counters, timestamp)
+        if result is None:
+            return None
+        deltas, elapsed = result
+        rates = {}
+        for iface in per_iface:
+            rx = deltas.get(f"{iface}:rx", 0)
+            tx = deltas.get(f"{iface}:tx", 0)
+            rates[iface] = (rx / elapsed / 1048576, tx / elapsed / 1048576)  # MB/s
+        return rates
+
+    # ss с фолбэком на netstat в одной команде (формат строк: "proto|адрес:порт")
+    _LISTENERS_CMD = (
+        "if command -v ss >/dev/null 2>&1; then ss -tulnH 2>/dev/null | awk '{print $1 \"|\" $5}'; "
+        "else netstat -tuln 2>/dev/null | awk 'NR>2 {print $1 \"|\" $4}'; fi"
+    )
+
     def _get_listening_ports(self, client) -> List[str]:
-        output = self._read_command_output(
-            client, "ss -tulnH 2>/dev/null | awk '{print $1 \"|\" $5}'", timeout=15
-        )
+        capabilities = self._known_capabilities(client)
+        if capabilities and capabilities["listeners"] == "netstat":
+            output = ""
+        else:
+            output = self._read_command_output(
+                client, "ss -tulnH 2>/dev/null | awk '{print $1 \"|\" $5}'", timeout=15
+            )
 
         ports = self._parse_listener_ports(output)
         if ports:
@@ -382,72 +750,621 @@ class SSHService:
         )
         return self._parse_listener_ports(output)
 
+    @staticmethod
+    def _pool_key(hostname: str, port: int, username: str) -> str:
+        return f"{hostname}:{port}:{username}"
+
     @classmethod
-    def get_connection_pooled(
+    def _get_key_lock(cls, key: str) -> threading.Lock:
+        """Lock конкретного host:port:user (создаётся при первом обращении)."""
+        with cls._pool_lock:
+            lock = cls._key_locks.get(key)
+            if lock is None:
+                lock = cls._key_locks[key] = threading.Lock()
+            return lock
+
+    @classmethod
+    def _connect_client(
         cls,
+        ssh,
         hostname: str,
         port: int,
         username: str,
-        password: Optional[str] = None,
-        connection_timeout: int = 30,
-    ):
-        """Получить или создать SSH подключение (с переиспользованием)"""
-        key = f"{hostname}:{port}:{username}"
+        password: Optional[str],
+        connection_timeout: int,
+    ) -> None:
+        """connect() с таймаутами пула и transport keepalive."""
+        # Для быстрых проверок используем короткие таймауты
+        banner_timeout = min(connection_timeout * 2, 60)
+        auth_timeout = min(connection_timeout, 30)
+
+        ssh.connect(
+            hostname,
+            port=port,
+            username=username,
+            password=password,
+            timeout=connection_timeout,  # Настраиваемый таймаут
+            banner_timeout=banner_timeout,  # Динамический на основе connection_timeout
+            auth_timeout=auth_timeout,  # Динамический на основе connection_timeout
+            look_for_keys=False,  # Не искать SSH ключи (быстрее)
+            allow_agent=False,  # Не использовать SSH agent
+        )
+        transport = ssh.get_transport()
+        if transport is not None:
+            transport.set_keepalive(cls._KEEPALIVE_INTERVAL)
+
+    @classmethod
+    def configure_pool(
+        cls,
+        max_size: Optional[int] = None,
+        idle_ttl: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        capabilities_ttl: Optional[int] = None,
+        facts_ttl: Optional[int] = None,
+    ) -> None:
+        """Настроить границы пула (вызывается при регистрации сервисов)."""
+        if max_size is not None:
+            cls._POOL_MAX_SIZE = max(1, int(max_size))
+        if idle_ttl is not None:
+            cls._POOL_IDLE_TTL = max(1, int(idle_ttl))
+        if max_sessions is not None:
+            cls._MAX_SESSIONS = max(1, int(max_sessions))
+            with cls._pool_lock:
+                cls._session_slots.clear()
+                executor, cls._pipe_executor = cls._pipe_executor, None
+            if executor is not None:
+                # Запущенные команды доработают; новые пойдут в пул нового размера
+                executor.shutdown(wait=False)
+        if capabilities_ttl is not None:
+            cls._capabilities.ttl = max(1, int(capabilities_ttl))
+        if facts_ttl is not None:
+            cls._facts.ttl = max(1, int(facts_ttl))
 
+    @classmethod
+    def _touch(cls, key: str) -> None:
         with cls._pool_lock:
-            # Проверяем есть ли живое подключение
-            if key in cls._connection_pool:
-                conn = cls._connection_pool[key]
-                try:
-                    if conn.get_transport() and conn.get_transport().is_active():
-                        # Проверяем что подключение работает
-                        conn.exec_command("echo test", timeout=5)
-                        logger.info(f"♻️ Reusing existing connection to {hostname}")
-                        return conn
-                    else:
-                        logger.info(f"💀 Old connection dead, removing")
-                        del cls._connection_pool[key]
-                except Exception as e:
-                    logger.warning(f"Connection check failed: {e}")
-                    if key in cls._connection_pool:
-                        del cls._connection_pool[key]
+            meta = cls._pool_meta.get(key)
+            if meta is not None:
+                meta["last_used"] = time.monotonic()
+                meta["last_used_at"] = time.time()
+                if key in cls._connection_pool:
+                    cls._connection_pool.move_to_end(key)
 
-            # Создаем новое подключение
-            logger.info(
-                f"🔌 Creating new SSH connection to {hostname} (timeout: {connection_timeout}s)"
+    @classmethod
+    def _record_io(
+        cls, client, commands: int = 0, bytes_in: int = 0, bytes_out: int = 0
+    ) -> None:
+        with cls._pool_lock:
+            key = cls._client_keys.get(id(client))
+            meta = cls._pool_meta.get(key) if key else None
+            if meta is not None:
+                meta["commands"] += commands
+                meta["bytes_in"] += bytes_in
+                meta["bytes_out"] += bytes_out
+
+    @classmethod
+    def _pool_key_for(cls, client) -> Optional[str]:
+        with cls._pool_lock:
+            return cls._client_keys.get(id(client))
+
+    @classmethod
+    def _pool_insert(cls, key: str, client, connect_kwargs: Dict) -> None:
+        """Положить подключение в пул; сверх _POOL_MAX_SIZE вытесняются LRU."""
+        now = time.monotonic()
+        with cls._pool_lock:
+            cls._connection_pool[key] = client
+            cls._connection_pool.move_to_end(key)
+            cls._client_keys[id(client)] = key
+            cls._pool_meta[key] = {
+                "connect_kwargs": connect_kwargs,
+                "created_at": time.time(),
+                "last_used": now,
+                "last_used_at": time.time(),
+                "commands": 0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+            }
+            overflow = len(cls._connection_pool) - cls._POOL_MAX_SIZE
+            candidates = [k for k in cls._connection_pool if k != key]
+        # Вытесняем самые давние; подключение, которое прямо сейчас
+        # проверяется/устанавливается (занят lock ключа), пропускаем
+        for old_key in candidates:
+            if overflow <= 0:
+                break
+            if cls._remove_if(old_key, lambda meta: True, "Pool full, evicting LRU"):
+                overflow -= 1
+        cls._ensure_reaper()
+
+    @classmethod
+    def _pool_remove_locked(cls, key: str):
+        """Убрать запись из пула (вызывать под _pool_lock); вернуть клиента."""
+        conn = cls._connection_pool.pop(key, None)
+        cls._pool_meta.pop(key, None)
+        cls._shell_sessions.pop(key, None)  # канал закроется вместе с транспортом
+        cls._capabilities.invalidate(key)
+        if conn is not None:
+            cls._client_keys.pop(id(conn), None)
+        return conn
+
+    @classmethod
+    def _forget_key_state_locked(cls, key: str) -> None:
+        """Убрать lock и семафор каналов ключа без записи в пуле (вызывать под _pool_lock).
+
+        Занятые остаются: lock держит установка подключения, семафор — идущие
+        команды _run_pipelined.
+        """
+        if key in cls._connection_pool:
+            return
+        lock = cls._key_locks.get(key)
+        if lock is not None and not lock.locked():
+            del cls._key_locks[key]
+        slot = cls._session_slots.get(key)
+        if slot is not None and slot._value == slot._initial_value:
+            del cls._session_slots[key]
+
+    @classmethod
+    def _sweep_key_state_locked(cls) -> None:
+        """Убрать освободившиеся lock'и и семафоры ключей, которых уже нет в пуле."""
+        for key in set(cls._key_locks) | set(cls._session_slots):
+            cls._forget_key_state_locked(key)
+
+    @staticmethod
+    def _close_quietly(key: str, conn) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing connection {key}: {e}")
+
+    @classmethod
+    def _remove_if(cls, key: str, predicate, reason: str) -> bool:
+        """Закрыть и убрать запись, если она не занята и predicate(meta) истинен."""
+        key_lock = cls._get_key_lock(key)
+        if not key_lock.acquire(blocking=False):
+            return False
+        try:
+            with cls._pool_lock:
+                meta = cls._pool_meta.get(key)
+                if meta is None or not predicate(meta):
+                    return False
+                conn = cls._pool_remove_locked(key)
+        finally:
+            key_lock.release()
+            with cls._pool_lock:
+                cls._forget_key_state_locked(key)
+        logger.info(f"{reason}: {key}")
+        cls._close_quietly(key, conn)
+        return True
+
+    @classmethod
+    def reap_idle_connections(cls) -> int:
+        """Закрыть подключения, простаивающие дольше _POOL_IDLE_TTL."""
+        deadline = time.monotonic() - cls._POOL_IDLE_TTL
+        with cls._pool_lock:
+            keys = list(cls._pool_meta)
+        reaped = 0
+        for key in keys:
+            if cls._remove_if(
+                key,
+                lambda meta: meta["last_used"] < deadline,
+                "Closing idle SSH connection",
+            ):
+                reaped += 1
+        # Занятые при удалении подключения lock или семафор уже освободились
+        with cls._pool_lock:
+            cls._sweep_key_state_locked()
+        return reaped
+
+    @classmethod
+    def _reaper_loop(cls, stop: threading.Event) -> None:
+        while not stop.wait(min(30.0, cls._POOL_IDLE_TTL / 4)):
+            try:
+                cls.reap_idle_connections()
+            except Exception as e:
+                logger.warning(f"SSH pool reaper error: {e}")
+
+    @classmethod
+    def _ensure_reaper(cls) -> None:
+        with cls._pool_lock:
+            if (
+                cls._reaper_thread is not None
+                and cls._reaper_thread.is_alive()
+                and not cls._reaper_stop.is_set()
+            ):
+                return
+            cls._reaper_stop = threading.Event()
+            cls._reaper_thread = threading.Thread(
+                target=cls._reaper_loop,
+                args=(cls._reaper_stop,),
+                name="ssh-pool-reaper",
+                daemon=True,
             )
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            cls._reaper_thread.start()
 
+    @classmethod
+    def pool_stats(cls) -> Dict:
+        """Снимок пула для /api/monitoring/stats/system."""
+        now = time.monotonic()
+        with cls._pool_lock:
+            entries = list(cls._connection_pool.items())
+            metas = {key: dict(cls._pool_meta.get(key, {})) for key, _ in entries}
+            shell_keys = set(cls._shell_sessions)
+        connections = []
+        for key, conn in entries:
+            meta = metas[key]
             try:
-                # Для быстрых проверок используем короткие таймауты
-                banner_timeout = min(connection_timeout * 2, 60)
-                auth_timeout = min(connection_timeout, 30)
-
-                ssh.connect(
-                    hostname,
-                    port=port,
-                    username=username,
-                    password=password,
-                    timeout=connection_timeout,  # Настраиваемый таймаут
-                    banner_timeout=banner_timeout,  # Динамический на основе connection_timeout
-                    auth_timeout=auth_timeout,  # Динамический на основе connection_timeout
-                    look_for_keys=False,  # Не искать SSH ключи (быстрее)
-                    allow_agent=False,  # Не использовать SSH agent
+                transport = conn.get_transport()
+                alive = bool(transport and transport.is_active())
+            except Exception:
+                alive = False
+            connections.append(
+                {
+                    "key": key,
+                    "alive": alive,
+                    "created_at": meta.get("created_at"),
+                    "last_used": meta.get("last_used_at"),
+                    "idle_seconds": round(now - meta.get("last_used", now), 1),
+                    "commands": meta.get("commands", 0),
+                    "bytes_in": meta.get("bytes_in", 0),
+                    "bytes_out": meta.get("bytes_out", 0),
+                    "shell_session": key in shell_keys,
+                }
+            )
+        return {
+            "size": len(connections),
+            "max_size": cls._POOL_MAX_SIZE,
+            "idle_ttl": cls._POOL_IDLE_TTL,
+            "max_sessions": cls._MAX_SESSIONS,
+            "shell_sessions": cls._SHELL_SESSIONS_ENABLED,
+            "connections": connections,
+        }
+
+    @classmethod
+    def _exec_command(cls, client, command: str, timeout: Optional[int] = None):
+        """exec_command с одной прозрачной повторной попыткой.
+
+        Если канал не открылся на подключении из пула (транспорт умер между
+        запросами), клиент переподключается на месте — ссылки на него у
+        вызывающего кода остаются валидными — и команда повторяется.
+        """
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        key = cls._pool_key_for(client)
+        try:
+            result = client.exec_command(command, **kwargs)
+        except (SSHException, EOFError, OSError) as e:
+            meta = cls._pool_meta.get(key) if key else None
+            if meta is None:
+                raise
+            logger.warning(f"Channel open failed on {key}, reconnecting: {e}")
+            with cls._get_key_lock(key):
+                transport = client.get_transport()
+                # Другой поток мог уже переподключить клиент
+                if not (transport and transport.is_active()):
+                    try:
+                        client.close()
+                    except Exception:
+                        pass
+                    cls._connect_client(client, **meta["connect_kwargs"])
+            result = client.exec_command(command, **kwargs)
+        if key:
+            cls._touch(key)
+            cls._record_io(client, commands=1, bytes_out=len(command.encode("utf-8")))
+        return result
+
+    @classmethod
+    def _session_slot(cls, client) -> threading.BoundedSemaphore:
+        """Семафор каналов подключения: не больше _MAX_SESSIONS одновременно."""
+        key = cls._pool_key_for(client)
+        if key is None:
+            return threading.BoundedSemaphore(cls._MAX_SESSIONS)
+        with cls._pool_lock:
+            slot = cls._session_slots.get(key)
+            if slot is None:
+                slot = cls._session_slots[key] = threading.BoundedSemaphore(cls._MAX_SESSIONS)
+            return slot
+
+    def _run_pipelined_command(
+        self,
+        client,
+        slot: threading.BoundedSemaphore,
+        command: str,
+        timeout: int,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict:
+        with slot:
+            for attempt in range(3):
+                try:
+                    _, stdout, stderr = self._exec_command(client, command, timeout=timeout)
+                    break
+                except paramiko.ChannelException:
+                    # Лимит MaxSessions заняли чужие каналы — ждём, пока освободятся
+                    if attempt == 2:
+                        raise
+                    time.sleep(0.2 * (attempt + 1))
+            if deadline is None:
+                output = stdout.read()
+                error = stderr.read()
+                exit_code = stdout.channel.recv_exit_status()
+            else:
+                timer, cut = self._cut_at_deadline(stdout, deadline)
+                try:
+                    output = stdout.read()
+                    error = stderr.read()
+                    exit_code = stdout.channel.recv_exit_status()
+                finally:
+                    timer.cancel()
+                if cut.is_set():
+                    raise socket.timeout(f"deadline of {deadline.seconds}s passed")
+        self._record_io(client, bytes_in=len(output) + len(error))
+        return {
+            "stdout": output.decode("utf-8", "replace").strip(),
+            "stderr": error.decode("utf-8", "replace").strip(),
+            "exit_code": exit_code,
+        }
+
+    @classmethod
+    def _pipeline_executor(cls) -> ThreadPoolExecutor:
+        """Общий долгоживущий пул потоков для каналов _run_pipelined."""
+        with cls._pool_lock:
+            if cls._pipe_executor is None:
+                cls._pipe_executor = ThreadPoolExecutor(
+                    max_workers=cls._MAX_SESSIONS * cls._PIPE_HOSTS, thread_name_prefix="ssh-pipe"
+                )
+            return cls._pipe_executor
+
+    def _run_pipelined(
+        self,
+        client,
+        commands: List[tuple],
+        timeout: int = 30,
+        raise_errors: bool = True,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Dict]:
+        """Независимые команды одновременно, каждая в своём канале подключения.
+
+        Каналы открываются все сразу (в пределах _MAX_SESSIONS), результаты
+        читаются по мере завершения: N проб стоят примерно одного round trip,
+        а не N. Возвращает {имя: {"stdout", "stderr", "exit_code"}} в порядке
+        commands. Ошибка любой команды пробрасывается после завершения
+        остальных, как при последовательном запуске; с raise_errors=False
+        команда с ошибкой получает stdout=None и поле error. При включённых
+        shell-сессиях весь пакет уходит в сессию хоста одним send. С deadline
+        ответ каждой команды ждётся не дольше его остатка (вместо timeout).
+        """
+        if not commands:
+            return {}
+        if deadline is None:
+            shell_results = self._run_in_shell(
+                client, [command for _, command in commands], timeout
+            )
+        else:
+            shell_results = self._run_in_shell(
+                client, [command for _, command in commands], deadline.remaining(), min_timeout=0
+            )
+        if shell_results is not None:
+            return {
+                name: dict(result, stdout=result["stdout"].strip(), stderr=result["stderr"].strip())
+                for (name, _), result in zip(commands, shell_results)
+            }
+        if deadline is not None:
+            if deadline.expired:
+                error = socket.timeout(f"deadline of {deadline.seconds}s passed")
+                if raise_errors:
+                    raise error
+                return {name: self._failed_result(error) for name, _ in commands}
+            timeout = deadline.remaining() + Deadline.KILL_GRACE
+        slot = self._session_slot(client)
+        executor = self._pipeline_executor()
+        futures = [
+            (
+                name,
+                executor.submit(
+                    self._run_pipelined_command, client, slot, command, timeout, deadline
+                ),
+            )
+            for name, command in commands
+        ]
+        wait([future for _, future in futures])
+        results = {}
+        for name, future in futures:
+            error = future.exception()
+            if error is None:
+                results[name] = future.result()
+            elif raise_errors:
+                raise error
+            else:
+                logger.debug(f"Pipelined command '{name}' failed: {error}")
+                results[name] = self._failed_result(error)
+        return results
+
+    @staticmethod
+    def _failed_result(error: Exception) -> Dict:
+        return {"stdout": None, "stderr": "", "exit_code": None, "error": str(error)}
+
+    @classmethod
+    def configure_shell_sessions(cls, enabled: Optional[bool] = None) -> None:
+        """Включить/выключить backend постоянных shell-сессий."""
+        if enabled is not None:
+            cls._SHELL_SESSIONS_ENABLED = bool(enabled)
+        if not cls._SHELL_SESSIONS_ENABLED:
+            with cls._pool_lock:
+                sessions = list(cls._shell_sessions.values())
+                cls._shell_sessions.clear()
+            for session in sessions:
+                session.close()
+
+    @classmethod
+    def _shell_session(cls, client) -> Optional[ShellSession]:
+        """Сессия пулового подключения (открывается при первом обращении)."""
+        key = cls._pool_key_for(client)
+        if key is None:
+            return None
+        with cls._pool_lock:
+            session = cls._shell_sessions.get(key)
+        if session is not None and session.alive:
+            return session
+        with cls._get_key_lock(key):
+            with cls._pool_lock:
+                session = cls._shell_sessions.get(key)
+            if session is not None and session.alive:
+                return session
+            channel = client.get_transport().open_session(timeout=10)
+            session = ShellSession(channel)
+            with cls._pool_lock:
+                cls._shell_sessions[key] = session
+            logger.debug(f"Opened shell session on {key}")
+            return session
+
+    def _run_in_shell(
+        self, client, commands: List[str], timeout: float, min_timeout: float = 5
+    ) -> Optional[List[Dict]]:
+        """Команды в shell-сессии хоста; None — выполнить обычным exec.
+
+        None возвращается, если backend выключен, подключение не из пула, сессия
+        занята другим потоком (тот не ждёт очереди) или сломалась. timeout — на
+        весь пакет, не меньше min_timeout (с дедлайном — ровно его остаток).
+        """
+        if not self._SHELL_SESSIONS_ENABLED:
+            return None
+        key = self._pool_key_for(client)
+        try:
+            session = self._shell_session(client)
+        except Exception as e:
+            logger.warning(f"Shell session open failed on {key}, using exec: {e}")
+            return None
+        if session is None or not session.lock.acquire(blocking=False):
+            return None
+        try:
+            results = session.run_many(commands, timeout=max(timeout, min_timeout))
+        except ShellSessionError as e:
+            logger.warning(f"Shell session on {key} failed, using exec: {e}")
+            with self._pool_lock:
+                if self._shell_sessions.get(key) is session:
+                    del self._shell_sessions[key]
+            session.close()
+            return None
+        finally:
+            session.lock.release()
+        self._touch(key)
+        self._record_io(
+            client,
+            commands=len(commands),
+            bytes_in=sum(len(r["stdout"]) + len(r["stderr"]) for r in results),
+            bytes_out=sum(len(c.encode("utf-8")) for c in commands),
+        )
+        return results
+
+    @classmethod
+    def get_connection_pooled(
+        cls,
+        hostname: str,
+        port: int,
+        username: str,
+        password: Optional[str] = None,
+        connection_timeout: int = 30,
+    ):
+        """Получить или создать SSH подключение (с переиспользованием)
+
+        Глобальный _pool_lock защищает только словари пула и берётся на
+        микросекунды. Проверка и установка подключения (handshake до
+        connection_timeout секунд) идут под lock'ом своего ключа, поэтому
+        медленный или мёртвый хост не блокирует запросы к остальным серверам.
+        """
+        key = cls._pool_key(hostname, port, username)
+
+        try:
+            with cls._get_key_lock(key):
+                with cls._pool_lock:
+                    conn = cls._connection_pool.get(key)
+
+                # Проверяем есть ли живое подключение. Transport keepalive сам
+                # гасит is_active() у мёртвого пира, поэтому свежее подключение
+                # отдаём без round trip; exec-проверка — только после простоя.
+                if conn is not None:
+                    try:
+                        if conn.get_transport() and conn.get_transport().is_active():
+                            idle = time.monotonic() - cls._pool_meta.get(key, {}).get(
+                                "last_used", 0.0
+                            )
+                            if idle >= cls._IDLE_PROBE_AFTER:
+                                cls._probe_connection(conn)
+                            cls._touch(key)
+                            logger.debug(f"♻️ Reusing existing connection to {hostname}")
+                            return conn
+                        else:
+                            logger.info(f"💀 Old connection dead, removing")
+                    except Exception as e:
+                        logger.warning(f"Connection check failed: {e}")
+                    with cls._pool_lock:
+                        if cls._connection_pool.get(key) is conn:
+                            cls._pool_remove_locked(key)
+                    # Иначе у мёртвого клиента остаются сокет и поток транспорта
+                    cls._close_quietly(key, conn)
+
+                # Создаем новое подключение (вне глобального lock)
+                logger.info(
+                    f"🔌 Creating new SSH connection to {hostname} (timeout: {connection_timeout}s)"
                 )
+                ssh = paramiko.SSHClient()
+                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+                connect_kwargs = {
+                    "hostname": hostname,
+                    "port": port,
+                    "username": username,
+                    "password": password,
+                    "connection_timeout": connection_timeout,
+                }
+                try:
+                    cls._connect_client(ssh, **connect_kwargs)
+                except Exception as e:
+                    logger.error(f"Failed to connect to {hostname}: {e}")
+                    raise
 
-                cls._connection_pool[key] = ssh
+                cls._pool_insert(key, ssh, connect_kwargs)
                 logger.info(f"✅ New connection created and pooled: {hostname}")
                 return ssh
+        except Exception:
+            # Подключиться не удалось: lock ключа без записи в пуле не копим
+            with cls._pool_lock:
+                cls._forget_key_state_locked(key)
+            raise
 
-            except Exception as e:
-                logger.error(f"Failed to connect to {hostname}: {e}")
-                raise
+    @classmethod
+    def close_pooled_connection(cls, hostname: str, port: int, username: str) -> bool:
+        """Закрыть подключение хоста из пула (сервер удалён или изменён).
+
+        Занятое подключение не трогается — его закроет reaper после простоя.
+        """
+        return cls._remove_if(
+            cls._pool_key(hostname, port, username),
+            lambda meta: True,
+            "Server forgotten, closing SSH connection",
+        )
+
+    @classmethod
+    def _probe_connection(cls, conn) -> None:
+        """Выполнить `true` в отдельном канале; исключение — подключение не годится.
+
+        Код выхода ждётся не дольше _IDLE_PROBE_TIMEOUT, канал закрывается
+        в любом случае.
+        """
+        channel = conn.get_transport().open_session(timeout=cls._IDLE_PROBE_TIMEOUT)
+        try:
+            channel.settimeout(cls._IDLE_PROBE_TIMEOUT)
+            channel.exec_command("true")
+            if not channel.status_event.wait(cls._IDLE_PROBE_TIMEOUT):
+                raise socket.timeout("idle probe got no exit status")
+            exit_code = channel.recv_exit_status()
+            if exit_code != 0:
+                raise SSHException(f"idle probe exited with {exit_code}")
+        finally:
+            channel.close()
 
     @classmethod
     def close_all(cls):
         """Закрыть все подключения (вызывать при остановке приложения)"""
         logger.info("Closing all SSH connections...")
+        cls.stop_metrics_streams()
         with cls._pool_lock:
             for key, conn in list(cls._connection_pool.items()):
                 try:
@@ -456,6 +1373,13 @@ class SSHService:
                 except Exception as e:
                     logger.warning(f"Error closing connection {key}: {e}")
             cls._connection_pool.clear()
+            cls._pool_meta.clear()
+            cls._client_keys.clear()
+            cls._shell_sessions.clear()
+            cls._sweep_key_state_locked()
+        cls._capabilities.clear()
+        cls._facts.clear()
+        cls._reaper_stop.set()
         logger.info("All SSH connections closed")
 
     def connect(
@@ -558,10 +1482,13 @@ class SSHService:
             )
 
             logger.info(f"Executing remote command on {ip}: {command}")
-            _, stdout, stderr = client.exec_command(command, timeout=timeout)
+            _, stdout, stderr = self._exec_command(client, command, timeout=timeout)
 
-            output = stdout.read().decode("utf-8")
-            error = stderr.read().decode("utf-8")
+            output_bytes = stdout.read()
+            error_bytes = stderr.read()
+            self._record_io(client, bytes_in=len(output_bytes) + len(error_bytes))
+            output = output_bytes.decode("utf-8")
+            error = error_bytes.decode("utf-8")
             exit_status = stdout.channel.recv_exit_status()
 
             return {
@@ -634,189 +1561,571 @@ class SSHService:
             logger.error(f"Error listing directory: {str(e)}")
             raise SSHConnectionError(f"Directory listing failed: {str(e)}")
 
-    def get_server_stats(
-        self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
-    ) -> Dict:
-        """Получение статистики сервера через SSH"""
-        stats = {}
-
-        try:
-            # Используем connection pooling
-            client = self.get_connection_pooled(ip, port, user, password)
-
-            # Uptime
-            try:
-                _, stdout, _ = client.exec_command("uptime -p 2>/dev/null || uptime")
-                uptime_output = stdout.read().decode("utf-8").strip()
-                stats["uptime"] = uptime_output
-            except:
-                stats["uptime"] = "N/A"
+    # Разделы статистики сервера: (имя, команда). Последовательный режим
+    # выполняет каждую команду отдельным exec_command, пакетный — склеивает их
+    # в один shell-скрипт с маркерами разделов (один round trip вместо ~13).
+    _STATS_SECTIONS = [
+        ("uptime", "uptime -p 2>/dev/null || uptime"),
+        (
+            "os",
+            "cat /etc/os-release 2>/dev/null | grep PRETTY_NAME | cut -d= -f2 | tr -d '\"'",
+        ),
+        ("nproc", "nproc"),
+        ("kernel", "uname -r"),
+        ("cpu", None),  # снимок /proc/stat, см. _cpu_stat_command
+        ("free", "free -m"),
+        ("loadavg", "cat /proc/loadavg"),
+        # -P (POSIX) держит каждую запись на одной строке (без переноса длинных имён),
+        # -x исключает псевдо-ФС. Не требуем префикс /dev/ — на части VPS реальные
+        # ФС не начинаются с /dev/, из-за чего таблица Mount получалась пустой.
+        (
+            "disks",
+            "df -hP -x tmpfs -x devtmpfs -x squashfs -x overlay 2>/dev/null | tail -n +2 | head -10",
+        ),
+        ("processes", "ps -eo pid,comm,%cpu,%mem --sort=-%cpu | head -n 15"),
+        ("net", "ip -o addr show"),
+        ("docker_version", "docker --version 2>/dev/null"),
+        (
+            "docker_ps",
+            'docker ps --format "{{.ID}}|{{.Names}}|{{.Status}}|{{.Image}}" 2>/dev/null',
+        ),
+        ("app_services", None),  # команда строится из _service_catalog
+    ]
+    _SECTION_MARKER = "@@VSM-SECTION@@"
 
-            # OS Info
-            try:
-                _, stdout, _ = client.exec_command(
-                    "cat /etc/os-release 2>/dev/null | grep PRETTY_NAME | cut -d= -f2 | tr -d '\"'"
-                )
-                os_name = stdout.read().decode("utf-8").strip()
-                stats["os"] = os_name if os_name else "Linux"
-            except:
-                stats["os"] = "Linux"
+    @classmethod
+    def _app_service_units(cls) -> Dict[str, Dict]:
+        """systemd-юниты стека TelegramOnly: первый candidate -> дескриптор."""
+        app_units = [d for d in cls._service_catalog if d.get("group") == "telegramonly"]
+        return {d["unit_candidates"][0]: d for d in app_units}
 
-            # CPU Info
-            try:
-                _, stdout, _ = client.exec_command("nproc")
-                cores = stdout.read().decode("utf-8").strip()
+    @classmethod
+    def _stats_section_commands(
+        cls, sample_key: Optional[str] = None, capabilities: Optional[Dict] = None
+    ) -> List[tuple]:
+        unit_args = " ".join(u + ".service" for u in cls._app_service_units())
+        commands = []
+        for name, command in cls._STATS_SECTIONS:
+            if name.startswith("docker_") and capabilities and not capabilities.get("docker"):
+                continue
+            if name == "app_services":
+                command = f"systemctl list-units --type=service --all --no-legend {unit_args} 2>/dev/null"
+            elif name == "cpu":
+                command = cls._cpu_stat_command(sample_key)
+            commands.append((name, command))
+        return commands
 
-                _, stdout, _ = client.exec_command("uname -r")
-                kernel = stdout.read().decode("utf-8").strip()
+    @classmethod
+    def _build_batch_script(
+        cls, sections: List[tuple], deadline: Optional[Deadline] = None
+    ) -> str:
+        """Склеить команды разделов в один скрипт с маркерами `@@VSM-SECTION@@ <имя>`.
 
-                stats["cpu"] = {
-                    "cores": int(cores) if cores else 0,
-                    "used_pct": self._get_cpu_used_pct(client, timeout=timeout),
-                    "kernel": kernel,
-                }
-            except:
-                stats["cpu"] = {"cores": 0, "used_pct": 0.0, "kernel": "N/A"}
+        С deadline каждый раздел выполняется в пределах своего бюджета.
+        """
+        lines = []
+        budgets = {}
+        if deadline is not None:
+            budgets = deadline.budgets([name for name, _ in sections])
+            lines.append(guard_preamble(deadline.script_total()))
+        for name, command in sections:
+            lines.append(f"echo '{cls._SECTION_MARKER} {name}'")
+            lines.append(guard(command, budgets[name]) if budgets else command)
+        return "\n".join(lines)
 
-            # Memory Info
-            try:
-                _, stdout, _ = client.exec_command("free -m | grep Mem")
-                mem_line = stdout.read().decode("utf-8").strip().split()
-                total_mem = int(mem_line[1])
-                used_mem = int(mem_line[2])
-
-                stats["mem"] = {
-                    "total_mb": total_mem,
-                    "used_mb": used_mem,
-                    "used_pct": round((used_mem / total_mem * 100), 1)
-                    if total_mem > 0
-                    else 0,
-                }
-            except:
-                stats["mem"] = {"total_mb": 0, "used_mb": 0, "used_pct": 0}
+    @classmethod
+    def _split_sections(cls, output: str) -> Dict[str, str]:
+        sections: Dict[str, str] = {}
+        current = None
+        buffer: List[str] = []
+        for line in output.splitlines():
+            if line.startswith(cls._SECTION_MARKER):
+                if current is not None:
+                    sections[current] = "\n".join(buffer).strip()
+                current = line[len(cls._SECTION_MARKER):].strip()
+                buffer = []
+            elif current is not None:
+                buffer.append(line)
+        if current is not None:
+            sections[current] = "\n".join(buffer).strip()
+        return sections
+
+    def _run_sections(
+        self,
+        client,
+        commands: List[tuple],
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Optional[str]]:
+        """Разделы одним пакетным скриптом: один exec_command, разбор по маркерам.
+
+        С deadline разделы, не уложившиеся в бюджет, получают None и
+        попадают в deadline.timed_out. Ответ ждётся не дольше дедлайна:
+        оборванный на середине раздел и разделы, до которых вывод не дошёл,
+        помечаются так же.
+        """
+        if deadline is None:
+            output = self._read_command_output(
+                client, self._build_batch_script(commands), timeout=max(timeout, 5)
+            )
+            parsed = self._split_sections(output)
+            return {name: parsed.get(name) for name, _ in commands}
+
+        if deadline.expired:
+            deadline.mark(*[name for name, _ in commands])
+            return {name: None for name, _ in commands}
+        output, complete = self._read_until_deadline(
+            client, self._build_batch_script(commands, deadline), deadline
+        )
+        parsed = self._split_sections(output)
+        if not complete:
+            logger.warning(
+                f"No full answer within {deadline.seconds}s deadline from "
+                f"{self._sample_key(client)}, unfinished sections timed out"
+            )
+            started = [name for name, _ in commands if name in parsed]
+            if started:
+                # Последний начатый раздел оборван на середине
+                del parsed[started[-1]]
+        sections = {}
+        for name, _ in commands:
+            sections[name], timed_out = split_timed_out(parsed.get(name))
+            if timed_out or (not complete and name not in parsed):
+                deadline.mark(name)
+        return sections
+
+    def _collect_sections(
+        self,
+        client,
+        commands: List[tuple],
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Optional[str]]:
+        """Разделы из документа агента, если он есть на хосте, иначе пакетным скриптом.
+
+        Пока возможности хоста неизвестны, в скрипт добавляется раздел
+        DETECT_SCRIPT: определение не стоит отдельного round trip. Если агент
+        не ответил в свою долю дедлайна, разделы собираются скриптом в
+        оставшееся время.
+        """
+        agent = self._agent_sections(client, [name for name, _ in commands], deadline)
+        if agent is not None:
+            return agent[0]
+        key = self._pool_key_for(client)
+        detect = key is not None and self._capabilities.get(key) is None
+        if detect:
+            commands = list(commands) + [("capabilities", DETECT_SCRIPT)]
+        sections = self._run_sections(client, commands, timeout=timeout, deadline=deadline)
+        if detect:
+            self._capabilities.put(key, parse_capabilities(sections.pop("capabilities")))
+        return sections
 
-            # Swap Info
-            try:
-                _, stdout, _ = client.exec_command("free -m | grep Swap")
-                swap_line = stdout.read().decode("utf-8").strip().split()
-                total_swap = int(swap_line[1])
-                used_swap = int(swap_line[2])
-
-                stats["swap"] = {
-                    "total_mb": total_swap,
-                    "used_mb": used_swap,
-                    "used_pct": round((used_swap / total_swap * 100), 1)
-                    if total_swap > 0
-                    else 0,
-                }
-            except:
-                stats["swap"] = {"total_mb": 0, "used_mb": 0, "used_pct": 0}
+    @classmethod
+    def _known_capabilities(cls, client) -> Optional[Dict]:
+        """Возможности хоста из кэша (без SSH); None — ещё не определены."""
+        return cls._capabilities.get(cls._pool_key_for(client))
 
-            # Load Average
-            try:
-                _, stdout, _ = client.exec_command("cat /proc/loadavg")
-                load_line = stdout.read().decode("utf-8").strip().split()
-                stats["load"] = {
-                    "1m": load_line[0] if len(load_line) > 0 else "0",
-                    "5m": load_line[1] if len(load_line) > 1 else "0",
-                    "15m": load_line[2] if len(load_line) > 2 else "0",
+    @classmethod
+    def capability_stats(cls) -> Dict:
+        return cls._capabilities.stats()
+
+    # --- Агент мониторинга (get-all-stats.sh) ---
+    # Установленный агент печатает все разделы одним JSON-документом. Пока он
+    # есть на хосте (см. detect_monitoring_agent), панели берут разделы из
+    # документа: один exec на обновление страницы, документ общий для всех
+    # маршрутов на _AGENT_DOC_TTL секунд.
+    _AGENT_DOC_TTL = 10
+    # Доля остатка дедлайна на ответ агента; остальное — на прямые команды
+    _AGENT_DEADLINE_SHARE = 0.5
+    _agent_hosts: Dict[str, Dict] = {}  # ключ пула -> {"version", "build"}
+    _agent_docs: Dict[str, Dict] = {}  # ключ пула -> документ + fetched_at/cursors
+    _agent_lock = threading.Lock()
+    _agent_key_locks: Dict[str, threading.Lock] = {}
+    # Второй снимок счётчиков по VSM_FIRST_SAMPLE (первый опрос хоста)
+    _AGENT_SECOND_SAMPLE = 'if [ -n "$VSM_FIRST_SAMPLE" ]; then sleep {pause}; {command}; fi'
+
+    @classmethod
+    def agent_section_commands(cls) -> List[tuple]:
+        """Разделы агента: все панели мониторинга, без повторов имён."""
+        position = monitoring_agent.JOURNAL_POSITION_FUNC
+        commands: List[tuple] = []
+        for name, command in (
+            cls._stats_section_commands()
+            + cls._network_section_commands()
+            + cls._services_section_commands()
+            + cls._FIREWALL_SECTIONS
+            + cls._security_section_commands(
+                f'"$({position} "$VSM_AUTH_CURSOR")"',
+                f'"$({position} "$VSM_ERRORS_CURSOR")"',
+            )
+            + [("mem", cls._MEM_USED_PCT_CMD)]
+        ):
+            if name == "cpu":
+                command = cls._CPU_STAT_CMD + "; " + cls._AGENT_SECOND_SAMPLE.format(
+                    pause=cls._FIRST_SAMPLE_PAUSE, command=cls._CPU_STAT_CMD
+                )
+            elif name == "net_counters":
+                command = cls._NET_COUNTERS_CMD + "; " + cls._AGENT_SECOND_SAMPLE.format(
+                    pause=cls._FIRST_SAMPLE_PAUSE, command=cls._NET_COUNTERS_CMD
+                )
+            if name not in dict(commands):
+                commands.append((name, command))
+        return commands
+
+    @classmethod
+    def monitoring_agent_script(cls) -> str:
+        """Текст get-all-stats.sh для install_monitoring."""
+        return monitoring_agent.build_agent_script(cls.agent_section_commands())
+
+    @classmethod
+    def set_monitoring_agent(cls, key: str, info: Optional[Dict]) -> None:
+        """Запомнить (info) или забыть (None) агент на хосте host:port:user."""
+        with cls._agent_lock:
+            if info:
+                cls._agent_hosts[key] = dict(info)
+            else:
+                cls._agent_hosts.pop(key, None)
+            cls._agent_docs.pop(key, None)
+
+    @classmethod
+    def forget_monitoring_agent(cls, ip: str, port: int, user: str) -> None:
+        cls.set_monitoring_agent(cls._pool_key(ip, port, user), None)
+        cls.invalidate_results(ip, port, user)
+
+    @classmethod
+    def configure_result_cache(
+        cls, enabled: Optional[bool] = None, ttls: Optional[Dict[str, float]] = None
+    ) -> None:
+        """Настроить кэш результатов коллекторов (вызывается при регистрации сервисов)."""
+        if enabled is not None:
+            cls._results.enabled = bool(enabled)
+        if ttls:
+            cls._results.ttls.update(ttls)
+
+    @classmethod
+    def invalidate_results(cls, ip: str, port: int, user: str) -> int:
+        """Сбросить кэшированные результаты хоста (после установки/удаления и т.п.)."""
+        key = cls._pool_key(ip, port, user)
+        return cls._results.invalidate(lambda cached: cached[0] == key)
+
+    @classmethod
+    def result_cache_stats(cls) -> Dict:
+        return cls._results.stats()
+
+    def detect_monitoring_agent(
+        self, ip: str, user: str, password: str, port: int = 22
+    ) -> Dict:
+        """Проверить get-all-stats.sh на сервере и запомнить, есть ли там агент.
+
+        installed — скрипт существует (в т.ч. старая заглушка), agent_version —
+        версия агента или None, agent_current — build совпадает с текущим.
+        """
+        path = monitoring_agent.AGENT_PATH
+        result = self.execute_remote_command(
+            ip=ip,
+            user=user,
+            password=password,
+            command=(
+                f"if [ -f {path} ]; then echo EXISTS; "
+                f"[ -x {path} ] && {path} --version 2>/dev/null | head -n1; "
+                "else echo NOT_FOUND; fi"
+            ),
+            port=port,
+            timeout=8,  # Таймаут выполнения команды
+            connection_timeout=10,  # Быстрый таймаут подключения для проверки
+        )
+        output = result.get("output", "")
+        info = monitoring_agent.parse_agent_version(output)
+        if info and info["version"] != monitoring_agent.AGENT_VERSION:
+            info = None
+        if result.get("exit_status", -1) != -1:
+            self.set_monitoring_agent(self._pool_key(ip, port, user), info)
+        return {
+            "installed": "EXISTS" in output,
+            "agent_version": info["version"] if info else None,
+            "agent_current": bool(info)
+            and info["build"] == monitoring_agent.agent_build(self.agent_section_commands()),
+        }
+
+    @classmethod
+    def _get_agent_key_lock(cls, key: str) -> threading.Lock:
+        with cls._agent_lock:
+            lock = cls._agent_key_locks.get(key)
+            if lock is None:
+                lock = cls._agent_key_locks[key] = threading.Lock()
+            return lock
+
+    def _agent_document(self, client, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """Документ агента хоста (из кэша или одним exec); None — агента нет.
+
+        С deadline агент ждётся не дольше _AGENT_DEADLINE_SHARE его остатка;
+        не успевший агент остаётся зарегистрированным, а этот сбор получает
+        None и идёт прямыми командами.
+        """
+        key = self._pool_key_for(client)
+        if key is None or key not in self._agent_hosts:
+            return None
+
+        # Свой lock, а не lock пула: _exec_command под lock'ом пула переподключается
+        with self._get_agent_key_lock(key):
+            document = self._agent_docs.get(key)
+            if document and time.monotonic() - document["fetched_at"] < self._AGENT_DOC_TTL:
+                return document
+
+            previous_cursors = self._security_events.cursors(key)
+            cursors = {
+                stream: cursor
+                for stream, cursor in previous_cursors.items()
+                if cursor and self._JOURNAL_CURSOR_RE.match(cursor)
+            }
+            first_sample = not (
+                self._samples.is_fresh(key, "cpu") and self._samples.is_fresh(key, "net")
+            )
+            env = monitoring_agent.agent_env(cursors, first_sample)
+            command = f"{env} {monitoring_agent.AGENT_PATH}".strip()
+            if deadline is None:
+                output = self._read_command_output(client, command, timeout=30)
+            else:
+                share = Deadline(max(deadline.remaining(), 0) * self._AGENT_DEADLINE_SHARE)
+                output, complete = self._read_until_deadline(client, command, share)
+                if not complete:
+                    logger.warning(
+                        f"Monitoring agent on {key} did not answer within "
+                        f"{share.seconds:.1f}s, using direct commands"
+                    )
+                    return None
+            document = monitoring_agent.parse_agent_document(output)
+            if document is None:
+                # Агент удалён или сломан — до следующего check-installed прямые команды
+                logger.warning(f"Monitoring agent on {key} returned no document, using direct commands")
+                self.set_monitoring_agent(key, None)
+                return None
+
+            document["fetched_at"] = time.monotonic()
+            document["cursors"] = previous_cursors
+            with self._agent_lock:
+                if key in self._agent_hosts:
+                    self._agent_docs[key] = document
+            return document
+
+    def _agent_sections(
+        self, client, names: List[str], deadline: Optional[Deadline] = None
+    ) -> Optional[tuple]:
+        """(разделы, курсоры journalctl на момент запуска агента) или None."""
+        document = self._agent_document(client, deadline)
+        if document is None:
+            return None
+        sections = document["sections"]
+        if not all(name in sections for name in names):
+            return None  # агент старой сборки — раздела нет, идём прямыми командами
+        return {name: sections[name] for name in names}, document["cursors"]
+
+    @staticmethod
+    def _parse_free(output: str, row: str) -> Dict:
+        """Строка Mem/Swap из `free -m` -> total/used/used_pct."""
+        for line in output.splitlines():
+            parts = line.split()
+            if parts and parts[0].rstrip(":") == row:
+                total = int(parts[1])
+                used = int(parts[2])
+                return {
+                    "total_mb": total,
+                    "used_mb": used,
+                    "used_pct": round((used / total * 100), 1) if total > 0 else 0,
                 }
-            except:
-                stats["load"] = {"1m": "0", "5m": "0", "15m": "0"}
+        raise ValueError(f"no {row} row in free output")
 
-            # Disk Info
-            try:
-                # -P (POSIX) держит каждую запись на одной строке (без переноса длинных имён),
-                # -x исключает псевдо-ФС. Не требуем префикс /dev/ — на части VPS реальные
-                # ФС не начинаются с /dev/, из-за чего таблица Mount получалась пустой.
-                _, stdout, _ = client.exec_command(
-                    "df -hP -x tmpfs -x devtmpfs -x squashfs -x overlay 2>/dev/null | tail -n +2 | head -10"
+    @staticmethod
+    def _parse_loadavg(output: str) -> Dict[str, str]:
+        load_line = output.split()
+        return {
+            "1m": load_line[0] if len(load_line) > 0 else "0",
+            "5m": load_line[1] if len(load_line) > 1 else "0",
+            "15m": load_line[2] if len(load_line) > 2 else "0",
+        }
+
+    @staticmethod
+    def _parse_df(output: str) -> List[Dict[str, str]]:
+        disks = []
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) >= 6:
+                disks.append(
+                    {
+                        "device": parts[0],
+                        "size": parts[1],
+                        "used": parts[2],
+                        "avail": parts[3],
+                        "used_pct": parts[4].replace("%", ""),
+                        "mount": parts[5],
+                    }
                 )
-                disk_lines = stdout.read().decode("utf-8").strip().split("\n")
-                disks = []
-                for line in disk_lines:
-                    if line:
-                        parts = line.split()
-                        if len(parts) >= 6:
-                            disks.append(
-                                {
-                                    "device": parts[0],
-                                    "size": parts[1],
-                                    "used": parts[2],
-                                    "avail": parts[3],
-                                    "used_pct": parts[4].replace("%", ""),
-                                    "mount": parts[5],
-                                }
-                            )
-                stats["disks"] = disks
-            except:
-                stats["disks"] = []
+        return disks
 
-            # Processes (Top 5 by CPU)
-            try:
-                _, stdout, _ = client.exec_command(
-                    "ps -eo pid,comm,%cpu,%mem --sort=-%cpu | head -n 15"
+    @staticmethod
+    def _parse_ip_addr(output: str) -> List[Dict[str, str]]:
+        networks = []
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) >= 4:
+                networks.append(
+                    {"interface": parts[1], "family": parts[2], "address": parts[3]}
+                )
+        return networks
+
+    @classmethod
+    def _parse_docker(cls, version_output: str, ps_output: str) -> Dict:
+        containers = []
+        for line in ps_output.splitlines():
+            parts = line.split("|")
+            if len(parts) >= 4:
+                containers.append(
+                    {
+                        "id": parts[0],
+                        "name": parts[1],
+                        "status": parts[2],
+                        "image": parts[3],
+                        "role": cls._known_containers.get(parts[1], ""),
+                    }
                 )
-                ps_output = stdout.read().decode("utf-8").strip()
-                stats["processes"] = self._parse_top_processes(ps_output)
-            except:
-                stats["processes"] = []
+        return {
+            "present": bool(version_output),
+            "version": version_output.replace("Docker version ", "")
+            if version_output
+            else "",
+            "running": len(containers),
+            "names": [c["name"] for c in containers],
+            "containers": containers,
+        }
 
-            # Network interfaces
+    @classmethod
+    def _parse_app_services(cls, probe_out: str) -> List[Dict[str, str]]:
+        by_unit = cls._app_service_units()
+        app_services = []
+        for probe_line in probe_out.splitlines():
+            probe_line = probe_line.lstrip("●").strip()
+            parts = probe_line.split()
+            if len(parts) < 3 or parts[1] == "not-found":
+                continue
+            unit = parts[0].replace(".service", "")
+            desc = by_unit.get(unit)
+            if not desc:
+                continue
+            app_services.append(
+                {
+                    "name": desc["name"],
+                    "display_name": desc["display_name"],
+                    "unit_name": unit,
+                    "status": parts[2],  # active / inactive / failed
+                }
+            )
+        return app_services
+
+    # Поле обзора парка сверх _STATS_FIELDS
+    _EXTRA_STATS_FIELDS = [("listening_ports", ("listeners",))]
+
+    @classmethod
+    def _timed_out_fields(cls, deadline: Deadline) -> List[str]:
+        """Поля статистики, разделы которых не уложились в дедлайн.
+
+        Служебные разделы (boot_id, capabilities) полей не дают и в список
+        не попадают.
+        """
+        fields = []
+        for name in deadline.timed_out:
+            for field, needs in cls._STATS_FIELDS + cls._EXTRA_STATS_FIELDS:
+                if name in needs and field not in fields:
+                    fields.append(field)
+        return fields
+
+    @staticmethod
+    def _cpu_out_of_time(deadline: Optional[Deadline]) -> bool:
+        """Раздел cpu снят по бюджету или дедлайн вышел: дозамер не запускаем."""
+        if deadline is None:
+            return False
+        if "cpu" in deadline.timed_out or deadline.expired:
+            deadline.mark("cpu")
+            return True
+        return False
+
+    # Поля статистики по порядку и разделы, из которых они строятся
+    _STATS_FIELDS = [
+        ("uptime", ("uptime",)),
+        ("os", ("os",)),
+        ("cpu", ("nproc", "kernel", "cpu")),
+        ("mem", ("free",)),
+        ("swap", ("free",)),
+        ("load", ("loadavg",)),
+        ("disks", ("disks",)),
+        ("processes", ("processes",)),
+        ("net", ("net",)),
+        ("docker", ("docker_version", "docker_ps")),
+        ("app_services", ("app_services",)),
+    ]
+
+    def _build_stats_field(
+        self,
+        field: str,
+        sections: Dict[str, Optional[str]],
+        client,
+        timeout: int,
+        deadline: Optional[Deadline] = None,
+    ):
+        """Одно поле статистики из сырых выводов его разделов (см. _STATS_FIELDS)."""
+        if field == "uptime":
+            uptime = sections.get("uptime")
+            return uptime if uptime is not None else "N/A"
+        if field == "os":
+            return sections.get("os") or "Linux"
+
+        if field == "cpu":
             try:
-                _, stdout, _ = client.exec_command("ip -o addr show")
-                ip_lines = stdout.read().decode("utf-8").strip().split("\n")
-                networks = []
-                for line in ip_lines:
-                    if line.strip():
-                        parts = line.split()
-                        if len(parts) >= 4:
-                            networks.append(
-                                {
-                                    "interface": parts[1],
-                                    "family": parts[2],
-                                    "address": parts[3],
-                                }
-                            )
-                stats["net"] = networks
-            except:
-                stats["net"] = []
+                cores = sections["nproc"]
+                kernel = sections["kernel"]
+                if cores is None or kernel is None:
+                    raise ValueError("cpu sections missing")
+                try:
+                    cpu_used = self._cpu_pct_from_output(
+                        self._sample_key(client), sections.get("cpu") or ""
+                    )
+                    if cpu_used is None and self._cpu_out_of_time(deadline):
+                        cpu_used = 0.0
+                    elif cpu_used is None:
+                        # Счётчики сбросились — короткий замер отдельной командой
+                        cpu_used = self._get_cpu_used_pct(
+                            client, timeout=timeout, force_sample=True
+                        )
+                except ValueError:
+                    # /proc/stat недоступен — отдельная цепочка top/vmstat
+                    if self._cpu_out_of_time(deadline):
+                        cpu_used = 0.0
+                    else:
+                        cpu_used = self._get_cpu_used_pct_fallback(client, timeout=timeout)
+                return {
+                    "cores": int(cores) if cores else 0,
+                    "used_pct": cpu_used,
+                    "kernel": kernel,
+                }
+            except Exception:
+                return {"cores": 0, "used_pct": 0.0, "kernel": "N/A"}
 
-            # Docker Info
+        if field in ("mem", "swap"):
             try:
-                _, stdout, _ = client.exec_command("docker --version 2>/dev/null")
-                docker_version = stdout.read().decode("utf-8").strip()
+                return self._parse_free(sections["free"], "Mem" if field == "mem" else "Swap")
+            except Exception:
+                return {"total_mb": 0, "used_mb": 0, "used_pct": 0}
 
-                _, stdout, _ = client.exec_command(
-                    'docker ps --format "{{.ID}}|{{.Names}}|{{.Status}}|{{.Image}}" 2>/dev/null'
-                )
-                containers_output = stdout.read().decode("utf-8").strip().split("\n")
-                containers = []
-                for line in containers_output:
-                    if line:
-                        parts = line.split("|")
-                        if len(parts) >= 4:
-                            containers.append(
-                                {
-                                    "id": parts[0],
-                                    "name": parts[1],
-                                    "status": parts[2],
-                                    "image": parts[3],
-                                    "role": self._known_containers.get(parts[1], ""),
-                                }
-                            )
+        if field == "load":
+            try:
+                return self._parse_loadavg(sections["loadavg"])
+            except Exception:
+                return {"1m": "0", "5m": "0", "15m": "0"}
 
-                stats["docker"] = {
-                    "present": bool(docker_version),
-                    "version": docker_version.replace("Docker version ", "")
-                    if docker_version
-                    else "",
-                    "running": len(containers),
-                    "names": [c["name"] for c in containers],
-                    "containers": containers,
-                }
-            except:
-                stats["docker"] = {
+        if field == "docker":
+            try:
+                return self._parse_docker(sections["docker_version"], sections["docker_ps"])
+            except Exception:
+                return {
                     "present": False,
                     "version": "",
                     "running": 0,
@@ -824,43 +2133,192 @@ class SSHService:
                     "containers": [],
                 }
 
-            # --- Приложения, запущенные через systemd (НЕ в Docker) ---
-            # Бот TelegramOnly может работать не контейнером, а systemd-сервисом
-            # `telegramonly` (+ HA-стек/Reticulum). Показываем их статус, чтобы
-            # отсутствие docker-контейнера telegram-helper не выглядело как
-            # «бот не запущен». Один SSH-вызов; показываем только установленные.
-            try:
-                app_units = [
-                    d for d in self._service_catalog if d.get("group") == "telegramonly"
-                ]
-                by_unit = {d["unit_candidates"][0]: d for d in app_units}
-                unit_args = " ".join(u + ".service" for u in by_unit)
-                probe_out = self._read_command_output(
-                    client,
-                    f"systemctl list-units --type=service --all --no-legend {unit_args} 2>/dev/null",
-                    timeout=15,
+        # --- Приложения, запущенные через systemd (НЕ в Docker) ---
+        # Бот TelegramOnly может работать не контейнером, а systemd-сервисом
+        # `telegramonly` (+ HA-стек/Reticulum). Показываем их статус, чтобы
+        # отсутствие docker-контейнера telegram-helper не выглядело как
+        # «бот не запущен». Показываем только установленные.
+        parsers = {
+            "disks": self._parse_df,
+            "processes": self._parse_top_processes,
+            "net": self._parse_ip_addr,
+            "app_services": self._parse_app_services,
+        }
+        try:
+            return parsers[field](sections[field])
+        except Exception:
+            return []
+
+    def _build_server_stats(
+        self,
+        sections: Dict[str, Optional[str]],
+        client,
+        timeout: int,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict:
+        """Собрать словарь статистики из сырых выводов разделов.
+
+        Отсутствующий раздел (None) — команда упала; для него подставляются
+        те же значения по умолчанию, что и раньше. С deadline дополнительные
+        замеры CPU получают остаток дедлайна, а без остатка не запускаются.
+        """
+        if deadline is not None:
+            timeout = max(1, int(deadline.remaining()))
+        stats = {
+            field: self._build_stats_field(field, sections, client, timeout, deadline)
+            for field, _ in self._STATS_FIELDS
+        }
+        if deadline is not None:
+            stats["timed_out"] = self._timed_out_fields(deadline)
+        return stats
+
+    def _collect_stats_sections_sequential(
+        self, client, timeout: int, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Optional[str]]:
+        """Каждый раздел — отдельный exec_command; каналы открываются параллельно.
+
+        С deadline каждый раздел получает весь остаток дедлайна: они идут
+        одновременно.
+        """
+        commands = self._stats_section_commands(self._sample_key(client))
+        if deadline is None:
+            results = self._run_pipelined(
+                client, commands, timeout=max(timeout, 5), raise_errors=False
+            )
+            return {name: result["stdout"] for name, result in results.items()}
+
+        budgets = deadline.budgets([name for name, _ in commands], parallel=True)
+        preamble = guard_preamble(deadline.script_total())
+        results = self._run_pipelined(
+            client,
+            [(name, f"{preamble}\n{guard(command, budgets[name])}") for name, command in commands],
+            raise_errors=False,
+            deadline=deadline,
+        )
+        sections = {}
+        for name, result in results.items():
+            sections[name], timed_out = split_timed_out(result["stdout"])
+            if timed_out or (result["stdout"] is None and deadline.expired):
+                deadline.mark(name)
+        return sections
+
+    def _collect_stats_sections_batched(
+        self,
+        client,
+        timeout: int,
+        extra_sections: Optional[List[tuple]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Optional[str]]:
+        """Все разделы одним скриптом: один exec_command, разбор по маркерам локально.
+
+        Разделы-факты (FACT_SECTIONS) берутся из кэша фактов, пока boot_id
+        хоста прежний. Хостам с агентом мониторинга все разделы и так приходят
+        одним документом — для них кэш фактов не используется.
+        """
+        capabilities = self._known_capabilities(client)
+        commands = self._stats_section_commands(
+            self._sample_key(client), capabilities
+        ) + list(extra_sections or [])
+        key = self._pool_key_for(client)
+        with self._agent_lock:
+            has_agent = key in self._agent_hosts
+        if key is None or has_agent:
+            return self._collect_sections(client, commands, timeout=timeout, deadline=deadline)
+
+        facts = self._facts.get(key)
+        if facts is not None:
+            commands = [(name, command) for name, command in commands if name not in FACT_SECTIONS]
+        sections = self._collect_sections(
+            client, commands + [("boot_id", BOOT_ID_CMD)], timeout=timeout, deadline=deadline
+        )
+        boot_id = sections.pop("boot_id", None) or None
+        if facts is not None and boot_id and boot_id != facts["boot_id"]:
+            # Перезагрузка: ядро, адреса и набор утилит могли смениться
+            logger.info(f"Host {key} rebooted (boot_id changed), refreshing facts")
+            self._facts.invalidate(key, reboot=True)
+            self._capabilities.invalidate(key)
+            fact_commands = [
+                (name, command)
+                for name, command in self._stats_section_commands(None, capabilities)
+                if name in FACT_SECTIONS
+            ]
+            sections.update(
+                self._collect_sections(client, fact_commands, timeout=timeout, deadline=deadline)
+            )
+            facts = None
+        if facts is not None:
+            sections.update(facts["sections"])
+        elif deadline is None or not set(FACT_SECTIONS) & set(deadline.timed_out):
+            self._facts.put(key, boot_id, sections)
+        return sections
+
+    @classmethod
+    def facts_id(cls, client) -> Optional[str]:
+        """Версия фактов хоста (меняется после перезагрузки или истечения TTL)."""
+        return cls._facts.facts_id(cls._facts.get(cls._pool_key_for(client)))
+
+    @classmethod
+    def facts_stats(cls) -> Dict:
+        return cls._facts.stats()
+
+    @_cached_collector("fleet_host_stats")
+    def get_fleet_host_stats(
+        self, ip: str, user: str, password: str, port: int = 22, timeout: int = 15
+    ) -> Dict:
+        """Статистика хоста для обзора парка: get_server_stats + listening ports.
+
+        Один exec_command на хост; используется FleetCollector из пула потоков.
+        """
+        deadline = Deadline(timeout)
+        client = self.get_connection_pooled(
+            ip, port, user, password, connection_timeout=timeout
+        )
+        sections = self._collect_stats_sections_batched(
+            client,
+            timeout,
+            extra_sections=[("listeners", self._LISTENERS_CMD)],
+            deadline=deadline,
+        )
+        stats = self._build_server_stats(sections, client, timeout, deadline)
+        stats["listening_ports"] = self._parse_listener_ports(
+            sections.get("listeners") or ""
+        )
+        return stats
+
+    @_cached_collector("server_stats")
+    def get_server_stats(
+        self,
+        ip: str,
+        user: str,
+        password: str,
+        port: int = 22,
+        timeout: int = 30,
+        batched: bool = True,
+    ) -> Dict:
+        """Получение статистики сервера через SSH
+
+        batched=True — все разделы одним exec_command (один round trip);
+        batched=False — прежний последовательный режим, команда на раздел.
+        timeout — дедлайн всего сбора: разделы, не успевшие за свой бюджет,
+        перечисляются в stats["timed_out"], остальные возвращаются.
+        """
+        deadline = Deadline(timeout)
+        try:
+            # Используем connection pooling
+            client = self.get_connection_pooled(
+                ip, port, user, password, connection_timeout=timeout
+            )
+
+            if batched:
+                sections = self._collect_stats_sections_batched(
+                    client, timeout, deadline=deadline
                 )
-                app_services = []
-                for probe_line in probe_out.splitlines():
-                    probe_line = probe_line.lstrip("●").strip()
-                    parts = probe_line.split()
-                    if len(parts) < 3 or parts[1] == "not-found":
-                        continue
-                    unit = parts[0].replace(".service", "")
-                    desc = by_unit.get(unit)
-                    if not desc:
-                        continue
-                    app_services.append(
-                        {
-                            "name": desc["name"],
-                            "display_name": desc["display_name"],
-                            "unit_name": unit,
-                            "status": parts[2],  # active / inactive / failed
-                        }
-                    )
-                stats["app_services"] = app_services
-            except Exception:
-                stats["app_services"] = []
+            else:
+                sections = self._collect_stats_sections_sequential(
+                    client, timeout, deadline=deadline
+                )
+            stats = self._build_server_stats(sections, client, timeout, deadline)
+            stats["facts_id"] = self.facts_id(client)
 
             logger.info(f"Successfully collected stats from {ip}")
             return stats
@@ -888,6 +2346,166 @@ class SSHService:
             logger.error(f"Error collecting stats from {ip}: {str(e)}")
             raise SSHConnectionError(f"Failed to collect stats from {ip}: {str(e)}")
 
+    def _finish_section(self, name: str, lines: List[str], deadline: Deadline) -> Optional[str]:
+        output, timed_out = split_timed_out("\n".join(lines).strip())
+        if timed_out:
+            deadline.mark(name)
+        return output
+
+    def _iter_batch_sections(
+        self, client, commands: List[tuple], deadline: Deadline
+    ) -> Iterator[tuple]:
+        """(имя, вывод) разделов пакетного скрипта по мере их выполнения.
+
+        Вывод читается построчно: раздел отдаётся, как только в потоке
+        появился маркер следующего. В момент дедлайна канал закрывается;
+        оборванный раздел и те, до которых ответ не дошёл (дедлайн, обрыв
+        канала), отдаются в конце с None и помечаются в deadline.
+        """
+        done = set()
+        if not deadline.expired:
+            _, stdout, _ = self._exec_command(
+                client,
+                self._build_batch_script(commands, deadline),
+                timeout=deadline.remaining() + Deadline.KILL_GRACE,
+            )
+            timer, cut = self._cut_at_deadline(stdout, deadline)
+            current = None
+            buffer: List[str] = []
+            received = 0
+            try:
+                for line in stdout:
+                    if isinstance(line, bytes):
+                        line = line.decode("utf-8", "replace")
+                    received += len(line)
+                    if line.startswith(self._SECTION_MARKER):
+                        if current is not None:
+                            done.add(current)
+                            yield current, self._finish_section(current, buffer, deadline)
+                        current = line[len(self._SECTION_MARKER):].strip()
+                        buffer = []
+                    elif current is not None:
+                        buffer.append(line.rstrip("\n"))
+                if current is not None and not cut.is_set():
+                    done.add(current)
+                    yield current, self._finish_section(current, buffer, deadline)
+            except socket.timeout:
+                logger.warning(
+                    f"No answer within {deadline.seconds}s deadline from "
+                    f"{self._sample_key(client)}, streaming stopped"
+                )
+            finally:
+                timer.cancel()
+                self._record_io(client, bytes_in=received)
+        for name, _ in commands:
+            if name not in done:
+                deadline.mark(name)
+                yield name, None
+
+    def stream_server_stats(
+        self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
+    ) -> Iterator[Dict]:
+        """Статистика сервера по полям, по мере выполнения разделов на хосте.
+
+        Отдаёт {"section": поле, "data": значение} для каждого поля
+        get_server_stats, как только выполнены все его разделы: CPU и память
+        приходят раньше медленных disks и docker. Последний элемент —
+        {"done": True, "timed_out", "facts_id", "elapsed_ms"}. Факты хоста из
+        кэша отдаются, когда первый раздел (boot_id) подтвердил, что хост не
+        перезагружался; иначе они собираются заново после остальных разделов.
+        timeout — дедлайн всего сбора, как у get_server_stats.
+        """
+        deadline = Deadline(timeout)
+        client = self.get_connection_pooled(
+            ip, port, user, password, connection_timeout=timeout
+        )
+        key = self._pool_key_for(client)
+        capabilities = self._known_capabilities(client)
+        commands = self._stats_section_commands(self._sample_key(client), capabilities)
+        sections: Dict[str, Optional[str]] = {}
+        facts = None
+
+        agent = self._agent_sections(client, [name for name, _ in commands], deadline)
+        if agent is not None:
+            source = iter(agent[0].items())
+            pending = set(agent[0])
+        else:
+            facts = self._facts.get(key)
+            pending = {name for name, _ in commands}
+            if facts is not None:
+                commands = [(name, command) for name, command in commands if name not in FACT_SECTIONS]
+            if key is not None:
+                commands = [("boot_id", BOOT_ID_CMD)] + commands
+            if key is not None and capabilities is None:
+                commands = commands + [("capabilities", DETECT_SCRIPT)]
+            source = self._iter_batch_sections(client, commands, deadline)
+
+        emitted = set()
+
+        def ready_fields():
+            for field, needs in self._STATS_FIELDS:
+                if field not in emitted and not pending.intersection(needs):
+                    emitted.add(field)
+                    value = self._build_stats_field(
+                        field, sections, client, max(1, int(deadline.remaining())), deadline
+                    )
+                    yield {"section": field, "data": value}
+
+        boot_id = None
+        rebooted = False
+        for name, output in source:
+            if name == "boot_id":
+                boot_id = output or None
+                if facts is not None and boot_id and boot_id != facts["boot_id"]:
+                    # Перезагрузка: ядро, адреса и набор утилит могли смениться
+                    logger.info(f"Host {key} rebooted (boot_id changed), refreshing facts")
+                    self._facts.invalidate(key, reboot=True)
+                    self._capabilities.invalidate(key)
+                    rebooted = True
+                elif facts is not None:
+                    # Тот же boot_id или он не прочитан — факты из кэша, как в пакетном сборе
+                    sections.update(facts["sections"])
+                    pending.difference_update(FACT_SECTIONS)
+            elif name == "capabilities":
+                self._capabilities.put(key, parse_capabilities(output))
+                continue
+            else:
+                sections[name] = output
+                pending.discard(name)
+            yield from ready_fields()
+
+        if rebooted:
+            fact_commands = [
+                (name, command)
+                for name, command in self._stats_section_commands(None, capabilities)
+                if name in FACT_SECTIONS
+            ]
+            for name, output in self._iter_batch_sections(client, fact_commands, deadline):
+                sections[name] = output
+                pending.discard(name)
+                yield from ready_fields()
+        if facts is not None and not rebooted and pending.intersection(FACT_SECTIONS):
+            # Раздел boot_id так и не пришёл (обрыв потока) — факты всё равно из кэша
+            sections.update(facts["sections"])
+            pending.difference_update(FACT_SECTIONS)
+            yield from ready_fields()
+        if pending:
+            # Разделы, которых нет и не будет: поля по умолчанию, сами они — в timed_out
+            deadline.mark(*sorted(pending))
+            pending.clear()
+            yield from ready_fields()
+        if agent is None and (facts is None or rebooted) and not (
+            set(FACT_SECTIONS) & set(deadline.timed_out)
+        ):
+            self._facts.put(key, boot_id, sections)
+
+        yield {
+            "done": True,
+            "timed_out": self._timed_out_fields(deadline),
+            "facts_id": self.facts_id(client),
+            "elapsed_ms": int((time.monotonic() - deadline.started) * 1000),
+        }
+
     def __enter__(self):
         return self
 
@@ -899,23 +2517,56 @@ class SSHService:
         """Проверка состояния соединения"""
         return self.client is not None and self.client.get_transport() is not None
 
+    # Поля сетевой статистики, которые строятся из раздела
+    _NETWORK_SECTION_FIELDS = {
+        "net_counters": ("current", "per_interface"),
+        "vnstat": ("daily",),
+    }
+
+    @_cached_collector("network_stats")
     def get_network_stats(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> Dict:
-        """Получение статистики сетевого трафика (суммарно со всех интерфейсов)"""
+        """Получение статистики сетевого трафика (суммарно со всех интерфейсов)
+
+        timeout — дедлайн всего сбора: разделы, не успевшие за свой бюджет,
+        перечисляются в "timed_out", остальные возвращаются.
+        """
         import time
 
+        deadline = Deadline(timeout)
         try:
             # Используем connection pooling
-            client = self.get_connection_pooled(ip, port, user, password)
+            client = self.get_connection_pooled(
+                ip, port, user, password, connection_timeout=timeout
+            )
 
-            # Получаем список всех активных сетевых интерфейсов (кроме lo - loopback)
-            # Включаем физические (eth0, ens3) и виртуальные VPN-интерфейсы (tun0, wg0, tap0)
-            _, stdout, _ = client.exec_command(
-                "ls /sys/class/net/ | grep -v '^lo$' | grep -E '^(eth|ens|eno|enp|wlan|wlp|tun|tap|wg|ppp|ipsec)'"
+            sample_key = self._sample_key(client)
+            sections = self._collect_sections(
+                client,
+                self._network_section_commands(sample_key, self._known_capabilities(client)),
+                timeout=timeout,
+                deadline=deadline,
+            )
+            # Дозамеры ниже получают только остаток дедлайна
+            timeout = max(1, int(deadline.remaining()))
+            counters_output = sections.get("net_counters") or ""
+            interfaces, rates = self._net_rates_from_output(sample_key, counters_output)
+            needs_resample = (
+                rates is None
+                and "net_counters" not in deadline.timed_out
+                and len(self._split_counter_samples(counters_output)) < 2
             )
-            interfaces = stdout.read().decode("utf-8").strip().split("\n")
-            interfaces = [i.strip() for i in interfaces if i.strip()]
+            if needs_resample and deadline.expired:
+                deadline.mark("net_counters")
+            elif needs_resample:
+                # Счётчики сбросились (перезагрузка, новый интерфейс) — короткий замер
+                interfaces, rates = self._net_rates_from_output(
+                    sample_key,
+                    self._read_command_output(
+                        client, self._NET_FIRST_SAMPLE_CMD, timeout=timeout
+                    ),
+                )
 
             if not interfaces:
                 # Fallback на eth0, если ничего не найдено
@@ -925,87 +2576,38 @@ class SSHService:
                 f"Monitoring network traffic on interfaces: {', '.join(interfaces)}"
             )
 
-            # Получаем начальные значения для всех интерфейсов
-            total_rx1 = 0
-            total_tx1 = 0
-
-            for iface in interfaces:
-                try:
-                    _, stdout, _ = client.exec_command(
-                        f"cat /sys/class/net/{iface}/statistics/rx_bytes /sys/class/net/{iface}/statistics/tx_bytes 2>/dev/null"
-                    )
-                    data = stdout.read().decode("utf-8").strip().split("\n")
-                    if len(data) >= 2:
-                        total_rx1 += int(data[0])
-                        total_tx1 += int(data[1])
-                except:
-                    # Пропускаем интерфейсы, которые не удалось прочитать
-                    continue
-
-            time1 = time.time()
-
-            # Ждем 1 секунду
-            time.sleep(1)
-
-            # Получаем конечные значения для всех интерфейсов
-            total_rx2 = 0
-            total_tx2 = 0
-
-            for iface in interfaces:
-                try:
-                    _, stdout, _ = client.exec_command(
-                        f"cat /sys/class/net/{iface}/statistics/rx_bytes /sys/class/net/{iface}/statistics/tx_bytes 2>/dev/null"
-                    )
-                    data = stdout.read().decode("utf-8").strip().split("\n")
-                    if len(data) >= 2:
-                        total_rx2 += int(data[0])
-                        total_tx2 += int(data[1])
-                except:
-                    continue
-
-            time2 = time.time()
-
-            # Вычисляем скорость
-            time_diff = time2 - time1
-            rx_speed = (total_rx2 - total_rx1) / time_diff / 1048576  # MB/s
-            tx_speed = (total_tx2 - total_tx1) / time_diff / 1048576  # MB/s
-
-            # Получаем суточную статистику (если vnstat установлен)
-            # Для vnstat используем основной интерфейс или сумму всех
-            _, stdout, _ = client.exec_command(
-                'export PATH="/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:$PATH"; command -v vnstat 2>/dev/null'
-            )
-            has_vnstat = bool(stdout.read().decode("utf-8").strip())
+            rates = rates or {}
+            rx_speed = sum(rx for rx, _ in rates.values())
+            tx_speed = sum(tx for _, tx in rates.values())
 
+            # Суточная статистика (если vnstat установлен): раздел vnstat пуст,
+            # когда vnstat нет, и "{}", когда он не умеет --json
+            vnstat_json = sections.get("vnstat") or ""
             daily_rx = "N/A"
             daily_tx = "N/A"
-            if has_vnstat:
+            if vnstat_json:
                 try:
-                    # Пытаемся получить суммарную статистику за 24 часа
-                    # vnstat может показывать общую статистику через --json (если поддерживается)
-                    _, stdout, _ = client.exec_command("vnstat --json 2>/dev/null")
-                    vnstat_json = stdout.read().decode("utf-8").strip()
-
-                    if vnstat_json:
-                        # Если есть JSON поддержка - парсим её
-                        import json
-
-                        try:
-                            vnstat_data = json.loads(vnstat_json)
-                            # Суммируем трафик за сегодня по всем интерфейсам
-                            total_rx_bytes = 0
-                            total_tx_bytes = 0
-
-                            for iface_data in vnstat_data.get("interfaces", []):
-                                traffic = iface_data.get("traffic", {})
-                                days = traffic.get("day", [])
-                                if days:
-                                    # Берем последний день (сегодня)
-                                    today = days[-1]
-                                    total_rx_bytes += today.get("rx", 0)
-                                    total_tx_bytes += today.get("tx", 0)
-
-                            # Конвертируем в удобные единицы
+                    import json
+
+                    try:
+                        vnstat_data = json.loads(vnstat_json)
+                        # Суммируем трафик за сегодня по всем интерфейсам
+                        total_rx_bytes = 0
+                        total_tx_bytes = 0
+                        has_days = False
+
+                        for iface_data in vnstat_data.get("interfaces", []):
+                            traffic = iface_data.get("traffic", {})
+                            days = traffic.get("day", [])
+                            if days:
+                                # Берем последний день (сегодня)
+                                today = days[-1]
+                                total_rx_bytes += today.get("rx", 0)
+                                total_tx_bytes += today.get("tx", 0)
+                                has_days = True
+
+                        # Конвертируем в удобные единицы
+                        if has_days:
                             if total_rx_bytes >= 1073741824:  # >= 1 GiB
                                 daily_rx = f"{total_rx_bytes / 1073741824:.2f} GiB"
                             else:
@@ -1016,16 +2618,17 @@ class SSHService:
                             else:
                                 daily_tx = f"{total_tx_bytes / 1048576:.2f} MiB"
 
-                        except (json.JSONDecodeError, KeyError):
-                            pass
+                    except (json.JSONDecodeError, KeyError, AttributeError):
+                        pass
 
                     # Если JSON не сработал, пробуем старый формат для основного интерфейса
-                    if daily_rx == "N/A":
+                    if daily_rx == "N/A" and deadline.expired:
+                        deadline.mark("vnstat")
+                    elif daily_rx == "N/A":
                         main_interface = interfaces[0] if interfaces else "eth0"
-                        _, stdout, _ = client.exec_command(
-                            f"vnstat -i {main_interface} --oneline 2>/dev/null"
+                        vnstat_output = self._read_command_output(
+                            client, f"vnstat -i {main_interface} --oneline 2>/dev/null", timeout=timeout
                         )
-                        vnstat_output = stdout.read().decode("utf-8").strip()
                         if vnstat_output:
                             parts = vnstat_output.split(";")
                             if len(parts) > 5:
@@ -1043,8 +2646,22 @@ class SSHService:
                     "upload": f"{tx_speed:.2f}",
                     "unit": "MB/s",
                 },
+                "per_interface": [
+                    {
+                        "name": iface,
+                        "download": f"{rates[iface][0]:.2f}",
+                        "upload": f"{rates[iface][1]:.2f}",
+                    }
+                    for iface in interfaces
+                    if iface in rates
+                ],
                 "daily": {"download": daily_rx, "upload": daily_tx},
                 "timestamp": int(time.time()),
+                "timed_out": [
+                    field
+                    for name in deadline.timed_out
+                    for field in self._NETWORK_SECTION_FIELDS.get(name, ())
+                ],
             }
 
         except Exception as e:
@@ -1052,126 +2669,142 @@ class SSHService:
             return {
                 "interface": "N/A",
                 "current": {"download": "0.00", "upload": "0.00", "unit": "MB/s"},
+                "per_interface": [],
                 "daily": {"download": "N/A", "upload": "N/A"},
                 "timestamp": int(time.time()),
                 "error": str(e),
             }
 
+    # Брандмауэр одним скриптом. Проверки ufw/firewalld/nft/iptables идут по
+    # цепочке: следующая нужна только без ufw. Дата "сегодня" для ufw.log —
+    # по часам сервера (в логе его локальное время).
+    _UFW_GUARD = "command -v ufw >/dev/null 2>&1"
+    _FIREWALL_SECTIONS = [
+        ("listeners", _LISTENERS_CMD),
+        ("ufw", "command -v ufw"),
+        (
+            "ufw_status",
+            f"{_UFW_GUARD} && sudo ufw status 2>/dev/null | grep \"Status:\" | awk '{{print $2}}'",
+        ),
+        (
+            "ufw_rules",
+            f"{_UFW_GUARD} && sudo ufw status numbered 2>/dev/null | grep -E \"^\\[\" "
+            "| awk '{print $3}' | cut -d'/' -f1 | sort -u",
+        ),
+        # Две строки: число блокировок за сегодня и последняя запись UFW BLOCK
+        (
+            "ufw_log",
+            f"{_UFW_GUARD} && sudo grep \"UFW BLOCK\" /var/log/ufw.log 2>/dev/null "
+            "| awk -v today=\"$(date +'%b %e')\" 'index($0, today) {n++} {last = $0} "
+            "END {print n + 0; print last}'",
+        ),
+        ("firewalld", f"{_UFW_GUARD} || systemctl is-active firewalld 2>/dev/null"),
+        ("nft", f"{_UFW_GUARD} || sudo nft list ruleset 2>/dev/null | head -20"),
+        ("iptables", f"{_UFW_GUARD} || sudo iptables -S 2>/dev/null | head -20"),
+    ]
+
+    @classmethod
+    def _firewall_section_commands(cls, capabilities: Optional[Dict] = None) -> List[tuple]:
+        """Разделы брандмауэра; с известными возможностями — только нужные хосту."""
+        if capabilities is None:
+            return list(cls._FIREWALL_SECTIONS)
+        firewall = capabilities["firewall"]
+        if firewall == "ufw":
+            wanted = {"listeners", "ufw", "ufw_status", "ufw_rules", "ufw_log"}
+        else:
+            wanted = {"listeners", "firewalld"} if firewall == "firewalld" else {"listeners"}
+            if capabilities.get("nft"):
+                wanted.add("nft")
+            if capabilities.get("iptables"):
+                wanted.add("iptables")
+        if not capabilities.get("sudo"):
+            # Без root и sudo -n эти разделы всё равно пустые
+            wanted -= {"ufw_status", "ufw_rules", "ufw_log", "nft", "iptables"}
+        return [(name, command) for name, command in cls._FIREWALL_SECTIONS if name in wanted]
+
+    @classmethod
+    def _parse_firewall_sections(cls, sections: Dict[str, Optional[str]]) -> Dict:
+        import datetime
+
+        listening_ports = cls._parse_listener_ports(sections.get("listeners") or "")
+        open_ports = ", ".join(listening_ports) if listening_ports else "none"
+        labeled_open_ports = (
+            ", ".join(cls._label_ports(listening_ports)) if listening_ports else "none"
+        )
+
+        backend = "none"
+        status = "inactive"
+        firewall_ports = "none"
+        blocked_24h = 0
+        last_block_line = ""
+
+        if sections.get("ufw"):
+            backend = "ufw"
+            status = sections.get("ufw_status") or "inactive"
+            firewall_ports_list = [
+                p for p in (sections.get("ufw_rules") or "").split("\n") if p
+            ]
+            firewall_ports = (
+                ", ".join(firewall_ports_list) if firewall_ports_list else "none"
+            )
+            log_lines = (sections.get("ufw_log") or "").split("\n", 1)
+            blocked_24h = int(log_lines[0]) if log_lines[0].isdigit() else 0
+            last_block_line = log_lines[1].strip() if len(log_lines) > 1 else ""
+        else:
+            firewalld_state = sections.get("firewalld") or ""
+            if firewalld_state in {"active", "inactive", "failed"}:
+                backend = "firewalld"
+                status = "active" if firewalld_state == "active" else "inactive"
+            elif sections.get("nft"):
+                backend = "nftables"
+                status = "active"
+            elif sections.get("iptables"):
+                backend = "iptables"
+                status = "active"
+
+        last_blocked_ip = "none"
+        last_blocked_port = "0"
+        if last_block_line:
+            ip_match = re.search(r"SRC=([0-9.]+)", last_block_line)
+            port_match = re.search(r"DPT=([0-9]+)", last_block_line)
+            if ip_match:
+                last_blocked_ip = ip_match.group(1)
+            if port_match:
+                last_blocked_port = port_match.group(1)
+
+        return {
+            "status": status,
+            "backend": backend,
+            "open_ports": open_ports,
+            "open_ports_labeled": labeled_open_ports,
+            "open_ports_details": [
+                {"port": p, "label": cls._known_port_labels.get(str(p), "")}
+                for p in listening_ports
+            ],
+            "firewall_ports": firewall_ports,
+            "listening_ports_count": len(listening_ports),
+            "blocked_24h": blocked_24h,
+            "last_blocked": {
+                "ip": last_blocked_ip,
+                "port": last_blocked_port,
+                "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            },
+        }
+
+    @_cached_collector("firewall_stats")
     def get_firewall_stats(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> Dict:
         """Получение статистики брандмауэра и listening ports"""
-        import datetime
-
         try:
             # Используем connection pooling
             client = self.get_connection_pooled(ip, port, user, password)
-
-            listening_ports = self._get_listening_ports(client)
-            open_ports = ", ".join(listening_ports) if listening_ports else "none"
-            labeled_open_ports = (
-                ", ".join(self._label_ports(listening_ports))
-                if listening_ports
-                else "none"
-            )
-
-            backend = "none"
-            status = "inactive"
-            firewall_ports = "none"
-            blocked_24h = 0
-            last_block_line = ""
-
-            ufw_installed = bool(
-                self._read_command_output(client, "command -v ufw", timeout=10)
+            sections = self._collect_sections(
+                client,
+                self._firewall_section_commands(self._known_capabilities(client)),
+                timeout=timeout,
             )
-            if ufw_installed:
-                backend = "ufw"
-                status = (
-                    self._read_command_output(
-                        client,
-                        "sudo ufw status 2>/dev/null | grep \"Status:\" | awk '{print $2}'",
-                        timeout=10,
-                    )
-                    or "inactive"
-                )
-                firewall_ports_output = self._read_command_output(
-                    client,
-                    "sudo ufw status numbered 2>/dev/null | grep -E \"^\\[\" | awk '{print $3}' | cut -d'/' -f1 | sort -u",
-                    timeout=10,
-                )
-                firewall_ports_list = [
-                    p for p in firewall_ports_output.split("\n") if p
-                ]
-                firewall_ports = (
-                    ", ".join(firewall_ports_list) if firewall_ports_list else "none"
-                )
-
-                today = datetime.datetime.now().strftime("%b %e")
-                blocked_output = self._read_command_output(
-                    client,
-                    f'sudo grep "UFW BLOCK" /var/log/ufw.log 2>/dev/null | grep "{today}" | wc -l',
-                    timeout=10,
-                )
-                blocked_24h = int(blocked_output) if blocked_output.isdigit() else 0
-                last_block_line = self._read_command_output(
-                    client,
-                    'sudo grep "UFW BLOCK" /var/log/ufw.log 2>/dev/null | tail -1',
-                    timeout=10,
-                )
-            else:
-                firewalld_state = self._read_command_output(
-                    client, "systemctl is-active firewalld 2>/dev/null", timeout=10
-                )
-                if firewalld_state in {"active", "inactive", "failed"}:
-                    backend = "firewalld"
-                    status = "active" if firewalld_state == "active" else "inactive"
-                else:
-                    nft_rules = self._read_command_output(
-                        client,
-                        "sudo nft list ruleset 2>/dev/null | head -20",
-                        timeout=10,
-                    )
-                    if nft_rules:
-                        backend = "nftables"
-                        status = "active"
-                    else:
-                        iptables_rules = self._read_command_output(
-                            client,
-                            "sudo iptables -S 2>/dev/null | head -20",
-                            timeout=10,
-                        )
-                        if iptables_rules:
-                            backend = "iptables"
-                            status = "active"
-
-            last_blocked_ip = "none"
-            last_blocked_port = "0"
-            if last_block_line:
-                ip_match = re.search(r"SRC=([0-9.]+)", last_block_line)
-                port_match = re.search(r"DPT=([0-9]+)", last_block_line)
-                if ip_match:
-                    last_blocked_ip = ip_match.group(1)
-                if port_match:
-                    last_blocked_port = port_match.group(1)
-
-            return {
-                "status": status,
-                "backend": backend,
-                "open_ports": open_ports,
-                "open_ports_labeled": labeled_open_ports,
-                "open_ports_details": [
-                    {"port": p, "label": self._known_port_labels.get(str(p), "")}
-                    for p in listening_ports
-                ],
-                "firewall_ports": firewall_ports,
-                "listening_ports_count": len(listening_ports),
-                "blocked_24h": blocked_24h,
-                "last_blocked": {
-                    "ip": last_blocked_ip,
-                    "port": last_blocked_port,
-                    "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                },
-            }
+            return self._parse_firewall_sections(sections)
 
         except Exception as e:
             logger.error(f"Error getting firewall stats from {ip}: {str(e)}")
@@ -1188,6 +2821,7 @@ class SSHService:
                 "error": str(e),
             }
 
+    @_cached_collector("services_stats")
     def get_services_stats(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> List[Dict]:
@@ -1195,11 +2829,11 @@ class SSHService:
         try:
             # Используем connection pooling
             client = self.get_connection_pooled(ip, port, user, password)
-            services = []
-            for descriptor in self._service_catalog:
-                services.append(self._probe_service(client, descriptor))
-
-            return services
+            # Весь каталог за один round trip; аптайм считаем локально
+            sections = self._collect_sections(
+                client, self._services_section_commands(), timeout=timeout
+            )
+            return self._parse_services_sections(sections)
 
         except Exception as e:
             logger.error(f"Error getting services stats from {ip}: {str(e)}")
@@ -1212,6 +2846,7 @@ class SSHService:
                 }
             ]
 
+    @_cached_collector("reticulum_status")
     def get_reticulum_status(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> Dict:
@@ -1223,56 +2858,51 @@ class SSHService:
         """
         try:
             client = self.get_connection_pooled(ip, port, user, password)
+            # Пробы независимы — все каналы открываются сразу
+            units = ("ha-reticulum-bridge", "ha-stub-grpc", "ha-stub-udp")
+            probes = self._run_pipelined(
+                client,
+                [
+                    (
+                        "installed",
+                        "systemctl list-unit-files --type=service 2>/dev/null "
+                        '| grep -E "^ha-reticulum-bridge\\.service\\s"',
+                    ),
+                    (
+                        "journal",
+                        "journalctl -u ha-reticulum-bridge --no-pager 2>/dev/null "
+                        '| grep -iE "destination|bridge hash" | tail -1',
+                    ),
+                    ("listening", "ss -tlnH 'sport = :50061' 2>/dev/null | head -1"),
+                ]
+                + [(unit, f"systemctl is-active {unit} 2>/dev/null") for unit in units],
+                timeout=15,
+            )
 
             def _active(unit: str) -> bool:
-                return (
-                    self._read_command_output(
-                        client, f"systemctl is-active {unit} 2>/dev/null", timeout=10
-                    )
-                    == "active"
-                )
+                return probes[unit]["stdout"] == "active"
 
-            installed = bool(
-                self._read_command_output(
-                    client,
-                    "systemctl list-unit-files --type=service 2>/dev/null "
-                    '| grep -E "^ha-reticulum-bridge\\.service\\s"',
-                    timeout=10,
-                )
-            )
+            installed = bool(probes["installed"]["stdout"])
 
             bridge_hash = ""
             if installed:
-                line = self._read_command_output(
-                    client,
-                    "journalctl -u ha-reticulum-bridge --no-pager 2>/dev/null "
-                    '| grep -iE "destination|bridge hash" | tail -1',
-                    timeout=15,
-                )
-                match = re.search(r"([0-9a-f]{32})", line or "")
+                match = re.search(r"([0-9a-f]{32})", probes["journal"]["stdout"])
                 if match:
                     bridge_hash = match.group(1)
 
-            listening = bool(
-                self._read_command_output(
-                    client,
-                    "ss -tlnH 'sport = :50061' 2>/dev/null | head -1",
-                    timeout=10,
-                )
-            )
-
             return {
                 "installed": installed,
                 "bridge_active": _active("ha-reticulum-bridge"),
                 "stub_grpc_active": _active("ha-stub-grpc"),
                 "stub_udp_active": _active("ha-stub-udp"),
-                "listening_50061": listening,
+                "listening_50061": bool(probes["listening"]["stdout"]),
                 "bridge_hash": bridge_hash,
             }
         except Exception as e:
             logger.error(f"Error getting reticulum status from {ip}: {str(e)}")
             return {"installed": False, "error": str(e)}
 
+    @_cached_collector("webpanels_status")
     def get_webpanels_status(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> Dict:
@@ -1287,15 +2917,18 @@ class SSHService:
         ]
         try:
             client = self.get_connection_pooled(ip, port, user, password)
+            # Порты берём из общего раздела listeners (тот же, что у брандмауэра)
+            listeners = self._collect_sections(
+                client, [("listeners", self._LISTENERS_CMD)], timeout=timeout
+            )["listeners"] or ""
+            tcp_ports = set(
+                self._parse_listener_ports(
+                    "\n".join(l for l in listeners.splitlines() if l.startswith("tcp"))
+                )
+            )
 
             def _listening(p: int) -> bool:
-                return bool(
-                    self._read_command_output(
-                        client,
-                        f"ss -tlnH 'sport = :{p}' 2>/dev/null | head -1",
-                        timeout=10,
-                    )
-                )
+                return str(p) in tcp_ports
 
             panels = []
             for spec in specs:
@@ -1315,6 +2948,159 @@ class SSHService:
             logger.error(f"Error getting webpanels status from {ip}: {str(e)}")
             return {"panels": [], "error": str(e)}
 
+    # Потоки журнала для инкрементального чтения: в вывод попадают только
+    # нужные поля (время, IP), курсор и маркер "-- No entries --"
+    _JOURNAL_AUTH_AWK = (
+        "/^-- (cursor:|No entries)/ {print; next} "
+        "/Failed password|authentication failure/ {ip=\"\"; "
+        "if (match($0, /from [0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+/)) ip=substr($0, RSTART+5, RLENGTH-5); "
+        "print $1, ip}"
+    )
+    _JOURNAL_ERRORS_AWK = "/^-- (cursor:|No entries)/ {print; next} /^[0-9]/ {print $1}"
+    _JOURNAL_CURSOR_RE = re.compile(r"^[A-Za-z0-9=;_-]+$")
+
+    @classmethod
+    def _journal_position(cls, cursor: Optional[str]) -> str:
+        if cursor and cls._JOURNAL_CURSOR_RE.match(cursor):
+            return f"--after-cursor='{cursor}'"
+        return '--since "24 hours ago"'
+
+    @staticmethod
+    def _journal_command(position: str, extra_args: str, awk_program: str) -> str:
+        return (
+            f"sudo journalctl {position} {extra_args}--no-pager -o short-unix --show-cursor "
+            f"2>/dev/null | awk '{awk_program}'"
+        )
+
+    _PORTS_BASELINE_FILE = "/var/tmp/open_ports_baseline.txt"
+
+    @classmethod
+    def _security_section_commands(cls, auth_position: str, errors_position: str) -> List[tuple]:
+        """Журнал (с позиции курсора) и остальные проверки безопасности одним скриптом."""
+        baseline = cls._PORTS_BASELINE_FILE
+        return [
+            ("now", "date +%s"),
+            ("auth", cls._journal_command(auth_position, "", cls._JOURNAL_AUTH_AWK)),
+            (
+                "errors",
+                cls._journal_command(errors_position, "-p err..alert ", cls._JOURNAL_ERRORS_AWK),
+            ),
+            ("security_updates", "apt list --upgradable 2>/dev/null | grep -i security | wc -l"),
+            ("update_stamp", "stat -c %Y /var/lib/apt/periodic/update-success-stamp 2>/dev/null"),
+            (
+                "fail2ban",
+                "sudo fail2ban-client status sshd 2>/dev/null | grep \"Currently banned:\" | awk '{print $4}'",
+            ),
+            ("failed_services", "systemctl --failed --no-legend --plain 2>/dev/null | wc -l"),
+            (
+                "ports_baseline",
+                f"if [ -f {baseline} ]; then echo exists; cat {baseline}; else echo not_exists; fi",
+            ),
+            ("listeners", cls._LISTENERS_CMD),
+        ]
+
+    @staticmethod
+    def _parse_journal_stream(output: Optional[str]) -> Dict:
+        """Строки потока -> {"ok", "cursor", "rows": [(время, [поля])]}.
+
+        ok=False — ни курсора, ни "-- No entries --": journalctl не отработал
+        (нет прав, курсор потерян после ротации журнала).
+        """
+        result = {"ok": False, "cursor": None, "rows": []}
+        for line in (output or "").splitlines():
+            line = line.strip()
+            if line.startswith("-- cursor:"):
+                result["cursor"] = line[len("-- cursor:"):].strip()
+                result["ok"] = True
+            elif line.startswith("-- No entries"):
+                result["ok"] = True
+            elif line:
+                parts = line.split()
+                try:
+                    result["rows"].append((float(parts[0]), parts[1:]))
+                except ValueError:
+                    continue
+        return result
+
+    def _ingest_journal_sections(
+        self, key: str, cursors: Dict[str, str], sections: Dict[str, Optional[str]]
+    ) -> Optional[Dict]:
+        """Неудачные входы и ошибки за 24ч: в агрегатор идут только новые записи журнала.
+
+        Первый опрос хоста читает сутки (`--since`), дальше — `--after-cursor`.
+        cursors — курсоры, с которых читались разделы. None — journald недоступен.
+        """
+        auth = self._parse_journal_stream(sections.get("auth"))
+        errors = self._parse_journal_stream(sections.get("errors"))
+        now_raw = sections.get("now") or ""
+        now = float(now_raw) if now_raw.isdigit() else time.time()
+
+        if not auth["ok"]:
+            if cursors:
+                # Курсор больше не валиден — в следующий раз перечитаем сутки
+                logger.info(f"Journal cursor for {key} is no longer valid, resetting")
+                self._security_events.reset(key)
+            return None
+
+        self._security_events.ingest(
+            key,
+            cursors,
+            {"auth": auth["cursor"], "errors": errors["cursor"]},
+            failures=[(ts, fields[0] if fields else "") for ts, fields in auth["rows"]],
+            errors=[ts for ts, _ in errors["rows"]],
+            now=now,
+        )
+        return self._security_events.summary(key, now)
+
+    # Все счётчики за один проход awk по склеенным потокам (маркер "@@VSM-STREAM <имя>"):
+    # auth — весь журнал за сутки, err — только err..alert, authlog — auth.log
+    # на хостах без journalctl. На выходе одна строка JSON.
+    _SECURITY_COUNTERS_AWK = (
+        "/^@@VSM-STREAM / {src = $2; if (src == \"authlog\") legacy = 1; next} "
+        "(src == \"auth\" || src == \"authlog\") && /Failed password|authentication failure/ {"
+        " fails[src]++;"
+        " if (match($0, /from [0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+/)) ips[src, substr($0, RSTART+5, RLENGTH-5)]++ "
+        "} "
+        "src == \"err\" && /^[0-9]/ {errs++} "
+        "END {"
+        " s = legacy ? \"authlog\" : \"auth\";"
+        " printf \"{\\\"source\\\":\\\"%s\\\",\\\"failures\\\":%d,\\\"errors\\\":%d,\\\"ips\\\":{\","
+        " legacy ? \"auth.log\" : \"journal\", fails[s], errs;"
+        " sep = \"\";"
+        " for (k in ips) {split(k, p, SUBSEP); if (p[1] == s) {printf \"%s\\\"%s\\\":%d\", sep, p[2], ips[k]; sep = \",\"}}"
+        " print \"}}\" "
+        "}"
+    )
+    _SECURITY_COUNTERS_CMD = (
+        "{ echo '@@VSM-STREAM auth'; "
+        'sudo journalctl --since "24 hours ago" --no-pager -o short-unix 2>/dev/null; '
+        "echo '@@VSM-STREAM err'; "
+        'sudo journalctl --since "24 hours ago" -p err..alert --no-pager -o short-unix 2>/dev/null; '
+        "command -v journalctl >/dev/null 2>&1 || { echo '@@VSM-STREAM authlog'; "
+        'sudo grep "Failed password" /var/log/auth.log 2>/dev/null | tail -1000; }; '
+        f"}} | awk '{_SECURITY_COUNTERS_AWK}'"
+    )
+
+    def _journal_security_counters(self, client, top: int = 3) -> Dict:
+        """Счётчики за сутки одним проходом на хосте — когда курсоры недоступны."""
+        import json
+
+        output = self._read_command_output(client, self._SECURITY_COUNTERS_CMD, timeout=15)
+        try:
+            counters = json.loads(output.splitlines()[-1]) if output else {}
+        except (ValueError, IndexError):
+            logger.debug(f"Unexpected security counters output: {output[:200]}")
+            counters = {}
+        ips = sorted(
+            (counters.get("ips") or {}).items(), key=lambda item: (-item[1], item[0])
+        )
+        return {
+            "ssh_failures_24h": int(counters.get("failures", 0)),
+            "top_failed_ips": [{"ip": ip, "count": count} for ip, count in ips[:top]],
+            "error_events_24h": int(counters.get("errors", 0)),
+        }
+
+    @_cached_collector("security_events")
     def get_security_events(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> Dict:
@@ -1325,108 +3111,66 @@ class SSHService:
             # Используем connection pooling
             client = self.get_connection_pooled(ip, port, user, password)
 
-            ssh_failures_output = self._read_command_output(
-                client,
-                'sudo journalctl --since "24 hours ago" --no-pager 2>/dev/null | grep -E "Failed password|authentication failure" | wc -l',
-                timeout=15,
-            )
-            if not ssh_failures_output.isdigit():
-                ssh_failures_output = self._read_command_output(
+            key = self._sample_key(client)
+            names = [name for name, _ in self._security_section_commands("", "")]
+            agent = self._agent_sections(client, names)
+            if agent is not None:
+                sections, cursors = agent
+            else:
+                cursors = self._security_events.cursors(key)
+                sections = self._run_sections(
                     client,
-                    'sudo grep "Failed password" /var/log/auth.log 2>/dev/null | tail -1000 | wc -l',
-                    timeout=15,
+                    self._security_section_commands(
+                        self._journal_position(cursors.get("auth")),
+                        self._journal_position(cursors.get("errors")),
+                    ),
+                    timeout=timeout,
                 )
-            ssh_failures = (
-                int(ssh_failures_output) if ssh_failures_output.isdigit() else 0
-            )
 
-            top_failed_output = self._read_command_output(
-                client,
-                'sudo journalctl --since "24 hours ago" --no-pager 2>/dev/null | grep -E "Failed password|authentication failure" | grep -oE "from [0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+" | awk \'{print $2}\' | sort | uniq -c | sort -rn | head -3',
-                timeout=15,
-            )
-            if not top_failed_output:
-                top_failed_output = self._read_command_output(
-                    client,
-                    'sudo grep "Failed password" /var/log/auth.log 2>/dev/null | tail -1000 | grep -oE "from [0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+" | awk \'{print $2}\' | sort | uniq -c | sort -rn | head -3',
-                    timeout=15,
-                )
+            journal = self._ingest_journal_sections(key, cursors, sections)
+            if journal is None:
+                # Курсоров нет — все счётчики за сутки одним проходом на хосте
+                journal = self._journal_security_counters(client)
+            ssh_failures = journal["ssh_failures_24h"]
+            top_failed_ips = journal["top_failed_ips"]
+            error_events_24h = journal["error_events_24h"]
 
-            top_ips_output = top_failed_output.split("\n")
-            top_failed_ips = []
-            for line in top_ips_output:
-                if line.strip():
-                    parts = line.strip().split()
-                    if len(parts) >= 2:
-                        top_failed_ips.append({"ip": parts[1], "count": int(parts[0])})
-
-            # Проверяем обновления безопасности
-            _, stdout, _ = client.exec_command(
-                "apt list --upgradable 2>/dev/null | grep -i security | wc -l"
-            )
-            security_updates = stdout.read().decode("utf-8").strip()
+            # Обновления безопасности
+            security_updates = sections.get("security_updates") or ""
             security_updates = (
                 int(security_updates) if security_updates.isdigit() else 0
             )
 
             # Последнее обновление системы
-            _, stdout, _ = client.exec_command(
-                "stat -c %Y /var/lib/apt/periodic/update-success-stamp 2>/dev/null"
-            )
-            last_update_timestamp = stdout.read().decode("utf-8").strip()
+            last_update_timestamp = sections.get("update_stamp") or ""
             days_since_update = 0
             if last_update_timestamp.isdigit():
                 days_since_update = (
                     int(time.time()) - int(last_update_timestamp)
                 ) // 86400
 
-            fail2ban_output = self._read_command_output(
-                client,
-                "sudo fail2ban-client status sshd 2>/dev/null | grep \"Currently banned:\" | awk '{print $4}'",
-                timeout=10,
-            )
+            fail2ban_output = sections.get("fail2ban") or ""
             fail2ban_banned = int(fail2ban_output) if fail2ban_output.isdigit() else 0
 
-            failed_services_output = self._read_command_output(
-                client,
-                "systemctl --failed --no-legend --plain 2>/dev/null | wc -l",
-                timeout=10,
-            )
+            failed_services_output = sections.get("failed_services") or ""
             failed_services = (
                 int(failed_services_output) if failed_services_output.isdigit() else 0
             )
 
-            error_events_output = self._read_command_output(
-                client,
-                'sudo journalctl --since "24 hours ago" -p err..alert --no-pager 2>/dev/null | wc -l',
-                timeout=15,
-            )
-            error_events_24h = (
-                int(error_events_output) if error_events_output.isdigit() else 0
-            )
-
-            # Проверяем новые открытые порты
-            baseline_file = "/var/tmp/open_ports_baseline.txt"
-            baseline_exists = (
-                self._read_command_output(
-                    client,
-                    f'test -f {baseline_file} && echo "exists" || echo "not_exists"',
-                    timeout=10,
-                )
-                == "exists"
-            )
-
-            current_ports = self._get_listening_ports(client)
+            # Проверяем новые открытые порты относительно baseline
+            baseline_lines = (sections.get("ports_baseline") or "").splitlines()
+            current_ports = self._parse_listener_ports(sections.get("listeners") or "")
 
             new_open_ports = 0
-            if not baseline_exists:
+            if baseline_lines[:1] == ["not_exists"]:
                 # Создаем baseline
                 ports_str = "\n".join(current_ports)
-                client.exec_command(f'echo "{ports_str}" > {baseline_file}')
-            else:
+                self._exec_command(
+                    client, f'echo "{ports_str}" > {self._PORTS_BASELINE_FILE}'
+                )
+            elif baseline_lines[:1] == ["exists"]:
                 # Сравниваем с baseline
-                _, stdout, _ = client.exec_command(f"cat {baseline_file}")
-                baseline_ports = stdout.read().decode("utf-8").strip().split("\n")
+                baseline_ports = [line.strip() for line in baseline_lines[1:]]
                 new_ports = set(current_ports) - set(baseline_ports)
                 new_open_ports = len(new_ports)
 
@@ -1457,80 +3201,230 @@ class SSHService:
                 "error": str(e),
             }
 
-    def get_metrics_history(
-        self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
-    ) -> List[Dict]:
-        """Получение истории метрик CPU/Memory"""
-        import time
-
-        try:
-            # Используем connection pooling
-            client = self.get_connection_pooled(ip, port, user, password)
+    _MEM_USED_PCT_CMD = "free | grep Mem | awk '{printf \"%.1f\", $3/$2 * 100}'"
+
+    # --- Потоковый режим метрик ---
+    # Один долгоживущий exec на хост: удалённый цикл раз в _STREAM_INTERVAL
+    # секунд печатает строку JSON с сырыми счётчиками (uptime, cpu, память,
+    # rx/tx интерфейсов). Фоновый MetricsStream читает канал и складывает
+    # точки в metrics_store; история отдаётся из памяти без exec на опрос.
+    _STREAM_ENABLED = True
+    _STREAM_INTERVAL = 5
+    _STREAM_IDLE_TIMEOUT = 600
+    _streams: Dict[str, MetricsStream] = {}  # ключ пула -> поток
+    _streams_lock = threading.Lock()
+    _STREAM_SAMPLE_AWK = (
+        'FILENAME == "/proc/uptime" {up = $1} '
+        'FILENAME == "/proc/stat" && $1 == "cpu" {cpu = $2; for (i = 3; i <= 9; i++) cpu = cpu "," $i} '
+        'FILENAME == "/proc/meminfo" && $1 == "MemTotal:" {mt = $2} '
+        'FILENAME == "/proc/meminfo" && $1 == "MemAvailable:" {ma = $2} '
+        'FILENAME == "/proc/net/dev" && FNR > 2 {sub(/^ +/, ""); split($0, f, /[: ]+/); '
+        'net = net sep "\\"" f[1] "\\":[" f[2] "," f[10] "]"; sep = ","} '
+        'END {printf "{\\"uptime\\":%s,\\"cpu\\":[%s],\\"mem\\":[%d,%d],\\"net\\":{%s}}\\n", '
+        "up, cpu, mt, ma, net}"
+    )
 
-            history_file = "/var/tmp/metrics_history.json"
-            max_points = 60
+    @classmethod
+    def configure_streams(
+        cls,
+        enabled: Optional[bool] = None,
+        interval: Optional[int] = None,
+        idle_timeout: Optional[int] = None,
+    ) -> None:
+        """Настроить потоковый режим (вызывается при регистрации сервисов)."""
+        if enabled is not None:
+            cls._STREAM_ENABLED = bool(enabled)
+        if interval is not None:
+            cls._STREAM_INTERVAL = max(1, int(interval))
+        if idle_timeout is not None:
+            cls._STREAM_IDLE_TIMEOUT = max(1, int(idle_timeout))
 
-            # Получаем текущие метрики
-            cpu_usage = self._get_cpu_used_pct(client, timeout=timeout)
+    @classmethod
+    def _metrics_stream_command(cls, interval: int) -> str:
+        # Канал закрыт — awk получает SIGPIPE и цикл завершается
+        return (
+            f"while :; do awk '{cls._STREAM_SAMPLE_AWK}' /proc/uptime /proc/stat "
+            f"/proc/meminfo /proc/net/dev || exit 1; sleep {interval}; done"
+        )
 
-            _, stdout, _ = client.exec_command(
-                "free | grep Mem | awk '{printf \"%.1f\", $3/$2 * 100}'"
-            )
-            mem_usage = stdout.read().decode("utf-8").strip()
-            mem_usage = float(mem_usage) if mem_usage else 0.0
+    def _open_metrics_stream(
+        self, ip: str, user: str, password: str, port: int, stop: threading.Event
+    ):
+        """Открыть канал потока на пуловом подключении и отдавать строки NDJSON."""
+        client = self.get_connection_pooled(ip, port, user, password)
+        key = self._sample_key(client)
+        command = self._metrics_stream_command(self._STREAM_INTERVAL)
+        channel = client.get_transport().open_session(timeout=10)
+        # Нет строки за три интервала — канал считается мёртвым
+        channel.settimeout(self._STREAM_INTERVAL * 3 + 5)
+        try:
+            channel.exec_command(command)
+            self._record_io(client, commands=1, bytes_out=len(command))
+            buffer = b""
+            while not stop.is_set():
+                chunk = channel.recv(4096)
+                if not chunk:
+                    return
+                self._record_io(client, bytes_in=len(chunk))
+                self._touch(key)  # канал занят — reaper не считает подключение простаивающим
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield line.decode("utf-8", "replace")
+        finally:
+            channel.close()
+
+    def _ingest_stream_sample(self, sample_key: str, host: str, line: str) -> Dict:
+        """Строка потока -> точка cpu/memory в metrics_store (+ свежие счётчики сети)."""
+        import json
+
+        sample = json.loads(line)
+        uptime = float(sample["uptime"])
+        point = {}
+        cpu_used = self._update_cpu_sample(
+            sample_key, [int(v) for v in sample["cpu"][:8]], uptime
+        )
+        if cpu_used is not None:
+            point["cpu"] = cpu_used
+        mem_total, mem_available = sample["mem"]
+        if mem_total:
+            point["memory"] = round((mem_total - mem_available) / mem_total * 100, 1)
+        # Счётчики сети тоже обновляем: панель сети получит дельту без первого замера
+        self._update_net_sample(
+            sample_key,
+            {
+                iface: (int(rx), int(tx))
+                for iface, (rx, tx) in sample.get("net", {}).items()
+                if _NET_IFACE_RE.match(iface)
+            },
+            uptime,
+        )
+        if point:
+            self.metrics_store.append(host, point, timestamp=int(time.time()))
+        return point
+
+    def ensure_metrics_stream(
+        self, ip: str, user: str, password: str, port: int = 22
+    ) -> Optional[MetricsStream]:
+        """Запустить (или продлить) поток метрик хоста; None — режим выключен."""
+        if not self._STREAM_ENABLED:
+            return None
+        key = self._pool_key(ip, port, user)
+        host = f"{ip}:{port}"
+        with self._streams_lock:
+            stream = self._streams.get(key)
+            if stream is None or not stream.running:
+                stream = MetricsStream(
+                    key,
+                    open_lines=lambda stop: self._open_metrics_stream(ip, user, password, port, stop),
+                    on_line=lambda line: self._ingest_stream_sample(key, host, line),
+                    idle_timeout=self._STREAM_IDLE_TIMEOUT,
+                )
+                self._streams[key] = stream
+                stream.start()
+                logger.info(f"Started metrics stream for {key}")
+        stream.touch()
+        return stream
 
-            timestamp = int(time.time())
+    @classmethod
+    def _stream_is_live(cls, stream: Optional[MetricsStream]) -> bool:
+        """Поток подключён и прислал строку не позже трёх интервалов назад."""
+        if stream is None or not stream.connected:
+            return False
+        age = stream.sample_age()
+        return age is not None and age <= cls._STREAM_INTERVAL * 3
 
-            # Проверяем, установлен ли jq
-            _, stdout, _ = client.exec_command(
-                'export PATH="/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:$PATH"; command -v jq 2>/dev/null'
-            )
-            has_jq = bool(stdout.read().decode("utf-8").strip())
+    @classmethod
+    def stop_metrics_streams(cls) -> None:
+        with cls._streams_lock:
+            streams = list(cls._streams.values())
+            cls._streams.clear()
+        for stream in streams:
+            stream.stop()
 
-            # Читаем существующую историю
-            _, stdout, _ = client.exec_command(
-                f'test -f {history_file} && cat {history_file} || echo "[]"'
-            )
-            history_json = stdout.read().decode("utf-8").strip() or "[]"
+    @classmethod
+    def metrics_stream_stats(cls) -> List[Dict]:
+        with cls._streams_lock:
+            streams = list(cls._streams.values())
+        return [stream.status() for stream in streams]
 
-            if has_jq:
-                # Используем jq для обновления истории
-                new_point = f'{{"timestamp":{timestamp},"cpu":{cpu_usage},"memory":{mem_usage}}}'
-                cmd = f"echo '{history_json}' | jq \". += [{new_point}] | .[-{max_points}:]\" > {history_file} && cat {history_file}"
-                _, stdout, _ = client.exec_command(cmd)
-                result = stdout.read().decode("utf-8").strip()
+    def _stored_metrics_history(
+        self, host: str, max_points: int, range_seconds: Optional[int], points: Optional[int]
+    ) -> List[Dict]:
+        if range_seconds is None:
+            return self.metrics_store.window(host, ["cpu", "memory"], limit=max_points)
+        return self.metrics_store.query(
+            host, ["cpu", "memory"], range_seconds=range_seconds, points=points
+        )["points"]
 
-                import json
+    @_cached_collector("metrics_history")
+    def get_metrics_history(
+        self,
+        ip: str,
+        user: str,
+        password: str,
+        port: int = 22,
+        timeout: int = 30,
+        range_seconds: Optional[int] = None,
+        points: Optional[int] = None,
+    ) -> List[Dict]:
+        """Получение истории метрик CPU/Memory
+
+        Текущие CPU и память снимаются одной командой и дописываются в
+        локальное хранилище (self.metrics_store). Без range_seconds
+        возвращаются последние max_points точек; с range_seconds — ряд за этот
+        период из подходящего уровня хранения, прореженный LTTB до points.
+        Если для хоста работает поток метрик (ensure_metrics_stream), точки
+        уже в хранилище и exec не нужен. На сервере ничего не сохраняется.
+        """
+        import time
 
-                history = json.loads(result) if result else []
-            else:
-                # Без jq - используем Python для парсинга
-                import json
+        max_points = 60
+        host = f"{ip}:{port}"
+        try:
+            # Поток метрик хоста уже пишет точки в хранилище — отдаём из памяти
+            stream = self._streams.get(self._pool_key(ip, port, user))
+            if self._stream_is_live(stream):
+                stream.touch()
+                return self._stored_metrics_history(host, max_points, range_seconds, points)
 
-                try:
-                    history = json.loads(history_json) if history_json != "[]" else []
-                except:
-                    history = []
+            # Используем connection pooling
+            client = self.get_connection_pooled(ip, port, user, password)
 
-                history.append(
-                    {"timestamp": timestamp, "cpu": cpu_usage, "memory": mem_usage}
-                )
+            sample_key = self._sample_key(client)
+            sections = self._collect_sections(
+                client,
+                [
+                    ("cpu", self._cpu_stat_command(sample_key)),
+                    ("mem", self._MEM_USED_PCT_CMD),
+                ],
+                timeout=timeout,
+            )
 
-                # Оставляем только последние max_points точек
-                history = history[-max_points:]
+            try:
+                cpu_usage = self._cpu_pct_from_output(sample_key, sections.get("cpu") or "")
+                if cpu_usage is None:
+                    cpu_usage = self._get_cpu_used_pct(
+                        client, timeout=timeout, force_sample=True
+                    )
+            except ValueError:
+                cpu_usage = self._get_cpu_used_pct_fallback(client, timeout=timeout)
 
-                # Сохраняем обратно
-                history_str = json.dumps(history)
-                client.exec_command(f"echo '{history_str}' > {history_file}")
+            try:
+                mem_usage = float((sections.get("mem") or "0").replace(",", "."))
+            except ValueError:
+                mem_usage = 0.0
 
-            return history
+            self.metrics_store.append(
+                host, {"cpu": cpu_usage, "memory": mem_usage}, timestamp=int(time.time())
+            )
+            return self._stored_metrics_history(host, max_points, range_seconds, points)
 
         except Exception as e:
             logger.error(f"Error getting metrics history from {ip}: {str(e)}")
-            # Возвращаем хотя бы текущие данные
-            import time
-
-            return [
+            # Возвращаем хотя бы уже накопленную историю
+            history = self._stored_metrics_history(host, max_points, range_seconds, points)
+            return history or [
                 {
                     "timestamp": int(time.time()),
                     "cpu": 0.0,
@@ -1539,6 +3433,7 @@ class SSHService:
                 }
             ]
 
+    # Не кэшируется: после установки утилит проверка должна видеть новое состояние
     def check_required_tools(
         self, ip: str, user: str, password: str, port: int = 22, timeout: int = 30
     ) -> Dict:
@@ -1547,6 +3442,10 @@ class SSHService:
         try:
             # Используем connection pooling
             client = self.get_connection_pooled(ip, port, user, password)
+            # Утилиты могли только что поставить — возможности и факты хоста
+            # (версия docker) определятся заново
+            self._capabilities.invalidate(self._pool_key(ip, port, user))
+            self._facts.invalidate(self._pool_key(ip, port, user))
 
             tools = {
                 "vnstat": {
@@ -1584,16 +3483,27 @@ class SSHService:
             # На Debian 12 (bookworm) команда `which` устарела и часто отсутствует,
             # а PATH в неинтерактивной SSH-сессии не включает /usr/sbin (где живёт ufw).
             # Поэтому используем POSIX-builtin `command -v` с явным PATH и фолбэком на прямой поиск файла.
+            # Все пробы независимы: детект утилит и статусы vnstat/ufw идут
+            # одновременно, статусы учитываются только для установленных утилит
             sbin_path = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+            commands = []
             for tool_key, tool_info in tools.items():
                 name = tool_info["name"]
-                detect_cmd = (
+                commands.append((
+                    tool_key,
                     f'export PATH="{sbin_path}:$PATH"; '
                     f"command -v {name} 2>/dev/null "
-                    f"|| ls /usr/sbin/{name} /sbin/{name} /usr/bin/{name} /bin/{name} 2>/dev/null | head -n1"
-                )
-                _, stdout, _ = client.exec_command(detect_cmd)
-                tool_path = stdout.read().decode("utf-8").strip().splitlines()
+                    f"|| ls /usr/sbin/{name} /sbin/{name} /usr/bin/{name} /bin/{name} 2>/dev/null | head -n1",
+                ))
+            commands.append(("vnstat_active", "systemctl is-active vnstat 2>/dev/null"))
+            commands.append((
+                "ufw_status",
+                "sudo -n ufw status 2>/dev/null | grep \"Status:\" | awk '{print $2}'",
+            ))
+            probes = self._run_pipelined(client, commands, timeout=timeout)
+
+            for tool_key in tools:
+                tool_path = probes[tool_key]["stdout"].splitlines()
                 tool_path = tool_path[0].strip() if tool_path else ""
                 tools[tool_key]["installed"] = bool(tool_path)
                 if tool_path:
@@ -1601,10 +3511,7 @@ class SSHService:
 
             # Проверяем, запущен ли vnstat
             if tools["vnstat"]["installed"]:
-                _, stdout, _ = client.exec_command(
-                    "systemctl is-active vnstat 2>/dev/null"
-                )
-                vnstat_status = stdout.read().decode("utf-8").strip()
+                vnstat_status = probes["vnstat_active"]["stdout"]
                 tools["vnstat"]["running"] = vnstat_status == "active"
                 if vnstat_status != "active":
                     tools["vnstat"]["warning"] = "Установлен, но не запущен"
@@ -1614,10 +3521,7 @@ class SSHService:
 
             # Проверяем, включен ли UFW
             if tools["ufw"]["installed"]:
-                _, stdout, _ = client.exec_command(
-                    "sudo ufw status 2>/dev/null | grep \"Status:\" | awk '{print $2}'"
-                )
-                ufw_status = stdout.read().decode("utf-8").strip()
+                ufw_status = probes["ufw_status"]["stdout"]
                 tools["ufw"]["enabled"] = ufw_status.lower() == "active"
                 if ufw_status.lower() != "active":
                     tools["ufw"]["warning"] = (
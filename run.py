@@ -20,7 +20,11 @@ def cleanup():
     logger = logging.getLogger(__name__)
     logger.info("[CLEANUP] Cleaning up SSH connections...")
     try:
+        from app.services import registry
         from app.services.ssh_service import SSHService
+        scheduler = registry.get('scheduler')
+        if scheduler:
+            scheduler.stop()
         SSHService.close_all()
         logger.info("[OK] SSH connections closed")
     except Exception as e:
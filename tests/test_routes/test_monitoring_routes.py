@@ -0,0 +1,333 @@
+import json
+
+from app.services import registry
+from app.services.collection_scheduler import CollectionScheduler
+from app.services.fleet_service import FleetCollector
+from app.services.monitoring_hub import MonitoringHub
+
+
+class StubDataManager:
+    def __init__(self):
+        self.loads = 0
+
+    def load_servers(self, config):
+        self.loads += 1
+        return [{
+            'id': '1',
+            'ip_address': '10.0.0.1',
+            'ssh_credentials': {'user': 'root', 'port': 22, 'password_decrypted': 'secret'},
+        }]
+
+
+class StubSSHService:
+    def __init__(self, fail_security=False):
+        self.calls = []
+        self.fail_security = fail_security
+
+    def _collect(self, name, **kwargs):
+        self.calls.append(name)
+        assert kwargs['ip'] == '10.0.0.1'
+        assert kwargs['password'] == 'secret'
+        return {'panel': name}
+
+    def get_network_stats(self, **kwargs):
+        return self._collect('network', **kwargs)
+
+    def get_firewall_stats(self, **kwargs):
+        return self._collect('firewall', **kwargs)
+
+    def get_services_stats(self, **kwargs):
+        return self._collect('services', **kwargs)
+
+    def get_reticulum_status(self, **kwargs):
+        return self._collect('reticulum', **kwargs)
+
+    def get_webpanels_status(self, **kwargs):
+        return self._collect('webpanels', **kwargs)
+
+    def get_security_events(self, **kwargs):
+        if self.fail_security:
+            raise RuntimeError('journalctl failed')
+        return self._collect('security', **kwargs)
+
+    def ensure_metrics_stream(self, **kwargs):
+        pass
+
+    def get_connection_pooled(self, hostname, port, username, password=None):
+        self.calls.append('connect')
+
+    def get_metrics_history(self, range_seconds=None, points=None, **kwargs):
+        return self._collect(f'history:{range_seconds}:{points}', **kwargs)
+
+
+def _login(client):
+    with client.session_transaction() as sess:
+        sess['authenticated'] = True
+        sess['pin_verified'] = True
+
+
+def _read_events(response, count):
+    events = []
+    for chunk in response.response:
+        chunk = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event:'):
+            name, data = chunk.strip().split('\n')
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+            if len(events) == count:
+                break
+    response.close()
+    return events
+
+
+class TestMonitoringStreamRoute:
+    def test_stream_multiplexes_panels_and_shares_collection(self, client):
+        data_manager = StubDataManager()
+        ssh_service = StubSSHService()
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        registry.register('data_manager', data_manager)
+        registry.register('ssh', ssh_service)
+        registry.register('monitoring_hub', MonitoringHub())
+        registry.register('scheduler', scheduler)
+        _login(client)
+
+        try:
+            response = client.get('/api/monitoring/1/stream?range=1h&points=300', buffered=False)
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            events = _read_events(response, 7)
+
+            # Второй таб того же сервера получает уже собранные данные
+            second = client.get('/api/monitoring/1/stream?range=1h&points=300', buffered=False)
+            assert len(_read_events(second, 7)) == 7
+            # Отдельный маршрут панели отдаёт тот же снимок планировщика
+            firewall = client.get('/api/monitoring/1/firewall-stats').get_json()
+        finally:
+            scheduler.stop()
+
+        assert [name for name, _ in events] == [
+            'network', 'firewall', 'services', 'reticulum', 'webpanels', 'security', 'history'
+        ]
+        assert events[0][1]['data'] == {'panel': 'network'}
+        assert events[-1][1]['data'] == {'panel': 'history:3600:300'}
+        assert firewall['data'] == {'panel': 'firewall'}
+        assert len(ssh_service.calls) == 7
+        assert 'connect' not in ssh_service.calls
+        assert data_manager.loads == 3
+
+    def test_stream_unknown_server_returns_404(self, client):
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', StubSSHService())
+        registry.register('monitoring_hub', MonitoringHub())
+        registry.register('scheduler', CollectionScheduler(StubSSHService()))
+        _login(client)
+
+        response = client.get('/api/monitoring/missing/stream')
+
+        assert response.status_code == 404
+        assert response.get_json()['success'] is False
+
+
+class TestMonitoringAllRoute:
+    def test_all_returns_every_section_with_timing_and_errors(self, client):
+        ssh_service = StubSSHService(fail_security=True)
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', ssh_service)
+        registry.register('monitoring_hub', MonitoringHub())
+        registry.register('scheduler', scheduler)
+        _login(client)
+
+        try:
+            response = client.get('/api/monitoring/1/all?range=24h&points=100')
+        finally:
+            scheduler.stop()
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['success'] is True
+        sections = body['data']
+        assert set(sections) == {
+            'network', 'firewall', 'services', 'reticulum', 'webpanels', 'security', 'history'
+        }
+        assert sections['network'] == {
+            'success': True, 'data': {'panel': 'network'},
+            'elapsed_ms': sections['network']['elapsed_ms'], 'age': sections['network']['age'],
+        }
+        assert sections['network']['age'] < 1
+        assert sections['history']['data'] == {'panel': 'history:86400:100'}
+        assert sections['security']['success'] is False
+        assert sections['security']['error'] == 'journalctl failed'
+        assert all('elapsed_ms' in section for section in sections.values())
+        # SSH ходит только планировщик: по одному сбору на панель
+        assert 'connect' not in ssh_service.calls
+        assert len(ssh_service.calls) == 6
+
+    def test_all_reports_panels_still_collecting_as_pending(self, client):
+        ssh_service = StubSSHService()
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        scheduler.request = lambda *args, **kwargs: None
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', ssh_service)
+        registry.register('monitoring_hub', MonitoringHub())
+        registry.register('scheduler', scheduler)
+        _login(client)
+
+        sections = client.get('/api/monitoring/1/all?timeout=1').get_json()['data']
+
+        assert all(section['pending'] is True for section in sections.values())
+        assert sections['network']['success'] is False
+
+
+class TestSnapshotRoutes:
+    def test_panel_route_serves_scheduler_snapshot_with_age(self, client):
+        ssh_service = StubSSHService()
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', ssh_service)
+        registry.register('scheduler', scheduler)
+        _login(client)
+        try:
+            first = client.get('/api/monitoring/1/firewall-stats').get_json()
+            second = client.get('/api/monitoring/1/firewall-stats').get_json()
+            history = client.get('/api/monitoring/1/metrics-history?range=7d&points=50').get_json()
+        finally:
+            scheduler.stop()
+
+        assert first['success'] is True
+        assert first['data'] == {'panel': 'firewall'}
+        assert second['data'] == first['data']
+        assert second['age'] >= 0 and 'collected_at' in second
+        assert ssh_service.calls.count('firewall') == 1
+        assert history['data'] == {'panel': 'history:604800:50'}
+
+    def test_failed_collection_error_reaches_the_client(self, client):
+        scheduler = CollectionScheduler(StubSSHService(fail_security=True), tick=0.05)
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', StubSSHService())
+        registry.register('scheduler', scheduler)
+        _login(client)
+        try:
+            response = client.get('/api/monitoring/1/security-events')
+        finally:
+            scheduler.stop()
+
+        assert response.status_code == 500
+        assert response.get_json()['error'] == 'journalctl failed'
+
+    def test_collection_in_progress_is_retryable(self, client):
+        ssh_service = StubSSHService()
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        scheduler.request = lambda *args, **kwargs: None
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', ssh_service)
+        registry.register('scheduler', scheduler)
+        _login(client)
+
+        response = client.get('/api/monitoring/1/firewall-stats')
+
+        assert response.status_code == 202
+        assert response.headers['Retry-After'] == '5'
+        assert response.get_json()['pending'] is True
+
+    def test_server_stats_without_facts_returns_only_metrics(self, client):
+        ssh_service = StubSSHService()
+        ssh_service.get_server_stats = lambda **kwargs: {
+            'os': 'Debian 12', 'uptime': 'up 1 day', 'net': [{'iface': 'eth0'}],
+            'cpu': {'cores': 2, 'kernel': '6.1', 'used_pct': 7.5},
+            'docker': {'present': True, 'version': '24.0', 'running': 1},
+            'facts_id': 'abcd1234-1700000000',
+        }
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        registry.register('data_manager', StubDataManager())
+        registry.register('scheduler', scheduler)
+        _login(client)
+        try:
+            full = client.get('/api/server/1/stats').get_json()['stats']
+            volatile = client.get('/api/server/1/stats?facts=0').get_json()['stats']
+        finally:
+            scheduler.stop()
+
+        assert full['os'] == 'Debian 12'
+        assert volatile == {
+            'uptime': 'up 1 day',
+            'cpu': {'used_pct': 7.5},
+            'docker': {'running': 1},
+            'facts_id': 'abcd1234-1700000000',
+        }
+
+
+class StubFleetSSHService:
+    def get_fleet_host_stats(self, **kwargs):
+        return {'cpu': {'used_pct': 7.5}, 'mem': {'used_pct': 30.0},
+                'disks': [{'mount': '/', 'used_pct': '12'}], 'load': {'1m': '0.10'},
+                'uptime': 'up 1 day'}
+
+
+class TestFleetStreamRoute:
+    def test_stream_emits_host_lines_then_summary(self, client):
+        _login(client)
+        registry.register('data_manager', StubDataManager())
+        registry.register('fleet', FleetCollector(StubFleetSSHService()))
+
+        response = client.get('/api/fleet/stream?deadline=5')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert lines[0]['id'] == '1'
+        assert lines[0]['overview']['disk_pct'] == 12.0
+        assert lines[-1]['summary'] == {**lines[-1]['summary'], 'total': 1, 'ok': 1, 'deadline': 5}
+
+
+class TestStatsStreamRoute:
+    def test_stream_emits_fields_then_becomes_scheduler_snapshot(self, client):
+        ssh_service = StubSSHService()
+
+        def stream_server_stats(timeout=None, **kwargs):
+            assert kwargs['ip'] == '10.0.0.1' and timeout == 10
+            yield {'section': 'cpu', 'data': {'cores': 2, 'used_pct': 7.5, 'kernel': '6.1'}}
+            yield {'section': 'docker', 'data': {'present': False}}
+            yield {'done': True, 'timed_out': ['docker'], 'facts_id': 'abcd1234-1', 'elapsed_ms': 12}
+
+        ssh_service.stream_server_stats = stream_server_stats
+        ssh_service.get_server_stats = lambda **kwargs: ssh_service.calls.append('server_stats')
+        scheduler = CollectionScheduler(ssh_service, tick=0.05)
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', ssh_service)
+        registry.register('scheduler', scheduler)
+        _login(client)
+        try:
+            response = client.get('/api/server/1/stats/stream?timeout=10')
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+            snapshot = client.get('/api/server/1/stats').get_json()
+        finally:
+            scheduler.stop()
+
+        assert response.mimetype == 'application/x-ndjson'
+        assert [line.get('section') for line in lines] == ['cpu', 'docker', None]
+        assert lines[-1]['done'] is True
+        assert snapshot['stats'] == {
+            'cpu': {'cores': 2, 'used_pct': 7.5, 'kernel': '6.1'},
+            'docker': {'present': False},
+            'timed_out': ['docker'],
+            'facts_id': 'abcd1234-1',
+        }
+        assert 'server_stats' not in ssh_service.calls
+
+    def test_stream_reports_collection_error_as_line(self, client):
+        ssh_service = StubSSHService()
+
+        def stream_server_stats(**kwargs):
+            raise RuntimeError('Authentication failed')
+            yield
+
+        ssh_service.stream_server_stats = stream_server_stats
+        registry.register('data_manager', StubDataManager())
+        registry.register('ssh', ssh_service)
+        _login(client)
+
+        response = client.get('/api/server/1/stats/stream')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        assert response.status_code == 200
+        assert lines == [{'success': False, 'error': 'Authentication failed'}]
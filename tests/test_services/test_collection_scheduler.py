@@ -0,0 +1,139 @@
+import threading
+import time
+
+from app.services.collection_scheduler import CollectionScheduler
+
+CREDS = {'ip': '10.0.0.1', 'user': 'root', 'password': 'secret', 'port': 22}
+
+
+def _wait(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class StubSSHService:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.closed = []
+
+    def close_pooled_connection(self, ip, port, user):
+        self.closed.append((ip, port, user))
+        return True
+
+    def _collect(self, name, **kwargs):
+        with self._lock:
+            self.calls.append((name, kwargs.get('range_seconds')))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return {'panel': name, 'run': len(self.calls)}
+
+    def get_network_stats(self, **kwargs):
+        return self._collect('network', **kwargs)
+
+    def get_firewall_stats(self, **kwargs):
+        return self._collect('firewall', **kwargs)
+
+    def get_services_stats(self, **kwargs):
+        return self._collect('services', **kwargs)
+
+    def get_security_events(self, **kwargs):
+        raise RuntimeError('journalctl failed')
+
+    def get_metrics_history(self, **kwargs):
+        return self._collect('history', **kwargs)
+
+
+class TestCollectionScheduler:
+    def test_first_request_waits_then_serves_snapshot_with_age(self):
+        ssh = StubSSHService()
+        scheduler = CollectionScheduler(ssh, intervals={'network_stats': 0.1}, tick=0.02)
+        try:
+            first = scheduler.request('1', 'network_stats', CREDS, wait=2)
+            assert first['data'] == {'panel': 'network', 'run': 1}
+            assert first['error'] is None
+
+            # Следующий запрос не ждёт SSH: снимок есть сразу, фон обновляет его сам
+            assert _wait(lambda: len(ssh.calls) >= 3)
+            latest = scheduler.request('1', 'network_stats', CREDS, wait=0)
+            assert latest['data']['run'] >= 2
+            assert latest['age'] < 1
+        finally:
+            scheduler.stop()
+
+    def test_requested_timeout_becomes_collection_deadline(self):
+        ssh = StubSSHService()
+        timeouts = []
+        ssh.get_network_stats = lambda **kwargs: timeouts.append(kwargs['timeout']) or {}
+        scheduler = CollectionScheduler(ssh, intervals={'network_stats': 0.05}, timeout=30, tick=0.02)
+        try:
+            scheduler.request('1', 'network_stats', CREDS, wait=2, timeout=8)
+            scheduler.request('1', 'network_stats', CREDS, wait=0)
+            assert _wait(lambda: len(timeouts) >= 2)
+        finally:
+            scheduler.stop()
+
+        assert set(timeouts) == {8}
+
+    def test_params_failures_and_pool_bound(self):
+        ssh = StubSSHService(delay=0.1)
+        scheduler = CollectionScheduler(ssh, max_workers=2, tick=0.02)
+        try:
+            for collector in ('network_stats', 'firewall_stats', 'services_stats'):
+                scheduler.request('1', collector, CREDS, wait=0)
+            hour = scheduler.request('1', 'metrics_history', CREDS, params={'range_seconds': 3600}, wait=2)
+            week = scheduler.request('1', 'metrics_history', CREDS, params={'range_seconds': 604800}, wait=2)
+            failed = scheduler.request('1', 'security_events', CREDS, wait=2)
+
+            assert hour['data']['panel'] == 'history'
+            assert ('history', 3600) in ssh.calls and ('history', 604800) in ssh.calls
+            assert week['data'] != hour['data']
+            assert failed['data'] is None
+            assert failed['error'] == 'journalctl failed'
+            assert ssh.max_active <= 2
+            assert scheduler.stats()['jobs'] == 6
+            assert scheduler.stats()['failures'] == 1
+        finally:
+            scheduler.stop()
+
+    def test_idle_jobs_are_removed_and_forget_drops_snapshots(self):
+        ssh = StubSSHService()
+        scheduler = CollectionScheduler(ssh, idle_timeout=0.1, tick=0.02)
+        try:
+            scheduler.request('1', 'network_stats', CREDS, wait=2)
+            scheduler.request('2', 'firewall_stats', CREDS, wait=2)
+            scheduler.forget('2')
+            assert scheduler.stats()['jobs'] == 1
+            assert ssh.closed == [('10.0.0.1', 22, 'root')]
+            assert _wait(lambda: scheduler.stats()['jobs'] == 0)
+            assert scheduler.stats()['snapshots'] == 0
+        finally:
+            scheduler.stop()
+
+    def test_jobs_removed_while_collecting_leave_no_snapshot(self):
+        ssh = StubSSHService(delay=0.3)
+        scheduler = CollectionScheduler(ssh, idle_timeout=0.05, tick=0.02)
+        try:
+            scheduler.request('1', 'network_stats', CREDS, wait=0)
+            scheduler.request('2', 'firewall_stats', CREDS, wait=0)
+            assert _wait(lambda: scheduler.stats()['collecting'] == 2)
+            # Простой дольше idle_timeout во время сбора: задание ждёт его конца
+            time.sleep(0.1)
+            assert scheduler.stats()['jobs'] == 2
+            scheduler.forget('2')
+
+            assert _wait(lambda: scheduler.stats()['jobs'] == 0)
+            time.sleep(0.3)
+            assert scheduler.stats()['snapshots'] == 0
+        finally:
+            scheduler.stop()
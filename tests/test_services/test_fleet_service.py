@@ -0,0 +1,128 @@
+import threading
+import time
+
+from app.services.fleet_service import FleetCollector, fleet_overview
+
+
+class SlowSSHService:
+    """Фейковый SSHService: каждый хост отвечает с задержкой, считаем параллелизм."""
+
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = set(failing)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def get_fleet_host_stats(self, ip, user, password, port=22, timeout=15):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delays[ip])
+            if ip in self.failing:
+                raise RuntimeError('auth failed')
+            return {'cpu': {'used_pct': 1.0}}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def make_targets(count):
+    return [
+        {'id': str(i), 'name': f'vps-{i}', 'ip': f'10.0.0.{i}', 'user': 'root',
+         'password': 'secret', 'port': 22}
+        for i in range(count)
+    ]
+
+
+class TestFleetCollector:
+    def test_collect_takes_about_as_long_as_slowest_host(self):
+        """20 хостов по 0.2 с опрашиваются параллельно, а не 4 секунды подряд."""
+        targets = make_targets(20)
+        ssh = SlowSSHService({t['ip']: 0.2 for t in targets})
+        collector = FleetCollector(ssh, max_concurrency=20, timeout=5)
+
+        started = time.monotonic()
+        result = collector.collect(targets)
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 1.0
+        assert result['summary']['ok'] == 20
+        assert [r['id'] for r in result['servers']] == [t['id'] for t in targets]
+
+    def test_collect_respects_concurrency_cap(self):
+        targets = make_targets(12)
+        ssh = SlowSSHService({t['ip']: 0.05 for t in targets})
+        collector = FleetCollector(ssh, max_concurrency=16, timeout=5)
+
+        result = collector.collect(targets, max_concurrency=3)
+
+        assert ssh.max_in_flight <= 3
+        assert result['summary']['max_concurrency'] == 3
+        assert result['summary']['ok'] == 12
+
+    def test_collect_reports_errors_and_timeouts_per_host(self):
+        targets = make_targets(3)
+        targets.append({'id': 'no-creds', 'name': 'empty', 'ip': '',
+                        'error': 'SSH credentials not available'})
+        ssh = SlowSSHService({'10.0.0.0': 0.0, '10.0.0.1': 0.0, '10.0.0.2': 3.0},
+                             failing={'10.0.0.1'})
+        collector = FleetCollector(ssh, max_concurrency=4, timeout=1)
+
+        result = collector.collect(targets)
+        by_id = {r['id']: r for r in result['servers']}
+
+        assert by_id['0']['success'] is True
+        assert by_id['1'] == {**by_id['1'], 'success': False, 'error': 'auth failed'}
+        assert by_id['2']['success'] is False
+        assert 'Timeout' in by_id['2']['error']
+        assert by_id['no-creds']['error'] == 'SSH credentials not available'
+        assert result['summary']['failed'] == 3
+
+    def test_stream_yields_hosts_in_completion_order(self):
+        targets = make_targets(3)
+        ssh = SlowSSHService({'10.0.0.0': 0.3, '10.0.0.1': 0.0, '10.0.0.2': 0.15})
+        collector = FleetCollector(ssh, max_concurrency=3, timeout=5)
+
+        items = list(collector.stream(targets))
+
+        assert [i['id'] for i in items[:-1]] == ['1', '2', '0']
+        assert items[0]['overview']['cpu_pct'] == 1.0
+        assert items[-1]['summary']['total'] == 3
+        assert items[-1]['summary']['ok'] == 3
+
+    def test_stream_reports_hosts_missing_the_deadline(self):
+        targets = make_targets(2)
+        targets.append({'id': 'no-creds', 'name': 'empty', 'ip': '',
+                        'error': 'SSH credentials not available'})
+        ssh = SlowSSHService({'10.0.0.0': 0.0, '10.0.0.1': 2.0})
+        collector = FleetCollector(ssh, max_concurrency=2, timeout=5)
+
+        started = time.monotonic()
+        items = list(collector.stream(targets, deadline=0.3))
+
+        assert time.monotonic() - started < 1.5
+        by_id = {i['id']: i for i in items[:-1]}
+        assert items[0]['id'] == 'no-creds'
+        assert by_id['0']['success'] is True
+        assert by_id['1']['success'] is False
+        assert 'Deadline' in by_id['1']['error']
+        assert items[-1]['summary'] == {**items[-1]['summary'], 'ok': 1, 'failed': 2}
+
+
+def test_fleet_overview_prefers_root_disk():
+    stats = {
+        'cpu': {'used_pct': 12.5},
+        'mem': {'used_pct': 40.0},
+        'disks': [{'mount': '/data', 'used_pct': '90'}, {'mount': '/', 'used_pct': '35'}],
+        'load': {'1m': '0.42'},
+        'uptime': 'up 3 days',
+    }
+
+    assert fleet_overview(stats) == {
+        'cpu_pct': 12.5, 'mem_pct': 40.0, 'disk_pct': 35.0,
+        'load_1m': '0.42', 'uptime': 'up 3 days',
+    }
+    assert fleet_overview({'disks': [{'mount': '/a', 'used_pct': '20'},
+                                     {'mount': '/b', 'used_pct': '70'}]})['disk_pct'] == 70.0
@@ -0,0 +1,108 @@
+import subprocess
+import time
+from unittest.mock import Mock, patch
+
+from app.services.host_capabilities import DETECT_SCRIPT, CapabilityCache, parse_capabilities
+from app.services.ssh_service import SSHService
+
+
+def detect_output(**overrides):
+    flags = {
+        'ss': 1, 'netstat': 1, 'jq': 0, 'vnstat': 0, 'docker': 0, 'ufw': 0,
+        'firewall-cmd': 0, 'nft': 1, 'iptables': 1, 'journalctl': 1, 'top': 1,
+        'vmstat': 1, 'proc_stat': 1, 'sudo': 1,
+    }
+    flags.update(overrides)
+    return '\n'.join(f'{name}={value}' for name, value in flags.items())
+
+
+class TestParseCapabilities:
+    def test_detect_script_runs_locally(self):
+        output = subprocess.run(['sh', '-c', DETECT_SCRIPT], capture_output=True, text=True).stdout
+
+        capabilities = parse_capabilities(output)
+
+        assert capabilities is not None
+        assert capabilities['proc_stat'] is True
+        assert capabilities['cpu_method'] == 'proc_stat'
+
+    def test_derives_methods_from_flags(self):
+        capabilities = parse_capabilities(
+            detect_output(ss=0, proc_stat=0, top=0, ufw=0, nft=0, iptables=1)
+        )
+
+        assert capabilities['listeners'] == 'netstat'
+        assert capabilities['cpu_method'] == 'vmstat'
+        assert capabilities['firewall'] == 'iptables'
+        assert capabilities['firewall_cmd'] is False
+
+    def test_unrecognised_output_is_none(self):
+        assert parse_capabilities('') is None
+        assert parse_capabilities('bash: syntax error') is None
+
+
+class TestCapabilityCache:
+    def test_entries_expire_after_ttl(self):
+        cache = CapabilityCache(ttl=0.05)
+        cache.put('h:22:root', parse_capabilities(detect_output()))
+
+        assert cache.get('h:22:root')['listeners'] == 'ss'
+        assert cache.stats()['hosts']['h:22:root']['firewall'] == 'nftables'
+        time.sleep(0.06)
+        assert cache.get('h:22:root') is None
+
+
+class TestSSHServiceCapabilities:
+    def _client(self, outputs):
+        client = Mock()
+        commands = []
+
+        def exec_side_effect(command, timeout=None):
+            commands.append(command)
+            body = '\n'.join(
+                f'{SSHService._SECTION_MARKER} {name}\n{outputs.get(name, "")}'
+                for name in outputs
+            )
+            stdout = Mock()
+            stdout.read.return_value = body.encode('utf-8')
+            return Mock(), stdout, Mock()
+
+        client.exec_command.side_effect = exec_side_effect
+        return client, commands
+
+    def test_detection_rides_on_first_batch_then_filters_sections(self):
+        service = SSHService()
+        client, commands = self._client({
+            'listeners': 'tcp|0.0.0.0:22',
+            'ufw': '/usr/sbin/ufw',
+            'ufw_status': 'active',
+            'capabilities': detect_output(ufw=1, nft=1, iptables=1, sudo=0),
+        })
+
+        with patch.object(SSHService, '_pool_key_for', return_value='10.0.0.9:22:root'), \
+                patch.object(SSHService, '_capabilities', CapabilityCache()):
+            with patch.object(service, 'get_connection_pooled', return_value=client):
+                first = service.get_firewall_stats('10.0.0.9', 'root', 'secret')
+                second = service.get_firewall_stats('10.0.0.9', 'root', 'secret')
+                known = SSHService._known_capabilities(client)
+
+        assert len(commands) == 2
+        assert DETECT_SCRIPT in commands[0]
+        assert DETECT_SCRIPT not in commands[1]
+        # ufw без sudo: статус и правила не запрашиваются, nft/iptables тоже
+        assert 'ufw status' not in commands[1]
+        assert 'iptables' not in commands[1]
+        assert known['firewall'] == 'ufw'
+        assert first['backend'] == second['backend'] == 'ufw'
+
+    def test_cpu_goes_straight_to_vmstat(self):
+        service = SSHService()
+        client = Mock()
+        capabilities = parse_capabilities(detect_output(proc_stat=0, top=0))
+
+        with patch.object(SSHService, '_known_capabilities', return_value=capabilities), \
+                patch.object(service, '_read_command_output', return_value='90') as read:
+            assert service._get_cpu_used_pct(client) == 10.0
+
+        assert read.call_count == 1
+        assert 'vmstat' in read.call_args[0][1]
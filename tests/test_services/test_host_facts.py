@@ -0,0 +1,153 @@
+from unittest.mock import MagicMock, Mock, patch
+
+from app.services.host_facts import BOOT_ID_CMD, FACT_SECTIONS, HostFactsCache, volatile_stats
+from app.services.ssh_service import SSHService
+
+SECTIONS = {
+    'uptime': 'up 3 days',
+    'os': 'Debian GNU/Linux 12 (bookworm)',
+    'nproc': '2',
+    'kernel': '6.1.0-18-amd64',
+    'loadavg': '0.12 0.08 0.02 1/187 4242',
+    'net': '2: eth0    inet 203.0.113.10/24 brd 203.0.113.255 scope global eth0',
+    'docker_version': 'Docker version 24.0.7, build afdd53b',
+}
+
+
+def test_volatile_stats_drops_fact_fields():
+    stats = {
+        'os': 'Debian', 'net': [], 'uptime': 'up',
+        'cpu': {'cores': 2, 'kernel': '6.1', 'used_pct': 3.0},
+        'docker': {'present': True, 'version': '24', 'running': 2},
+    }
+
+    assert volatile_stats(stats) == {
+        'uptime': 'up', 'cpu': {'used_pct': 3.0}, 'docker': {'running': 2},
+    }
+    assert stats['cpu']['cores'] == 2
+
+
+class TestFactsInStatsBatch:
+    def _client(self, boot_ids):
+        client = Mock()
+        scripts = []
+
+        def exec_side_effect(command, timeout=None):
+            # Отдельные дозамеры CPU (top/vmstat) пакетными скриптами не считаем
+            if SSHService._SECTION_MARKER in command:
+                scripts.append(command)
+            body = []
+            for name, _ in SSHService._stats_section_commands() + [('boot_id', BOOT_ID_CMD)]:
+                if f"{SSHService._SECTION_MARKER} {name}'" not in command:
+                    continue
+                value = boot_ids[min(len(scripts), len(boot_ids)) - 1] if name == 'boot_id' else SECTIONS.get(name, '')
+                body.append(f'{SSHService._SECTION_MARKER} {name}\n{value}')
+            output = '\n'.join(body) + '\n'
+            stdout = MagicMock()
+            stdout.read.return_value = output.encode('utf-8')
+            stdout.__iter__.return_value = iter(output.splitlines(keepends=True))
+            return Mock(), stdout, Mock()
+
+        client.exec_command.side_effect = exec_side_effect
+        return client, scripts
+
+    def _collect(self, client, times, stream=False):
+        service = SSHService()
+        with patch.object(SSHService, '_pool_key_for', return_value='10.0.0.7:22:root'), \
+                patch.object(SSHService, '_facts', HostFactsCache()), \
+                patch.object(SSHService, '_agent_sections', return_value=None), \
+                patch.object(service, '_known_capabilities', return_value=None), \
+                patch.object(service, 'get_connection_pooled', return_value=client):
+            if stream:
+                results = [
+                    list(service.stream_server_stats('10.0.0.7', 'root', 'secret', timeout=10))
+                    for _ in range(times)
+                ]
+            else:
+                results = [service._collect_stats_sections_batched(client, 10) for _ in range(times)]
+            facts = SSHService._facts
+        return results, facts
+
+    def test_facts_are_collected_once_and_merged(self):
+        client, scripts = self._client(['boot-a'])
+
+        (first, second), facts = self._collect(client, 2)
+
+        assert all(f"{SSHService._SECTION_MARKER} {name}'" in scripts[0] for name in FACT_SECTIONS)
+        assert not any(f"{SSHService._SECTION_MARKER} {name}'" in scripts[1] for name in FACT_SECTIONS)
+        assert second == first
+        assert second['kernel'] == '6.1.0-18-amd64'
+        assert 'boot_id' not in second
+
+    def test_boot_id_change_refreshes_facts_in_same_call(self):
+        client, scripts = self._client(['boot-a', 'boot-b', 'boot-b'])
+
+        (first, second), facts = self._collect(client, 2)
+
+        assert len(scripts) == 3
+        assert all(f"{SSHService._SECTION_MARKER} {name}'" in scripts[2] for name in FACT_SECTIONS)
+        assert second['os'] == SECTIONS['os']
+        assert facts.reboots == 1
+        assert facts.get('10.0.0.7:22:root')['boot_id'] == 'boot-b'
+
+    def test_stream_serves_cached_facts_after_boot_id(self):
+        client, scripts = self._client(['boot-a'])
+
+        (first, second), facts = self._collect(client, 2, stream=True)
+
+        assert len(scripts) == 2
+        assert not any(f"{SSHService._SECTION_MARKER} {name}'" in scripts[1] for name in FACT_SECTIONS)
+        assert scripts[1].index("boot_id'") < scripts[1].index("uptime'")
+        sections = [{item['section']: item['data'] for item in run[:-1]} for run in (first, second)]
+        assert sections[1]['os'] == sections[0]['os'] == SECTIONS['os']
+        assert sections[1]['cpu']['kernel'] == '6.1.0-18-amd64'
+        assert second[-1]['facts_id'] == first[-1]['facts_id']
+
+    def test_stream_refreshes_facts_after_reboot(self):
+        client, scripts = self._client(['boot-a', 'boot-b', 'boot-b'])
+
+        (_, second), facts = self._collect(client, 2, stream=True)
+
+        fields = [item.get('section') for item in second[:-1]]
+        assert len(scripts) == 3
+        assert all(f"{SSHService._SECTION_MARKER} {name}'" in scripts[2] for name in FACT_SECTIONS)
+        assert sorted(fields) == sorted(field for field, _ in SSHService._STATS_FIELDS)
+        assert facts.reboots == 1
+        assert facts.get('10.0.0.7:22:root')['boot_id'] == 'boot-b'
+
+    def test_stream_without_boot_id_serves_cached_facts(self):
+        client, scripts = self._client(['boot-a', ''])
+
+        (_, second), facts = self._collect(client, 2, stream=True)
+
+        fields = {item['section']: item['data'] for item in second[:-1]}
+        assert len(scripts) == 2
+        assert sorted(fields) == sorted(field for field, _ in SSHService._STATS_FIELDS)
+        assert fields['os'] == SECTIONS['os']
+        assert fields['cpu']['kernel'] == '6.1.0-18-amd64'
+        assert second[-1]['timed_out'] == []
+        assert facts.get('10.0.0.7:22:root')['boot_id'] == 'boot-a'
+
+    def test_stream_that_never_reports_boot_id_still_sends_every_field(self):
+        client, _ = self._client(['boot-a'])
+        (first,), facts = self._collect(client, 1, stream=True)
+        service = SSHService()
+
+        def without_boot_id(client, commands, deadline):
+            for name, _ in commands:
+                if name not in ('boot_id', 'docker_ps'):
+                    yield name, SECTIONS.get(name, '')
+
+        with patch.object(SSHService, '_pool_key_for', return_value='10.0.0.7:22:root'), \
+                patch.object(SSHService, '_facts', facts), \
+                patch.object(SSHService, '_agent_sections', return_value=None), \
+                patch.object(service, '_known_capabilities', return_value=None), \
+                patch.object(service, '_iter_batch_sections', side_effect=without_boot_id), \
+                patch.object(service, 'get_connection_pooled', return_value=client):
+            second = list(service.stream_server_stats('10.0.0.7', 'root', 'secret', timeout=10))
+
+        fields = {item['section']: item['data'] for item in second[:-1]}
+        assert sorted(fields) == sorted(field for field, _ in SSHService._STATS_FIELDS)
+        assert fields['os'] == SECTIONS['os']
+        assert fields['cpu']['kernel'] == '6.1.0-18-amd64'
+        assert second[-1]['timed_out'] == ['docker']
@@ -0,0 +1,71 @@
+import numpy as np
+
+from app.services.metrics_store import MetricsStore, TierRing, lttb
+
+
+class TestMetricsStore:
+    def test_tier_ring_rolls_up_min_avg_max_and_keeps_latest(self):
+        ring = TierRing(step=60, slots=2)
+        for ts, value in [(0, 10.0), (30, 30.0), (60, 5.0), (120, 7.0), (150, 9.0)]:
+            ring.add(ts, value)
+
+        ts, mn, avg, mx = ring.arrays()
+        assert ts.tolist() == [0, 60, 120]  # последний интервал ещё открыт
+        assert mn.tolist() == [10.0, 5.0, 7.0]
+        assert avg.tolist() == [20.0, 5.0, 8.0]
+        assert mx.tolist() == [30.0, 5.0, 9.0]
+
+        ring.add(180, 1.0)
+        assert ring.arrays()[0].tolist() == [60, 120, 180]
+
+    def test_window_merges_metrics_by_timestamp(self):
+        store = MetricsStore()
+        store.append('10.0.0.1:22', {'cpu': 12.34, 'memory': 50.0}, timestamp=100)
+        store.append('10.0.0.1:22', {'cpu': 20.0, 'memory': 51.0}, timestamp=160)
+        store.append('10.0.0.2:22', {'cpu': 99.0, 'memory': 99.0}, timestamp=160)
+
+        assert store.window('10.0.0.1:22', ['cpu', 'memory']) == [
+            {'timestamp': 100, 'cpu': 12.3, 'memory': 50.0},
+            {'timestamp': 160, 'cpu': 20.0, 'memory': 51.0},
+        ]
+        assert store.window('10.0.0.1:22', ['cpu'], limit=1) == [{'timestamp': 160, 'cpu': 20.0}]
+        assert store.window('10.0.0.1:22', ['cpu'], since=150) == [{'timestamp': 160, 'cpu': 20.0}]
+
+    def test_query_picks_tier_by_range_and_downsamples(self):
+        store = MetricsStore()
+        now = 40 * 86400
+        for ts in range(now - 7 * 86400, now, 30):
+            store.append('host', {'cpu': 50.0 + 40.0 * np.sin(ts / 3600.0)}, timestamp=ts)
+
+        hour = store.query('host', ['cpu'], range_seconds=3600, now=now)
+        week = store.query('host', ['cpu'], range_seconds=7 * 86400, points=200, now=now)
+
+        assert hour['resolution'] == '10s'
+        assert week['resolution'] == '15m'
+        assert len(week['points']) == 200
+        point = week['points'][100]
+        assert point['cpu_min'] <= point['cpu'] <= point['cpu_max']
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[500] = 100.0
+
+        selected = lttb(x, y, 20)
+
+        assert len(selected) == 20
+        assert selected[0] == 0 and selected[-1] == 999
+        assert 500 in selected
+
+    def test_snapshot_and_journal_survive_restart(self, tmp_path):
+        tiers = (('10s', 10, 40), ('1m', 60, 600))
+        store = MetricsStore(str(tmp_path), tiers=tiers)
+        for i in range(20):
+            store.append('10.0.0.1:22', {'cpu': float(i)}, timestamp=1000 + i * 10)
+
+        assert (tmp_path / '10.0.0.1_22.npz').exists()
+        assert len((tmp_path / '10.0.0.1_22.log').read_text().splitlines()) <= 4
+
+        reopened = MetricsStore(str(tmp_path), tiers=tiers)
+        assert reopened.window('10.0.0.1:22', ['cpu']) == store.window('10.0.0.1:22', ['cpu'])
+        assert [p['cpu'] for p in reopened.window('10.0.0.1:22', ['cpu'])] == [15.0, 16.0, 17.0, 18.0, 19.0]
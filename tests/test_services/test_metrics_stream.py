@@ -0,0 +1,60 @@
+import time
+
+from app.services.metrics_stream import MetricsStream
+
+
+def _wait(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestMetricsStream:
+    def test_reconnects_with_backoff_after_failure(self):
+        attempts = []
+        received = []
+
+        def open_lines(stop):
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise OSError('connection refused')
+            yield '{"n": 1}'
+            yield 'garbage'
+            yield '{"n": 2}'
+            stop.wait()
+
+        def on_line(line):
+            if not line.startswith('{'):
+                raise ValueError(line)
+            received.append(line)
+
+        stream = MetricsStream('host', open_lines, on_line, backoff_initial=0.05)
+        stream.start()
+        try:
+            assert _wait(lambda: len(received) == 2)
+            status = stream.status()
+        finally:
+            stream.stop(wait=1)
+
+        assert attempts[1] - attempts[0] >= 0.05
+        assert status['reconnects'] == 1
+        assert status['samples'] == 2  # битая строка пропущена, поток жив
+        assert status['connected'] is True
+        assert status['last_error'] == 'connection refused'
+        assert not stream.running
+
+    def test_stops_itself_when_nobody_reads(self):
+        def open_lines(stop):
+            while not stop.is_set():
+                yield '{}'
+                time.sleep(0.01)
+
+        stream = MetricsStream('host', open_lines, lambda line: None, idle_timeout=0.1)
+        stream.start()
+
+        assert _wait(lambda: not stream.running)
+        assert stream.connected is False
+        assert stream.reconnects == 0
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+
+from app.services.monitoring_hub import MonitoringHub, PendingError, Snapshot
+
+
+def _events(chunks, count):
+    """Первые count событий генератора (без retry и keep-alive)."""
+    events = []
+    for chunk in chunks:
+        if chunk.startswith('event:'):
+            name, data = chunk.strip().split('\n')
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+            if len(events) == count:
+                break
+    return events
+
+
+class TestMonitoringHub:
+    def test_streams_of_one_server_share_collection(self):
+        hub = MonitoringHub()
+        calls = {'network': 0, 'security': 0}
+
+        def collector(name):
+            def collect():
+                calls[name] += 1
+                return {'panel': name}
+            return collect
+
+        panels = {
+            'network': (30, collector('network'), ''),
+            'security': (60, collector('security'), ''),
+        }
+        first = hub.events('srv-1', panels)
+        second = hub.events('srv-1', panels)
+
+        assert _events(first, 2) == [
+            ('network', {'success': True, 'data': {'panel': 'network'}, 'age': 0.0}),
+            ('security', {'success': True, 'data': {'panel': 'security'}, 'age': 0.0}),
+        ]
+        assert [name for name, _ in _events(second, 2)] == ['network', 'security']
+        assert calls == {'network': 1, 'security': 1}
+        assert hub.stats()['active_streams'] == 2
+        assert hub.stats()['shared'] == 2
+
+        first.close()
+        second.close()
+        assert hub.stats()['active_streams'] == 0
+
+    def test_panel_keeps_its_own_cadence_and_reports_errors(self):
+        hub = MonitoringHub(heartbeat=60)
+        calls = []
+
+        def fast():
+            calls.append('fast')
+            return len(calls)
+
+        def broken():
+            calls.append('broken')
+            raise RuntimeError('ssh down')
+
+        stop = threading.Event()
+        stream = hub.events('srv-1', {
+            'fast': (0.05, fast, ''),
+            'slow': (60, broken, ''),
+        }, stop=stop)
+
+        events = _events(stream, 4)
+        stop.set()
+
+        assert [name for name, _ in events] == ['fast', 'slow', 'fast', 'fast']
+        assert events[1][1] == {'success': False, 'error': 'ssh down', 'age': 0.0}
+        assert calls.count('broken') == 1
+
+    def test_params_are_part_of_result_key(self):
+        hub = MonitoringHub()
+        calls = []
+
+        def history(label):
+            def collect():
+                calls.append(label)
+                return label
+            return collect
+
+        hub.collect('srv-1', 'history', history('1h'), 120, params='3600:300')
+        hub.collect('srv-1', 'history', history('7d'), 120, params='604800:300')
+        result = hub.collect('srv-1', 'history', history('1h'), 120, params='3600:300')
+
+        assert calls == ['1h', '7d']
+        assert result['payload']['data'] == '1h'
+
+    def test_stale_results_are_evicted_when_stream_closes(self):
+        hub = MonitoringHub()
+        hub.collect('gone', 'network', lambda: {'panel': 'network'}, max_age=0.05)
+        time.sleep(0.2)
+
+        stream = hub.events('srv-1', {'firewall': (30, lambda: {'panel': 'firewall'}, '')})
+        assert _events(stream, 1)[0][0] == 'firewall'
+        stream.close()
+
+        assert hub.stats()['panels_cached'] == 1
+        assert list(hub._locks) == [('srv-1', 'firewall', '')]
+
+    def test_snapshot_age_is_reported_and_pending_is_retried_soon(self):
+        hub = MonitoringHub()
+        hub.PENDING_RETRY = 0.05
+        state = {'ready': False}
+
+        def read():
+            if not state['ready']:
+                raise PendingError('still collecting')
+            return Snapshot({'panel': 'network'}, 12.0)
+
+        pending = hub.collect('srv-1', 'network', read, max_age=30)
+        state['ready'] = True
+        assert hub.collect('srv-1', 'network', read, max_age=30) is pending
+        time.sleep(0.1)
+        ready = hub.collect('srv-1', 'network', read, max_age=30)
+
+        assert pending['payload'] == {'success': False, 'pending': True, 'error': 'still collecting'}
+        assert ready['payload'] == {'success': True, 'data': {'panel': 'network'}}
+        assert 12.0 <= hub.age(ready) < 13.0
+
+    def test_collect_all_runs_panels_concurrently_with_deadline(self):
+        hub = MonitoringHub()
+        release = threading.Event()
+        running = []
+
+        def slow(name, delay):
+            def collect():
+                running.append(name)
+                time.sleep(delay)
+                return name
+            return collect
+
+        def hung():
+            release.wait(5)
+            return 'late'
+
+        try:
+            started = time.monotonic()
+            result = hub.collect_all('srv-1', {
+                'a': (30, slow('a', 0.2), ''),
+                'b': (30, slow('b', 0.2), ''),
+                'hung': (30, hung, ''),
+            }, timeout=0.5)
+            elapsed = time.monotonic() - started
+        finally:
+            release.set()
+
+        sections = result['sections']
+        assert sections['a']['data'] == 'a' and sections['b']['data'] == 'b'
+        assert sections['a']['elapsed_ms'] >= 200
+        assert sections['hung'] == {'success': False, 'error': 'Timeout after 0.5s', 'elapsed_ms': 500}
+        # a и b шли параллельно, а зависшая панель не держит ответ дольше таймаута
+        assert elapsed < 0.9
+        assert result['slowest_ms'] == 500
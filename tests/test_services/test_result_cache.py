@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from app.services.result_cache import ResultCache, parse_ttls
+
+
+class TestResultCache:
+    def test_hit_within_ttl_and_copy_per_caller(self):
+        cache = ResultCache({'stats': 60})
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {'cpu': 5, 'disks': [1]}
+
+        first = cache.get_or_compute(('h', 'stats', ()), 'stats', compute)
+        first['disks'].append(2)
+        second = cache.get_or_compute(('h', 'stats', ()), 'stats', compute)
+
+        assert len(calls) == 1
+        assert second == {'cpu': 5, 'disks': [1]}
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['coalesced']) == (1, 1, 0)
+        assert stats['collectors']['stats']['hits'] == 1
+
+    def test_expired_or_disabled_collector_computes_again(self):
+        cache = ResultCache({'fast': 0.05, 'off': 0})
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        cache.get_or_compute('a', 'fast', compute)
+        time.sleep(0.08)
+        assert cache.get_or_compute('a', 'fast', compute) == 2
+        cache.get_or_compute('b', 'off', compute)
+        cache.get_or_compute('b', 'off', compute)
+        assert len(calls) == 4
+
+    def test_concurrent_callers_share_one_computation(self):
+        cache = ResultCache({'security': 30})
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return {'failures': 3}
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache.get_or_compute('k', 'security', compute))
+            )
+            for _ in range(4)
+        ]
+        threads[0].start()
+        assert started.wait(2)
+        for thread in threads[1:]:
+            thread.start()
+        while cache.stats()['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+
+        assert len(calls) == 1
+        assert results == [{'failures': 3}] * 4
+        assert cache.stats()['coalesced'] == 3
+
+    def test_errors_reach_waiters_and_are_not_cached(self):
+        cache = ResultCache({'net': 30})
+
+        def broken():
+            raise RuntimeError('ssh down')
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute('k', 'net', broken)
+        cache.get_or_compute('k', 'net', lambda: {'error': 'timeout'}, lambda r: 'error' not in r)
+        assert cache.get_or_compute('k', 'net', lambda: {'rx': 1}) == {'rx': 1}
+        assert cache.stats()['misses'] == 3
+
+    def test_invalidate_and_parse_ttls(self):
+        cache = ResultCache({'net': 30})
+        cache.get_or_compute(('h1', 'net', ()), 'net', lambda: 1)
+        cache.get_or_compute(('h2', 'net', ()), 'net', lambda: 2)
+
+        assert cache.invalidate(lambda key: key[0] == 'h1') == 1
+        assert cache.stats()['entries'] == 1
+        assert parse_ttls('network_stats=5, security_events=60,bad,x=y') == {
+            'network_stats': 5.0, 'security_events': 60.0,
+        }
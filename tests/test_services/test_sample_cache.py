@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from app.services.sample_cache import CounterSampleCache
+
+
+class TestCounterSampleCache:
+    def test_first_sample_has_nothing_to_compare(self):
+        cache = CounterSampleCache()
+
+        assert cache.update('host', 'net', {'rx': 100}, 10.0) is None
+        assert cache.is_fresh('host', 'net')
+        assert not cache.is_fresh('other', 'net')
+
+    def test_deltas_between_consecutive_polls(self):
+        cache = CounterSampleCache()
+        cache.update('host', 'net', {'eth0:rx': 100, 'eth0:tx': 50}, 10.0)
+
+        deltas, elapsed = cache.update('host', 'net', {'eth0:rx': 400, 'eth0:tx': 50, 'wg0:rx': 7}, 12.0)
+
+        assert elapsed == 2.0
+        assert deltas == {'eth0:rx': 300, 'eth0:tx': 0}
+
+    def test_reboot_and_counter_reset(self):
+        cache = CounterSampleCache()
+        cache.update('host', 'cpu', {'total': 1000}, 500.0)
+
+        # uptime пошёл назад — хост перезагрузился
+        assert cache.update('host', 'cpu', {'total': 10}, 3.0) is None
+        # счётчик пошёл назад — в дельты не попадает
+        assert cache.update('host', 'cpu', {'total': 5}, 4.0) is None
+
+    def test_stale_sample_is_ignored(self):
+        cache = CounterSampleCache(max_age=60)
+        with patch('app.services.sample_cache.time.monotonic', return_value=1000.0):
+            cache.update('host', 'cpu', {'total': 1000}, 500.0)
+        with patch('app.services.sample_cache.time.monotonic', return_value=1100.0):
+            assert not cache.is_fresh('host', 'cpu')
+            assert cache.update('host', 'cpu', {'total': 2000}, 600.0) is None
+
+    def test_same_snapshot_returns_previous_result(self):
+        """Тот же снимок (общий документ агента) повторно даёт ту же дельту."""
+        cache = CounterSampleCache()
+        cache.update('host', 'cpu', {'total': 1000, 'idle': 900}, 10.0)
+        first = cache.update('host', 'cpu', {'total': 1100, 'idle': 950}, 12.0)
+
+        assert cache.update('host', 'cpu', {'total': 1100, 'idle': 950}, 12.0) == first
+        deltas, elapsed = cache.update('host', 'cpu', {'total': 1300, 'idle': 1000}, 14.0)
+        assert deltas == {'total': 200, 'idle': 50}
+
+    def test_updates_close_together_keep_baseline_and_last_rate(self):
+        cache = CounterSampleCache()
+        cache.update('host', 'cpu', {'total': 1000, 'idle': 900}, 100.0)
+        first = cache.update('host', 'cpu', {'total': 1400, 'idle': 1200}, 104.0)
+
+        # Второй потребитель опросил хост через 20 мс: ни мусорной дельты, ни сбитой базы
+        assert cache.update('host', 'cpu', {'total': 1402, 'idle': 1200}, 104.02) == first
+        deltas, elapsed = cache.update('host', 'cpu', {'total': 1800, 'idle': 1500}, 108.0)
+
+        assert first == ({'total': 400, 'idle': 300}, 4.0)
+        assert (deltas, elapsed) == ({'total': 400, 'idle': 300}, 4.0)
+
+    def test_first_sample_pair_with_short_pause_is_computed(self):
+        cache = CounterSampleCache()
+        cache.update('host', 'cpu', {'total': 1000}, 100.0)
+
+        assert cache.update('host', 'cpu', {'total': 1050}, 100.25) == ({'total': 50}, 0.25)
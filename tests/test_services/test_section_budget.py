@@ -0,0 +1,236 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from app.services import monitoring_agent
+from app.services.section_budget import Deadline, TIMEOUT_MARKER, split_timed_out
+from app.services.shell_session import ShellSessionError
+from app.services.ssh_service import SSHService
+
+
+class LocalStdout:
+    """stdout канала: read() целиком или построчно, как paramiko.ChannelFile.
+
+    channel.close() завершает команду со всеми потомками: чтение получает EOF.
+    """
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.channel = Mock()
+        self.channel.recv_exit_status.side_effect = proc.wait
+        self.channel.close.side_effect = self._kill
+
+    def _kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def read(self):
+        return self.proc.stdout.read()
+
+    def __iter__(self):
+        return iter(self.proc.stdout)
+
+
+class LocalExecClient:
+    """SSH-клиент, который выполняет команды локальным sh (как sshd при exec)."""
+
+    def __init__(self):
+        self.commands = []
+
+    def exec_command(self, command, timeout=None):
+        self.commands.append(command)
+        proc = subprocess.Popen(
+            command, shell=True, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        return Mock(), LocalStdout(proc), Mock(read=Mock(return_value=b''))
+
+
+STATS_SECTIONS = [
+    ("uptime", "echo up 2 days"),
+    ("nproc", "echo 4"),
+    ("kernel", "echo 6.1.0"),
+    ("cpu", None),
+    ("loadavg", "echo 0.50 0.40 0.30 1/100 4242"),
+    # df на отвалившемся NFS-монтировании
+    ("disks", "printf '/dev/vda1 20G 7G 12G 38%% /'; sleep 30"),
+    ("docker_ps", "sleep 30"),
+]
+
+
+def test_budgets_split_remaining_time_by_weight():
+    deadline = Deadline(12)
+
+    budgets = deadline.budgets(["uptime", "docker_ps", "loadavg"])
+
+    assert budgets == {"uptime": 1, "docker_ps": 5, "loadavg": 1}
+    assert deadline.budgets(["uptime", "docker_ps"], parallel=True) == {"uptime": 9, "docker_ps": 9}
+    assert deadline.script_total() == 9
+    assert Deadline(0.5).budgets(["uptime"]) == {"uptime": 1}
+
+
+def test_split_timed_out_discards_partial_output():
+    assert split_timed_out(f"partial\n{TIMEOUT_MARKER}") == (None, True)
+    assert split_timed_out("42") == ("42", False)
+    assert split_timed_out(None) == (None, False)
+
+
+def test_batch_script_returns_sections_that_fit_their_budget():
+    service = SSHService()
+    client = LocalExecClient()
+    deadline = Deadline(4)
+    commands = [("fast", "echo ok"), ("hung", "printf partial; sleep 30"), ("after", "echo after")]
+
+    started = time.monotonic()
+    sections = service._run_sections(client, commands, deadline=deadline)
+
+    assert time.monotonic() - started < 4
+    assert sections == {"fast": "ok", "hung": None, "after": "after"}
+    assert deadline.timed_out == ["hung"]
+
+
+
+class NoTimeoutExecClient(LocalExecClient):
+    """Хост без рабочей утилиты timeout: разделы выполняются без ограничения."""
+
+    def exec_command(self, command, timeout=None):
+        return super().exec_command("timeout() { return 127; }\n" + command, timeout)
+
+
+def test_answer_is_not_awaited_past_the_deadline_without_timeout_utility():
+    service = SSHService()
+    deadline = Deadline(3)
+    commands = [("fast", "echo ok"), ("hung", "printf partial; sleep 30"), ("after", "echo after")]
+
+    started = time.monotonic()
+    sections = service._run_sections(NoTimeoutExecClient(), commands, deadline=deadline)
+
+    assert time.monotonic() - started < 3.5
+    assert sections == {"fast": "ok", "hung": None, "after": None}
+    assert deadline.timed_out == ["hung", "after"]
+
+
+def test_hung_shell_session_is_not_rerun_through_exec():
+    class HungSession:
+        lock = threading.Lock()
+        close = Mock()
+
+        def run_many(self, commands, timeout):
+            time.sleep(timeout)
+            raise ShellSessionError("timed out")
+
+    service = SSHService()
+    client = Mock()
+    deadline = Deadline(2)
+    with patch.object(SSHService, '_SHELL_SESSIONS_ENABLED', True), \
+            patch.object(SSHService, '_shell_session', return_value=HungSession()):
+        started = time.monotonic()
+        sections = service._run_sections(client, [("uptime", "uptime")], deadline=deadline)
+
+    assert time.monotonic() - started < 2.5
+    assert sections == {"uptime": None}
+    assert deadline.timed_out == ["uptime"]
+    client.exec_command.assert_not_called()
+
+
+class TestServerStatsDeadline:
+    def _stats(self, batched):
+        service = SSHService()
+        client = LocalExecClient()
+        with patch.object(SSHService, '_STATS_SECTIONS', STATS_SECTIONS), \
+                patch.object(service, 'get_connection_pooled', return_value=client):
+            started = time.monotonic()
+            stats = service.get_server_stats('127.0.0.1', 'root', 'secret', timeout=4, batched=batched)
+        return stats, time.monotonic() - started
+
+    def test_hung_sections_are_marked_and_rest_returned(self):
+        stats, elapsed = self._stats(batched=True)
+
+        assert elapsed < 4
+        assert stats['uptime'] == 'up 2 days'
+        assert stats['load'] == {'1m': '0.50', '5m': '0.40', '15m': '0.30'}
+        assert stats['disks'] == []
+        assert stats['timed_out'] == ['disks', 'docker']
+
+    def test_sequential_mode_honours_the_same_deadline(self):
+        stats, elapsed = self._stats(batched=False)
+
+        assert elapsed < 4
+        assert stats['uptime'] == 'up 2 days'
+        assert set(stats['timed_out']) == {'disks', 'docker'}
+
+    def test_partial_stats_are_not_cached(self):
+        SSHService._results.clear()
+        SSHService.configure_result_cache(enabled=True)
+        try:
+            first, _ = self._stats(batched=True)
+            second, elapsed = self._stats(batched=True)
+        finally:
+            SSHService.configure_result_cache(enabled=False)
+            SSHService._results.clear()
+
+        assert first['timed_out'] and second['timed_out']
+        assert elapsed > 0.5
+
+    def test_hung_agent_gets_its_share_and_sections_fall_back(self):
+        service = SSHService()
+        client = LocalExecClient()
+        key = 'agent.example:22:root'
+        SSHService._client_keys[id(client)] = key
+        SSHService.set_monitoring_agent(key, {'version': 1, 'build': 'test'})
+        try:
+            with patch.object(SSHService, '_STATS_SECTIONS', STATS_SECTIONS), \
+                    patch.object(monitoring_agent, 'AGENT_PATH', 'sleep 30'), \
+                    patch.object(service, 'get_connection_pooled', return_value=client):
+                started = time.monotonic()
+                stats = service.get_server_stats('agent.example', 'root', 'secret', timeout=6)
+                elapsed = time.monotonic() - started
+            still_registered = key in SSHService._agent_hosts
+        finally:
+            SSHService.set_monitoring_agent(key, None)
+            SSHService._client_keys.pop(id(client), None)
+            SSHService._capabilities.invalidate(key)
+
+        assert elapsed < 6
+        assert client.commands[0].endswith('sleep 30')
+        assert stats['uptime'] == 'up 2 days'
+        assert set(stats['timed_out']) >= {'disks', 'docker'}
+        assert still_registered
+
+
+class TestServerStatsStream:
+    def test_fields_arrive_as_their_sections_finish(self):
+        service = SSHService()
+        client = LocalExecClient()
+        arrivals = []
+        with patch.object(SSHService, '_STATS_SECTIONS', STATS_SECTIONS), \
+                patch.object(service, 'get_connection_pooled', return_value=client):
+            started = time.monotonic()
+            for item in service.stream_server_stats('127.0.0.1', 'root', 'secret', timeout=4):
+                arrivals.append((item.get('section'), time.monotonic() - started, item))
+
+        fields = [name for name, _, _ in arrivals[:-1]]
+        at = {name: elapsed for name, elapsed, _ in arrivals}
+        data = {name: item.get('data') for name, _, item in arrivals}
+        done = arrivals[-1][2]
+
+        assert sorted(fields) == sorted(field for field, _ in SSHService._STATS_FIELDS)
+        assert len(client.commands) == 1
+        assert data['uptime'] == 'up 2 days'
+        assert data['cpu']['cores'] == 4
+        assert at['load'] < 0.9 <= at['disks'] <= at['docker']
+        assert done['done'] is True
+        assert done['timed_out'] == ['disks', 'docker']
+        assert done['elapsed_ms'] < 4000
+
+
+def test_service_sections_do_not_become_timed_out_fields():
+    deadline = Deadline(4)
+    deadline.mark("capabilities", "boot_id", "listeners", "free", "disks")
+
+    assert SSHService._timed_out_fields(deadline) == ["listening_ports", "mem", "swap", "disks"]
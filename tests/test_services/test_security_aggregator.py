@@ -0,0 +1,27 @@
+from app.services.security_aggregator import SecurityEventAggregator
+
+
+class TestSecurityEventAggregator:
+    def test_old_buckets_leave_the_window(self):
+        agg = SecurityEventAggregator(window=3600, bucket_size=60)
+        agg.ingest('host', {}, {'auth': 'c1'}, failures=[(1000.0, '10.0.0.1')], errors=[1000.0], now=1000.0)
+        agg.ingest('host', {'auth': 'c1'}, {'auth': 'c2'}, failures=[(4000.0, '10.0.0.2')], errors=[], now=4000.0)
+
+        assert agg.summary('host', now=4000.0)['ssh_failures_24h'] == 2
+        summary = agg.summary('host', now=4700.0)
+        assert summary == {
+            'ssh_failures_24h': 1,
+            'top_failed_ips': [{'ip': '10.0.0.2', 'count': 1}],
+            'error_events_24h': 0,
+        }
+
+    def test_stale_cursor_batch_is_not_counted_twice(self):
+        """Параллельный опрос с тем же курсором не удваивает счётчики."""
+        agg = SecurityEventAggregator()
+        agg.ingest('host', {}, {'auth': 'c1'}, failures=[], errors=[], now=100.0)
+
+        assert agg.ingest('host', {'auth': 'c1'}, {'auth': 'c2'}, failures=[(90.0, 'x')], errors=[], now=100.0)
+        assert not agg.ingest('host', {'auth': 'c1'}, {'auth': 'c2'}, failures=[(90.0, 'x')], errors=[], now=100.0)
+        assert agg.summary('host', now=100.0)['ssh_failures_24h'] == 1
+        assert agg.cursors('host') == {'auth': 'c2'}
+        assert agg.summary('other', now=100.0) is None
@@ -0,0 +1,179 @@
+import os
+import socket
+import subprocess
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.services.shell_session import ShellSession, ShellSessionError
+from app.services.ssh_service import SSHService
+
+SHELL_ENV = dict(os.environ, SHELL='/bin/sh', LC_ALL='C')
+
+
+class LocalShellChannel:
+    """Канал paramiko поверх локального процесса: stdout/stderr читают фоновые потоки."""
+
+    def __init__(self):
+        self.closed = False
+        self.timeout = None
+        self.proc = None
+        self.buffers = {'stdout': b'', 'stderr': b''}
+        self.eof = {'stdout': False, 'stderr': False}
+        self.cond = threading.Condition()
+
+    def exec_command(self, command):
+        self.proc = subprocess.Popen(
+            command, shell=True, env=SHELL_ENV,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        for stream, pipe in (('stdout', self.proc.stdout), ('stderr', self.proc.stderr)):
+            threading.Thread(target=self._pump, args=(stream, pipe), daemon=True).start()
+
+    def _pump(self, stream, pipe):
+        while True:
+            data = os.read(pipe.fileno(), 4096)
+            with self.cond:
+                if not data:
+                    self.eof[stream] = True
+                else:
+                    self.buffers[stream] += data
+                self.cond.notify_all()
+            if not data:
+                return
+
+    def _read(self, stream, size):
+        with self.cond:
+            ready = self.cond.wait_for(
+                lambda: self.buffers[stream] or self.eof[stream], timeout=self.timeout
+            )
+            if not ready:
+                raise socket.timeout()
+            data, self.buffers[stream] = self.buffers[stream][:size], self.buffers[stream][size:]
+            return data
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def sendall(self, data):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def recv(self, size):
+        return self._read('stdout', size)
+
+    def recv_stderr(self, size):
+        return self._read('stderr', size)
+
+    def recv_stderr_ready(self):
+        with self.cond:
+            return bool(self.buffers['stderr'])
+
+    def exit_status_ready(self):
+        return self.proc.poll() is not None
+
+    def close(self):
+        self.closed = True
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+def run_exec(command):
+    """Эталон: то, что вернул бы exec-канал (sshd запускает `$SHELL -c`)."""
+    proc = subprocess.run(
+        command, shell=True, env=SHELL_ENV, stdin=subprocess.DEVNULL, capture_output=True
+    )
+    return {
+        'stdout': proc.stdout.decode('utf-8'),
+        'stderr': proc.stderr.decode('utf-8'),
+        'exit_code': proc.returncode,
+    }
+
+
+PARITY_COMMANDS = [
+    'echo hello',
+    "printf 'no trailing newline'",
+    "printf ''",
+    'echo out; echo err >&2',
+    'exit 3',
+    'false',
+    'cd /tmp && pwd',
+    'pwd',
+    'export VSM_PARITY=1; echo ${VSM_PARITY}',
+    'echo ${VSM_PARITY:-unset}',
+    'if then',
+    'cat',
+    "echo '__VSM_SHELL_END__fake 0'",
+    'for i in 1 2 3; do\n  echo "line $i"\ndone',
+    "echo 'it'\"'\"'s quoted'",
+    'command -v sh >/dev/null && echo found',
+    'seq 1 20000',
+]
+
+
+@pytest.fixture
+def session():
+    channel = LocalShellChannel()
+    session = ShellSession(channel)
+    yield session
+    session.close()
+
+
+class TestShellSessionParity:
+    @pytest.mark.parametrize('command', PARITY_COMMANDS)
+    def test_command_matches_exec_backend(self, session, command):
+        assert session.run(command, timeout=10) == run_exec(command)
+
+    def test_batch_matches_exec_backend_and_keeps_session_alive(self, session):
+        results = session.run_many(PARITY_COMMANDS, timeout=20)
+
+        assert results == [run_exec(command) for command in PARITY_COMMANDS]
+        assert session.alive
+        assert session.run('echo still here')['stdout'] == 'still here\n'
+
+    def test_timeout_raises_session_error(self, session):
+        with pytest.raises(ShellSessionError):
+            session.run('sleep 5', timeout=0.3)
+
+
+class TestSSHServiceShellBackend:
+    @pytest.fixture
+    def shell_enabled(self):
+        SSHService.configure_shell_sessions(True)
+        with patch.object(SSHService, '_pool_key_for', return_value='10.0.0.1:22:root'):
+            yield
+        SSHService.configure_shell_sessions(False)
+
+    def test_probes_run_in_one_session_without_exec(self, shell_enabled):
+        service = SSHService()
+        client = Mock()
+        client.get_transport.return_value.open_session.side_effect = lambda timeout=None: LocalShellChannel()
+        commands = [('hello', 'echo hello'), ('missing', 'command -v vsm-no-such-tool'), ('code', 'exit 4')]
+
+        results = service._run_pipelined(client, commands, timeout=10)
+        output = service._read_command_output(client, 'echo again', timeout=10)
+
+        assert results['hello']['stdout'] == 'hello'
+        assert results['missing']['stdout'] == ''
+        assert results['missing']['exit_code'] != 0
+        assert results['code']['exit_code'] == 4
+        assert output == 'again'
+        client.exec_command.assert_not_called()
+        assert client.get_transport.return_value.open_session.call_count == 1
+
+    def test_broken_session_falls_back_to_exec(self, shell_enabled):
+        service = SSHService()
+        client = Mock()
+        channel = LocalShellChannel()
+        client.get_transport.return_value.open_session.return_value = channel
+        stdout = Mock()
+        stdout.read.return_value = b'from exec\n'
+        client.exec_command.return_value = (Mock(), stdout, Mock())
+
+        SSHService._shell_session(client)
+        channel.sendall = Mock(side_effect=OSError('Socket is closed'))
+
+        assert service._read_command_output(client, 'echo hello', timeout=5) == 'from exec'
+        assert '10.0.0.1:22:root' not in SSHService._shell_sessions
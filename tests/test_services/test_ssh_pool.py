@@ -0,0 +1,343 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.services.ssh_service import SSHService
+
+
+class FakeSSHClient:
+    """Фейковый paramiko.SSHClient: connect к хосту из slow_hosts «висит» delay секунд."""
+
+    slow_hosts = {}
+    connects = []
+
+    def __init__(self):
+        self.transport = Mock()
+        self.transport.is_active.return_value = True
+        self.closed = False
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, **kwargs):
+        FakeSSHClient.connects.append(hostname)
+        time.sleep(FakeSSHClient.slow_hosts.get(hostname, 0))
+
+    def get_transport(self):
+        return self.transport
+
+    def exec_command(self, command, timeout=None):
+        stdout = Mock()
+        stdout.read.return_value = b''
+        return Mock(), stdout, Mock()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pool():
+    """Чистый пул подключений и фейковый SSHClient на время теста."""
+    saved_pool = dict(SSHService._connection_pool)
+    saved_locks = dict(SSHService._key_locks)
+    saved_slots = dict(SSHService._session_slots)
+    saved_meta = dict(SSHService._pool_meta)
+    saved_client_keys = dict(SSHService._client_keys)
+    saved_limits = (SSHService._POOL_MAX_SIZE, SSHService._POOL_IDLE_TTL)
+    SSHService._connection_pool.clear()
+    SSHService._key_locks.clear()
+    SSHService._session_slots.clear()
+    SSHService._pool_meta.clear()
+    SSHService._client_keys.clear()
+    FakeSSHClient.slow_hosts = {}
+    FakeSSHClient.connects = []
+    with patch('app.services.ssh_service.paramiko.SSHClient', FakeSSHClient):
+        yield FakeSSHClient
+    SSHService._connection_pool.clear()
+    SSHService._connection_pool.update(saved_pool)
+    SSHService._key_locks.clear()
+    SSHService._key_locks.update(saved_locks)
+    SSHService._session_slots.clear()
+    SSHService._session_slots.update(saved_slots)
+    SSHService._pool_meta.clear()
+    SSHService._pool_meta.update(saved_meta)
+    SSHService._client_keys.clear()
+    SSHService._client_keys.update(saved_client_keys)
+    SSHService._POOL_MAX_SIZE, SSHService._POOL_IDLE_TTL = saved_limits
+
+
+class TestConnectionPool:
+    def test_slow_host_does_not_block_other_hosts(self, fake_pool):
+        """Handshake к медленному хосту не держит подключения к остальным серверам."""
+        fake_pool.slow_hosts = {'slow.example': 1.0}
+
+        slow_thread = threading.Thread(
+            target=SSHService.get_connection_pooled,
+            args=('slow.example', 22, 'root', 'secret'),
+        )
+        slow_thread.start()
+        time.sleep(0.1)  # медленный хост уже внутри connect()
+
+        started = time.monotonic()
+        conn = SSHService.get_connection_pooled('fast.example', 22, 'root', 'secret')
+        fast_elapsed = time.monotonic() - started
+
+        slow_thread.join()
+
+        assert conn is SSHService._connection_pool['fast.example:22:root']
+        assert fast_elapsed < 0.5
+        assert 'slow.example:22:root' in SSHService._connection_pool
+
+    def test_concurrent_requests_for_same_host_connect_once(self, fake_pool):
+        """Параллельные запросы к одному хосту ждут один handshake и делят подключение."""
+        fake_pool.slow_hosts = {'slow.example': 0.3}
+        results = []
+
+        def worker():
+            results.append(SSHService.get_connection_pooled('slow.example', 22, 'root', 'secret'))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert fake_pool.connects == ['slow.example']
+        assert len({id(conn) for conn in results}) == 1
+
+    def test_dead_connection_is_replaced(self, fake_pool):
+        first = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+        first.transport.is_active.return_value = False
+
+        second = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+
+        assert second is not first
+        assert SSHService._connection_pool['host.example:22:root'] is second
+        assert first.closed
+
+    def test_fresh_connection_is_reused_without_probe(self, fake_pool):
+        """Недавно использованное подключение отдаётся без exec-проверки."""
+        first = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+        first.exec_command = Mock(side_effect=AssertionError('no probe expected'))
+
+        assert SSHService.get_connection_pooled('host.example', 22, 'root', 'secret') is first
+        first.transport.set_keepalive.assert_called_once_with(SSHService._KEEPALIVE_INTERVAL)
+
+    def test_idle_connection_is_probed_and_probe_channel_closed(self, fake_pool):
+        first = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+        channel = first.transport.open_session.return_value
+        channel.status_event.wait.return_value = True
+        channel.recv_exit_status.return_value = 0
+        SSHService._pool_meta['host.example:22:root']['last_used'] -= SSHService._IDLE_PROBE_AFTER + 1
+
+        assert SSHService.get_connection_pooled('host.example', 22, 'root', 'secret') is first
+        channel.exec_command.assert_called_once_with('true')
+        channel.recv_exit_status.assert_called_once_with()
+        channel.close.assert_called_once_with()
+
+    def test_failed_probe_closes_the_dead_client(self, fake_pool):
+        first = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+        channel = first.transport.open_session.return_value
+        channel.status_event.wait.return_value = False  # код выхода так и не пришёл
+        SSHService._pool_meta['host.example:22:root']['last_used'] -= SSHService._IDLE_PROBE_AFTER + 1
+
+        second = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+
+        assert second is not first
+        assert first.closed
+        channel.close.assert_called_once_with()
+
+    def test_broken_channel_is_retried_on_real_command(self, fake_pool):
+        """Если канал не открылся, клиент переподключается и команда повторяется."""
+        from paramiko.ssh_exception import SSHException
+
+        client = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+        stdout = Mock()
+        stdout.read.return_value = b'up 5 days\n'
+        calls = []
+
+        def exec_side_effect(command, timeout=None):
+            calls.append(command)
+            if len(calls) == 1:
+                client.transport.is_active.return_value = False
+                raise SSHException('SSH session not active')
+            return Mock(), stdout, Mock()
+
+        client.exec_command = Mock(side_effect=exec_side_effect)
+
+        output = SSHService()._read_command_output(client, 'uptime -p', timeout=5)
+
+        assert output == 'up 5 days'
+        assert calls == ['uptime -p', 'uptime -p']
+        assert fake_pool.connects == ['host.example', 'host.example']
+
+    def test_pool_evicts_least_recently_used_beyond_max_size(self, fake_pool):
+        SSHService.configure_pool(max_size=2)
+        first = SSHService.get_connection_pooled('a.example', 22, 'root', 'secret')
+        SSHService.get_connection_pooled('b.example', 22, 'root', 'secret')
+        SSHService.get_connection_pooled('a.example', 22, 'root', 'secret')  # a свежее b
+
+        SSHService.get_connection_pooled('c.example', 22, 'root', 'secret')
+
+        assert list(SSHService._connection_pool) == ['a.example:22:root', 'c.example:22:root']
+        assert SSHService._connection_pool['a.example:22:root'] is first
+        assert not first.closed
+
+    def test_idle_connections_are_reaped(self, fake_pool):
+        SSHService.configure_pool(idle_ttl=60)
+        idle = SSHService.get_connection_pooled('idle.example', 22, 'root', 'secret')
+        SSHService.get_connection_pooled('busy.example', 22, 'root', 'secret')
+        SSHService._pool_meta['idle.example:22:root']['last_used'] -= 61
+
+        assert SSHService.reap_idle_connections() == 1
+        assert idle.closed
+        assert list(SSHService._connection_pool) == ['busy.example:22:root']
+        assert id(idle) not in SSHService._client_keys
+
+    def test_removed_connections_drop_their_key_locks(self, fake_pool):
+        SSHService.configure_pool(max_size=1, idle_ttl=60)
+        SSHService.get_connection_pooled('a.example', 22, 'root', 'secret')
+        SSHService.get_connection_pooled('b.example', 22, 'root', 'secret')  # a вытеснено
+        assert list(SSHService._key_locks) == ['b.example:22:root']
+
+        SSHService._pool_meta['b.example:22:root']['last_used'] -= 61
+        assert SSHService.reap_idle_connections() == 1
+        assert SSHService._key_locks == {}
+
+    def test_held_key_lock_is_kept(self, fake_pool):
+        lock = SSHService._get_key_lock('busy.example:22:root')
+        with lock:
+            with SSHService._pool_lock:
+                SSHService._forget_key_state_locked('busy.example:22:root')
+            assert SSHService._key_locks['busy.example:22:root'] is lock
+
+    def test_removed_connections_drop_idle_session_slots(self, fake_pool):
+        idle = SSHService.get_connection_pooled('idle.example', 22, 'root', 'secret')
+        busy = SSHService.get_connection_pooled('busy.example', 22, 'root', 'secret')
+        SSHService._session_slot(idle)
+        busy_slot = SSHService._session_slot(busy)
+
+        with busy_slot:  # команда _run_pipelined ещё идёт
+            SSHService.close_pooled_connection('idle.example', 22, 'root')
+            SSHService.close_pooled_connection('busy.example', 22, 'root')
+            assert SSHService._session_slots == {'busy.example:22:root': busy_slot}
+
+        SSHService.reap_idle_connections()
+        assert SSHService._session_slots == {}
+
+    def test_failed_connect_leaves_no_key_lock(self, fake_pool):
+        with patch.object(fake_pool, 'connect', side_effect=OSError('unreachable')):
+            with pytest.raises(OSError):
+                SSHService.get_connection_pooled('down.example', 22, 'root', 'secret')
+
+        assert SSHService._key_locks == {}
+
+    def test_close_pooled_connection_drops_client_and_lock(self, fake_pool):
+        conn = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+
+        assert SSHService.close_pooled_connection('host.example', 22, 'root') is True
+        assert conn.closed
+        assert SSHService._connection_pool == {}
+        assert SSHService._key_locks == {}
+        assert SSHService.close_pooled_connection('host.example', 22, 'root') is False
+
+    def test_pool_stats_counts_commands_and_bytes(self, fake_pool):
+        client = SSHService.get_connection_pooled('host.example', 22, 'root', 'secret')
+        stdout = Mock()
+        stdout.read.return_value = b'up 5 days\n'
+        client.exec_command = Mock(return_value=(Mock(), stdout, Mock()))
+
+        SSHService()._read_command_output(client, 'uptime -p', timeout=5)
+        stats = SSHService.pool_stats()
+
+        assert stats['size'] == 1
+        conn = stats['connections'][0]
+        assert conn['key'] == 'host.example:22:root'
+        assert conn['alive'] is True
+        assert conn['commands'] == 1
+        assert conn['bytes_out'] == len('uptime -p')
+        assert conn['bytes_in'] == len(b'up 5 days\n')
+
+
+class SlowChannelClient:
+    """Клиент, у которого каждый exec_command отвечает через delay секунд."""
+
+    def __init__(self, delay, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def exec_command(self, command, timeout=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if command in self.failing:
+                raise OSError('channel closed')
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        stdout = Mock()
+        stdout.read.return_value = f'{command} out\n'.encode('utf-8')
+        stdout.channel.recv_exit_status.return_value = 0 if command != 'false' else 1
+        return Mock(), stdout, Mock(read=Mock(return_value=b''))
+
+
+class TestPipelinedCommands:
+    def test_independent_commands_share_one_round_trip(self):
+        service = SSHService()
+        client = SlowChannelClient(delay=0.2)
+        commands = [(f'probe{i}', f'cmd{i}') for i in range(5)] + [('fails', 'false')]
+
+        started = time.monotonic()
+        results = service._run_pipelined(client, commands)
+
+        assert time.monotonic() - started < 0.6
+        assert list(results) == [name for name, _ in commands]
+        assert results['probe3'] == {'stdout': 'cmd3 out', 'stderr': '', 'exit_code': 0}
+        assert results['fails']['exit_code'] == 1
+
+    def test_channels_are_capped_by_max_sessions(self):
+        service = SSHService()
+        client = SlowChannelClient(delay=0.05)
+
+        with patch.object(SSHService, '_MAX_SESSIONS', 2):
+            results = service._run_pipelined(client, [(str(i), f'cmd{i}') for i in range(6)])
+
+        assert len(results) == 6
+        assert client.max_in_flight == 2
+
+    def test_failed_command_raises_or_is_reported(self):
+        service = SSHService()
+        client = SlowChannelClient(delay=0.0, failing={'broken'})
+        commands = [('ok', 'true'), ('bad', 'broken')]
+
+        with pytest.raises(OSError):
+            service._run_pipelined(client, commands)
+
+        results = service._run_pipelined(client, commands, raise_errors=False)
+        assert results['ok']['stdout'] == 'true out'
+        assert results['bad']['stdout'] is None
+        assert results['bad']['error'] == 'channel closed'
+
+    def test_pipelines_share_one_long_lived_executor(self):
+        service = SSHService()
+        client = SlowChannelClient(delay=0.0)
+
+        service._run_pipelined(client, [('a', 'true')])
+        executor = SSHService._pipe_executor
+        service._run_pipelined(client, [('b', 'true'), ('c', 'true')])
+        assert SSHService._pipe_executor is executor
+
+        try:
+            SSHService.configure_pool(max_sessions=3)
+            service._run_pipelined(client, [('d', 'true')])
+            assert SSHService._pipe_executor is not executor
+            assert SSHService._pipe_executor._max_workers == 3 * SSHService._PIPE_HOSTS
+        finally:
+            SSHService.configure_pool(max_sessions=8)
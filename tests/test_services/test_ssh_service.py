@@ -1,3 +1,4 @@
+import shlex
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from app.services.ssh_service import SSHService
@@ -290,12 +291,14 @@ class TestSSHService:
             stdout = Mock()
             stderr = Mock()
             stdout.read.return_value = output.encode('utf-8')
+            stdout.channel.recv_exit_status.return_value = 0
+            stderr.read.return_value = b''
             return stdin, stdout, stderr
 
         # Матчим по подстроке, а не по точной команде: код детекта утилит уже
         # переезжал с `which` на `command -v` с явным PATH, и точное сравнение
         # молча превращало тест в проверку ветки «утилита не установлена».
-        def exec_side_effect(command):
+        def exec_side_effect(command, timeout=None):
             if 'ufw status' in command:
                 return make_result('active\n')
             if 'systemctl is-active vnstat' in command:
@@ -328,6 +331,34 @@ class TestSSHService:
         assert ufw_tool['warning'] == '⚠️ UFW включен! Убедитесь что SSH-порт 22542 разрешен!'
         assert ufw_tool['fix_cmd'] == 'sudo ufw allow 22542/tcp && sudo ufw status numbered'
 
+    def test_check_required_tools_is_not_cached(self):
+        """Проверка после установки утилит должна видеть новое состояние хоста."""
+        service = SSHService()
+        client = Mock()
+        installed = {'jq': False}
+
+        def exec_side_effect(command, timeout=None):
+            stdout = Mock()
+            found = 'command -v jq ' in command and installed['jq']
+            stdout.read.return_value = b'/usr/bin/jq\n' if found else b''
+            stdout.channel.recv_exit_status.return_value = 0
+            return Mock(), stdout, Mock(read=Mock(return_value=b''))
+
+        client.exec_command.side_effect = exec_side_effect
+        SSHService._results.clear()
+        SSHService.configure_result_cache(enabled=True)
+        try:
+            with patch.object(service, 'get_connection_pooled', return_value=client):
+                before = service.check_required_tools(ip='10.0.0.1', user='root', password='secret')
+                installed['jq'] = True
+                after = service.check_required_tools(ip='10.0.0.1', user='root', password='secret')
+        finally:
+            SSHService.configure_result_cache(enabled=False)
+            SSHService._results.clear()
+
+        assert before['tools']['jq']['installed'] is False
+        assert after['tools']['jq']['installed'] is True
+
     def test_parse_cpu_used_pct_handles_decimal_comma(self):
         """Парсер CPU должен корректно работать с локалями, где дроби идут через запятую."""
         service = SSHService()
@@ -340,9 +371,79 @@ class TestSSHService:
         """При наличии /proc/stat используем его как основной источник CPU."""
         service = SSHService()
         client = Mock()
+        first_sample = (
+            "100.00 180.00\ncpu  100 0 100 800 0 0 0 0 0 0\n"
+            "100.25 180.40\ncpu  102 0 102 841 0 0 0 0 0 0"
+        )
+
+        with patch.object(service, '_read_command_output', side_effect=[first_sample]) as read:
+            assert service._get_cpu_used_pct(client) == 8.9
+        assert read.call_args[0][1] == SSHService._CPU_FIRST_SAMPLE_CMD
+
+    def test_get_cpu_used_pct_reuses_previous_poll_without_sleep(self):
+        """Повторный опрос — одно чтение /proc/stat без паузы, дельта к прошлому опросу."""
+        service = SSHService()
+        client = Mock()
+        first_sample = (
+            "100.00 180.00\ncpu  100 0 100 800 0 0 0 0 0 0\n"
+            "100.25 180.40\ncpu  102 0 102 841 0 0 0 0 0 0"
+        )
+        next_poll = "110.25 190.00\ncpu  402 0 202 1441 0 0 0 0 0 0"
 
-        with patch.object(service, '_read_command_output', side_effect=['2.7']):
-            assert service._get_cpu_used_pct(client) == 2.7
+        with patch.object(service, '_read_command_output', side_effect=[first_sample, next_poll]) as read:
+            service._get_cpu_used_pct(client)
+            assert service._get_cpu_used_pct(client) == 40.0
+        assert read.call_args[0][1] == SSHService._CPU_STAT_CMD
+        assert 'sleep' not in SSHService._CPU_STAT_CMD
+
+    def test_get_network_stats_computes_rates_between_polls(self):
+        service = SSHService()
+        client = Mock()
+        header = (
+            "Inter-|   Receive                                                |  Transmit\n"
+            " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+        )
+
+        def net_dev(eth0, wg0):
+            return header + "\n".join(
+                f"{name}: {rx} 10 0 0 0 0 0 0 {tx} 10 0 0 0 0 0 0"
+                for name, (rx, tx) in (('lo', (5, 5)), ('eth0', eth0), ('wg0', wg0))
+            )
+
+        first_sample = (
+            "100.00 180.00\n" + net_dev((1000, 2000), (0, 0)) + "\n"
+            "100.25 180.40\n" + net_dev((263144, 67536), (0, 0))
+        )
+        next_poll = "102.25 190.00\n" + net_dev((4457448, 1116112), (2097152, 0))
+        marker = SSHService._SECTION_MARKER
+        outputs = iter(
+            f"{marker} net_counters\n{sample}\n{marker} vnstat\n"
+            for sample in (first_sample, next_poll)
+        )
+
+        with patch.object(service, 'get_connection_pooled', return_value=client), \
+                patch.object(service, '_read_command_output', side_effect=lambda *a, **kw: next(outputs)), \
+                patch.object(service, '_exec_command', return_value=(Mock(), Mock(read=Mock(return_value=b'')), Mock())), \
+                patch('time.sleep', side_effect=AssertionError('no local sleep expected')):
+            first = service.get_network_stats('127.0.0.1', 'root', 'secret')
+            second = service.get_network_stats('127.0.0.1', 'root', 'secret')
+
+        assert first['interfaces'] == ['eth0', 'wg0']
+        assert first['current'] == {'download': '1.00', 'upload': '0.25', 'unit': 'MB/s'}
+        assert second['current'] == {'download': '3.00', 'upload': '0.50', 'unit': 'MB/s'}
+        assert second['per_interface'] == [
+            {'name': 'eth0', 'download': '2.00', 'upload': '0.50'},
+            {'name': 'wg0', 'download': '1.00', 'upload': '0.00'},
+        ]
+
+    def test_parse_proc_net_dev_without_space_after_colon(self):
+        lines = [
+            "  eth0:1234 5 0 0 0 0 0 0 4321 5 0 0 0 0 0 0",
+            "    lo: 99 1 0 0 0 0 0 0 99 1 0 0 0 0 0 0",
+            "docker0: 7 1 0 0 0 0 0 0 8 1 0 0 0 0 0 0",
+        ]
+
+        assert SSHService._parse_proc_net_dev(lines) == {'eth0': (1234, 4321)}
 
     def test_get_cpu_used_pct_falls_back_to_vmstat(self):
         """Если top не дал распарсить CPU, используется vmstat fallback."""
@@ -351,3 +452,427 @@ class TestSSHService:
 
         with patch.object(service, '_read_command_output', side_effect=['oops', '', '', '97.0']):
             assert service._get_cpu_used_pct(client) == 3.0
+
+    def _stats_sections_fixture(self):
+        return {
+            "uptime": "up 3 days, 4 hours",
+            "os": "Debian GNU/Linux 12 (bookworm)",
+            "nproc": "2",
+            "kernel": "6.1.0-18-amd64",
+            "cpu": "\n".join([
+                "1000.00 1900.00",
+                "cpu  100 0 100 800 0 0 0 0 0 0",
+                "1000.25 1900.45",
+                "cpu  105 0 110 985 0 0 0 0 0 0",
+            ]),
+            "free": "\n".join([
+                "               total        used        free      shared  buff/cache   available",
+                "Mem:            2000         500         301           4        1052        1155",
+                "Swap:              0           0           0",
+            ]),
+            "loadavg": "0.12 0.08 0.02 1/187 4242",
+            "disks": "/dev/vda1 20G 7.1G 12G 38% /",
+            "processes": "PID COMMAND %CPU %MEM\n812 xray 1.2 3.9",
+            "net": "2: eth0    inet 203.0.113.10/24 brd 203.0.113.255 scope global eth0",
+            "docker_version": "Docker version 24.0.7, build afdd53b",
+            "docker_ps": "a1b2c3|headscale|Up 2 days|headscale/headscale:0.23",
+            "app_services": "● telegramonly.service loaded active running TelegramOnly",
+        }
+
+    def _make_stats_client(self, sections):
+        """Клиент, отвечающий на команды разделов и на пакетный скрипт."""
+        by_command = dict(SSHService._stats_section_commands())
+        client = Mock()
+
+        def exec_side_effect(command, timeout=None):
+            if SSHService._SECTION_MARKER in command:
+                output = "\n".join(
+                    "%s %s\n%s" % (SSHService._SECTION_MARKER, name, sections[name])
+                    for name in by_command
+                )
+            else:
+                # Последовательный режим оборачивает команду в _vsm_run <бюджет> '<команда>'
+                name = next(
+                    n for n, c in by_command.items() if c == command or shlex.quote(c) in command
+                )
+                output = sections[name]
+            stdout = Mock()
+            stdout.read.return_value = output.encode('utf-8')
+            stdout.channel.recv_exit_status.return_value = 0
+            return Mock(), stdout, Mock(read=Mock(return_value=b''))
+
+        client.exec_command.side_effect = exec_side_effect
+        return client
+
+    def test_get_server_stats_batched_uses_single_round_trip(self):
+        """Пакетный режим: один exec_command и тот же результат, что и последовательный."""
+        service = SSHService()
+        sections = self._stats_sections_fixture()
+
+        batched_client = self._make_stats_client(sections)
+        with patch.object(service, 'get_connection_pooled', return_value=batched_client):
+            batched = service.get_server_stats('127.0.0.1', 'root', 'secret', batched=True)
+
+        sequential_client = self._make_stats_client(sections)
+        with patch.object(service, 'get_connection_pooled', return_value=sequential_client):
+            sequential = service.get_server_stats('127.0.0.1', 'root', 'secret', batched=False)
+
+        assert batched_client.exec_command.call_count == 1
+        assert sequential_client.exec_command.call_count == len(SSHService._stats_section_commands())
+        assert batched == sequential
+        assert batched['cpu'] == {'cores': 2, 'used_pct': 7.5, 'kernel': '6.1.0-18-amd64'}
+        assert batched['mem'] == {'total_mb': 2000, 'used_mb': 500, 'used_pct': 25.0}
+        assert batched['swap'] == {'total_mb': 0, 'used_mb': 0, 'used_pct': 0}
+        assert batched['disks'][0]['mount'] == '/'
+        assert batched['docker']['containers'][0]['role'] == 'Headscale (координатор)'
+        assert batched['app_services'] == [{
+            'name': 'telegramonly',
+            'display_name': 'TelegramOnly бот/API',
+            'unit_name': 'telegramonly',
+            'status': 'active',
+        }]
+
+    def test_bench_emulation_batched_mode_is_one_round_trip(self):
+        """tools/bench_server_stats.py: заготовленные разделы разбираются без fallback-команд."""
+        import importlib.util
+        import os
+
+        path = os.path.join(os.path.dirname(__file__), '..', '..', 'tools', 'bench_server_stats.py')
+        spec = importlib.util.spec_from_file_location('bench_server_stats', path)
+        bench = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(bench)
+
+        results = bench.run_fake(rtt_ms=0, repeats=3)
+
+        assert results[True][0] == 1
+        assert results[False][0] == len(SSHService._stats_section_commands())
+
+    def test_split_sections_keeps_empty_sections(self):
+        """Пустой раздел (например, docker не установлен) остаётся пустой строкой."""
+        marker = SSHService._SECTION_MARKER
+        output = f"{marker} uptime\nup 1 hour\n{marker} docker_version\n{marker} nproc\n4\n"
+
+        assert SSHService._split_sections(output) == {
+            'uptime': 'up 1 hour',
+            'docker_version': '',
+            'nproc': '4',
+        }
+
+    def test_get_services_stats_uses_single_systemctl_show(self):
+        """Весь каталог сервисов проверяется одним exec, аптайм считается локально."""
+        units = SSHService._catalog_units()
+        props = {
+            'xray': 'LoadState=loaded\nActiveState=active\nUnitFileState=enabled\n'
+                    'ActiveEnterTimestampMonotonic=1000000000',
+            'ssh': 'Id=ssh.service\nLoadState=loaded\nActiveState=active\n'
+                   'UnitFileState=enabled\nActiveEnterTimestampMonotonic=0',
+            'sshd': 'Id=ssh.service\nLoadState=loaded\nActiveState=active\n'
+                    'UnitFileState=alias\nActiveEnterTimestampMonotonic=0',
+            'nginx': 'LoadState=loaded\nActiveState=failed\nUnitFileState=disabled\n'
+                     'ActiveEnterTimestampMonotonic=0',
+        }
+        show_output = '\n\n'.join(
+            props.get(u, f'Id={u}.service\nLoadState=not-found\nActiveState=inactive\n'
+                         'UnitFileState=\nActiveEnterTimestampMonotonic=0')
+            for u in units
+        )
+        marker = SSHService._SECTION_MARKER
+        output = f"{marker} service_units\n{show_output}\n{marker} proc_uptime\n87400.52 170000.00\n"
+        client = Mock()
+        stdout = Mock()
+        stdout.read.return_value = output.encode('utf-8')
+        client.exec_command.return_value = (Mock(), stdout, Mock())
+
+        service = SSHService()
+        with patch.object(service, 'get_connection_pooled', return_value=client):
+            services = {s['name']: s for s in service.get_services_stats('127.0.0.1', 'root', 'secret')}
+
+        assert client.exec_command.call_count == 1
+        assert services['xray']['status'] == 'active'
+        assert services['xray']['enabled'] == 'enabled'
+        assert services['xray']['uptime'] == '1d 0h'  # 87400 - 1000 с от загрузки
+        assert services['ssh']['unit_name'] == 'ssh'
+        assert services['ssh']['uptime'] == 'active'
+        assert services['nginx']['status'] == 'failed'
+        assert services['nginx']['uptime'] == 'stopped'
+        assert services['docker'] == {
+            'name': 'docker', 'display_name': 'Docker', 'group': 'system',
+            'status': 'not_installed', 'enabled': 'not-found', 'uptime': '-',
+            'unit_name': None,
+        }
+
+    def test_get_security_events_reads_journal_incrementally(self):
+        """Первый опрос читает сутки журнала, следующий — только записи после курсора."""
+        SSHService._security_events.reset()
+        service = SSHService()
+        client = Mock()
+        marker = SSHService._SECTION_MARKER
+        polls = iter([
+            f"{marker} now\n1700000000\n"
+            f"{marker} auth\n1699990000.1 203.0.113.5\n1699990001.2 203.0.113.5\n"
+            f"1699990002.3 198.51.100.7\n-- cursor: s=a;i=10\n"
+            f"{marker} errors\n1699990005.0\n-- cursor: s=a;i=8\n",
+            f"{marker} now\n1700000060\n"
+            f"{marker} auth\n1700000030.0 198.51.100.7\n1700000031.0 198.51.100.7\n"
+            f"1700000032.0 \n-- cursor: s=a;i=20\n"
+            f"{marker} errors\n-- No entries --\n",
+        ])
+        scripts = []
+
+        def read_side_effect(_client, command, timeout=30):
+            if marker in command:
+                scripts.append(command)
+                return next(polls)
+            return ''
+
+        with patch.object(service, 'get_connection_pooled', return_value=client), \
+                patch.object(service, '_read_command_output', side_effect=read_side_effect), \
+                patch.object(service, '_exec_command', return_value=(Mock(), Mock(read=Mock(return_value=b'')), Mock())), \
+                patch.object(service, '_get_listening_ports', return_value=[]):
+            service.get_security_events('127.0.0.1', 'root', 'secret')
+            events = service.get_security_events('127.0.0.1', 'root', 'secret')
+
+        assert '--since "24 hours ago"' in scripts[0]
+        assert "--after-cursor='s=a;i=10'" in scripts[1]
+        assert "--after-cursor='s=a;i=8' -p err..alert" in scripts[1]
+        assert events['ssh_failures_24h'] == 6
+        assert events['top_failed_ips'] == [
+            {'ip': '198.51.100.7', 'count': 3},
+            {'ip': '203.0.113.5', 'count': 2},
+        ]
+        assert events['error_events_24h'] == 1
+        SSHService._security_events.reset()
+
+    def test_get_security_events_falls_back_to_one_pass_counters(self):
+        """Без курсоров все счётчики приходят одной JSON-строкой из одного прохода."""
+        SSHService._security_events.reset()
+        service = SSHService()
+        client = Mock()
+        marker = SSHService._SECTION_MARKER
+        commands = []
+
+        def read_side_effect(_client, command, timeout=30):
+            commands.append(command)
+            if marker in command:
+                return f"{marker} now\n1700000000\n{marker} auth\n{marker} errors\n"
+            if command == SSHService._SECURITY_COUNTERS_CMD:
+                return '{"source":"journal","failures":7,"errors":2,"ips":{"198.51.100.7":1,"203.0.113.5":4,"192.0.2.1":1,"192.0.2.9":1}}'
+            return ''
+
+        with patch.object(service, 'get_connection_pooled', return_value=client), \
+                patch.object(service, '_read_command_output', side_effect=read_side_effect), \
+                patch.object(service, '_exec_command', return_value=(Mock(), Mock(read=Mock(return_value=b'')), Mock())), \
+                patch.object(service, '_get_listening_ports', return_value=[]):
+            events = service.get_security_events('127.0.0.1', 'root', 'secret')
+
+        assert sum('journalctl' in c for c in commands) == 2
+        assert events['ssh_failures_24h'] == 7
+        assert events['error_events_24h'] == 2
+        assert events['top_failed_ips'] == [
+            {'ip': '203.0.113.5', 'count': 4},
+            {'ip': '192.0.2.1', 'count': 1},
+            {'ip': '192.0.2.9', 'count': 1},
+        ]
+
+    def test_get_metrics_history_appends_locally_without_remote_writes(self):
+        """Один exec на точку, история из локального хранилища, на сервер ничего не пишется."""
+        from app.services.metrics_store import MetricsStore
+
+        service = SSHService(metrics_store=MetricsStore())
+        client = Mock()
+        marker = SSHService._SECTION_MARKER
+        polls = iter([
+            f"{marker} cpu\n100.00 180.00\ncpu  100 0 100 800 0 0 0 0 0 0\n"
+            f"100.25 180.40\ncpu  102 0 102 841 0 0 0 0 0 0\n{marker} mem\n25.0",
+            f"{marker} cpu\n110.25 190.00\ncpu  402 0 202 1441 0 0 0 0 0 0\n{marker} mem\n30.5",
+        ])
+        commands = []
+
+        def read_side_effect(_client, command, timeout=30):
+            commands.append(command)
+            return next(polls)
+
+        with patch.object(service, 'get_connection_pooled', return_value=client), \
+                patch.object(service, '_read_command_output', side_effect=read_side_effect), \
+                patch('time.time', side_effect=[1000, 1060]):
+            service.get_metrics_history('127.0.0.1', 'root', 'secret')
+            history = service.get_metrics_history('127.0.0.1', 'root', 'secret')
+
+        assert len(commands) == 2
+        assert not any('metrics_history.json' in c for c in commands)
+        client.exec_command.assert_not_called()
+        assert history == [
+            {'timestamp': 1000, 'cpu': 8.9, 'memory': 25.0},
+            {'timestamp': 1060, 'cpu': 40.0, 'memory': 30.5},
+        ]
+
+    def test_monitoring_agent_script_prints_versioned_document(self):
+        """Сгенерированный агент отрабатывает в bash и печатает JSON со всеми разделами."""
+        import subprocess
+        from app.services import monitoring_agent
+
+        script = SSHService.monitoring_agent_script()
+        version = subprocess.run(
+            ['bash', '-c', script, 'agent', '--version'], capture_output=True, text=True
+        ).stdout
+        output = subprocess.run(
+            ['bash', '-c', script], capture_output=True, text=True,
+            env={'VSM_FIRST_SAMPLE': '1', 'PATH': '/usr/bin:/bin'},
+        ).stdout
+
+        assert monitoring_agent.parse_agent_version(version) == {
+            'version': monitoring_agent.AGENT_VERSION,
+            'build': monitoring_agent.agent_build(SSHService.agent_section_commands()),
+        }
+        document = monitoring_agent.parse_agent_document(output)
+        assert set(document['sections']) == {n for n, _ in SSHService.agent_section_commands()}
+        assert len(SSHService._split_counter_samples(document['sections']['cpu'])) == 2
+
+    def test_monitoring_panels_share_one_agent_run(self):
+        """С агентом на хосте все панели мониторинга читают один документ — один exec."""
+        import json
+        from app.services import monitoring_agent
+        from app.services.metrics_store import MetricsStore
+
+        SSHService._security_events.reset()
+        SSHService._samples.clear()
+        sections = {name: '' for name, _ in SSHService.agent_section_commands()}
+        sections.update(self._stats_sections_fixture())
+        sections.update({
+            'net_counters': "100.00 180.00\neth0: 1000 1 0 0 0 0 0 0 2000 1 0 0 0 0 0 0\n"
+                            "100.25 180.40\neth0: 263144 1 0 0 0 0 0 0 67536 1 0 0 0 0 0 0",
+            'listeners': 'tcp|127.0.0.1:8501\nudp|0.0.0.0:443\ntcp|0.0.0.0:22',
+            'ufw': '/usr/sbin/ufw', 'ufw_status': 'active', 'ufw_rules': '22\n443',
+            'ufw_log': '3\nJan  1 UFW BLOCK IN=eth0 SRC=198.51.100.7 DST=203.0.113.10 DPT=23',
+            'now': '1700000000',
+            'auth': '1699990000.1 203.0.113.5\n-- cursor: s=a;i=10',
+            'errors': '-- No entries --',
+            'ports_baseline': 'exists\n22',
+            'mem': '25.0',
+        })
+        document = json.dumps({
+            'agent': 'vsm', 'version': monitoring_agent.AGENT_VERSION, 'build': 'test',
+            'generated_at': 1700000000, 'sections': sections,
+        })
+        client = Mock()
+        stdout = Mock()
+        stdout.read.return_value = document.encode('utf-8')
+        client.exec_command.return_value = (Mock(), stdout, Mock())
+
+        key = 'agent.example:22:root'
+        service = SSHService(metrics_store=MetricsStore())
+        SSHService._client_keys[id(client)] = key
+        SSHService.set_monitoring_agent(key, {'version': monitoring_agent.AGENT_VERSION, 'build': 'test'})
+        try:
+            with patch.object(service, 'get_connection_pooled', return_value=client):
+                args = ('agent.example', 'root', 'secret')
+                stats = service.get_server_stats(*args)
+                network = service.get_network_stats(*args)
+                firewall = service.get_firewall_stats(*args)
+                services = service.get_services_stats(*args)
+                security = service.get_security_events(*args)
+                panels = service.get_webpanels_status(*args)
+                history = service.get_metrics_history(*args)
+        finally:
+            SSHService.set_monitoring_agent(key, None)
+            SSHService._client_keys.pop(id(client), None)
+            SSHService._security_events.reset()
+
+        command = client.exec_command.call_args[0][0]
+        assert client.exec_command.call_count == 1
+        assert command == f"VSM_FIRST_SAMPLE=1 {monitoring_agent.AGENT_PATH}"
+        assert stats['cpu']['used_pct'] == 7.5
+        assert history[-1]['cpu'] == 7.5
+        assert network['current']['download'] == '1.00'
+        assert firewall['backend'] == 'ufw'
+        assert firewall['blocked_24h'] == 3
+        assert firewall['last_blocked']['ip'] == '198.51.100.7'
+        assert len(services) == len(SSHService._service_catalog)
+        assert security['ssh_failures_24h'] == 1
+        assert security['new_open_ports'] == 2  # 8501 и 443 нет в baseline
+        assert [p['running'] for p in panels['panels']] == [True, False]
+
+    def test_metrics_stream_loop_feeds_local_store(self):
+        """Удалённый цикл потока печатает NDJSON; строки становятся точками cpu/memory."""
+        import subprocess
+        from app.services.metrics_store import MetricsStore
+
+        SSHService._samples.clear()
+        proc = subprocess.Popen(
+            ['sh', '-c', SSHService._metrics_stream_command(1)],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            lines = [proc.stdout.readline(), proc.stdout.readline()]
+        finally:
+            proc.kill()
+            proc.wait()
+
+        service = SSHService(metrics_store=MetricsStore())
+        assert 'cpu' not in service._ingest_stream_sample('stream.example:22:root', 'stream.example:22', lines[0])
+        point = service._ingest_stream_sample('stream.example:22:root', 'stream.example:22', lines[1])
+
+        assert 0.0 <= point['cpu'] <= 100.0
+        assert 0.0 < point['memory'] < 100.0
+        history = service.metrics_store.window('stream.example:22', ['cpu', 'memory'])
+        assert history[-1]['memory'] == point['memory']
+        SSHService._samples.clear()
+
+    def test_get_metrics_history_reads_memory_while_stream_is_live(self):
+        from app.services.metrics_store import MetricsStore
+
+        service = SSHService(metrics_store=MetricsStore())
+        service.metrics_store.append('10.0.0.5:22', {'cpu': 12.5, 'memory': 40.0}, timestamp=1000)
+        stream = Mock(connected=True)
+        stream.sample_age.return_value = 1.0
+        SSHService._streams['10.0.0.5:22:root'] = stream
+        try:
+            with patch.object(service, 'get_connection_pooled', side_effect=AssertionError('no exec expected')):
+                history = service.get_metrics_history('10.0.0.5', 'root', 'secret')
+        finally:
+            SSHService._streams.pop('10.0.0.5:22:root', None)
+
+        assert history == [{'timestamp': 1000, 'cpu': 12.5, 'memory': 40.0}]
+        stream.touch.assert_called_once()
+
+    def test_open_metrics_stream_splits_chunks_into_lines(self):
+        import threading
+
+        service = SSHService()
+        channel = Mock()
+        channel.recv.side_effect = [b'{"a"', b':1}\n{"b":2}\n\n{"c"', b':3}\n', b'']
+        client = Mock()
+        client.get_transport.return_value.open_session.return_value = channel
+
+        with patch.object(service, 'get_connection_pooled', return_value=client):
+            lines = list(service._open_metrics_stream('10.0.0.5', 'root', 'secret', 22, threading.Event()))
+
+        assert lines == ['{"a":1}', '{"b":2}', '{"c":3}']
+        assert 'while :' in channel.exec_command.call_args[0][0]
+        channel.close.assert_called_once()
+
+    def test_collectors_share_cached_result_per_host_and_params(self):
+        """С включённым кэшем повторный опрос того же хоста не идёт по SSH."""
+        service = SSHService()
+        SSHService._results.clear()
+        SSHService.configure_result_cache(enabled=True)
+        calls = []
+        try:
+            with patch.object(service, 'get_connection_pooled') as pooled, \
+                    patch.object(service, '_collect_sections', side_effect=lambda *a, **k: calls.append('firewall') or {}), \
+                    patch.object(service, '_parse_firewall_sections', return_value={'status': 'active'}):
+                first = service.get_firewall_stats('10.0.0.1', 'root', 'secret')
+                second = service.get_firewall_stats('10.0.0.1', 'root', 'other-password', timeout=5)
+                other_host = service.get_firewall_stats('10.0.0.2', 'root', 'secret')
+
+            assert first == second == other_host == {'status': 'active'}
+            assert len(calls) == 2
+            assert pooled.call_count == 2
+            stats = SSHService.result_cache_stats()
+            assert (stats['hits'], stats['misses']) == (1, 2)
+
+            SSHService.invalidate_results('10.0.0.1', 22, 'root')
+            assert SSHService.result_cache_stats()['entries'] == 1
+        finally:
+            SSHService.configure_result_cache(enabled=False)
+            SSHService._results.clear()
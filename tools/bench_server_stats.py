@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Бенчмарк SSHService.get_server_stats: команда на раздел vs пакетный режим.
+
+По умолчанию работает на эмуляции SSH-клиента с заданным RTT (без сети):
+каждый exec_command «стоит» один round trip. Команды разделов идут по
+параллельным каналам, поэтому время считается по самой долгой из них. Для замера на живом сервере
+укажите --host (пароль спрашивается интерактивно).
+
+    python tools/bench_server_stats.py --rtt 150
+    python tools/bench_server_stats.py --host 203.0.113.10 --user root --port 22
+"""
+
+import argparse
+import getpass
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ssh_service import SSHService  # noqa: E402
+
+CANNED_SECTIONS = {
+    "uptime": "up 3 days, 4 hours",
+    "os": "Debian GNU/Linux 12 (bookworm)",
+    "nproc": "2",
+    "kernel": "6.1.0-18-amd64",
+    # Два снимка /proc/uptime + строка cpu из /proc/stat (загрузка 7.5%);
+    # отметки времени сдвигает FakeLatencyClient, см. cpu_section
+    "cpu": "\n".join([
+        "{t0:.2f} 7000.00",
+        "cpu  {busy0} 0 0 {idle0} 0 0 0 0",
+        "{t1:.2f} 7000.25",
+        "cpu  {busy1} 0 0 {idle1} 0 0 0 0",
+    ]),
+    "free": "\n".join([
+        "               total        used        free      shared  buff/cache   available",
+        "Mem:            1967         812         301           4        1052        1155",
+        "Swap:           1023          12        1011",
+    ]),
+    "loadavg": "0.12 0.08 0.02 1/187 4242",
+    "disks": "/dev/vda1 20G 7.1G 12G 38% /",
+    "processes": "PID COMMAND %CPU %MEM\n812 xray 1.2 3.9\n655 sshd 0.3 1.1",
+    "net": "2: eth0    inet 203.0.113.10/24 brd 203.0.113.255 scope global eth0",
+    "docker_version": "Docker version 24.0.7, build afdd53b",
+    "docker_ps": "a1b2c3|headscale|Up 2 days|headscale/headscale:0.23",
+    "app_services": "telegramonly.service loaded active running TelegramOnly",
+}
+
+
+def cpu_section(uptime: float) -> str:
+    """Раздел cpu с отметками хоста uptime и uptime + 0.25: 2 ядра, 7.5% занято."""
+    snapshots = {}
+    for i, at in enumerate((uptime, uptime + 0.25)):
+        ticks = int(at * 200 * 100)  # 2 ядра, USER_HZ=100; x100 для точности процента
+        snapshots.update({f"t{i}": at, f"busy{i}": ticks * 75 // 1000, f"idle{i}": ticks * 925 // 1000})
+    return CANNED_SECTIONS["cpu"].format(**snapshots)
+
+
+class _Channel:
+    def recv_exit_status(self):
+        return 0
+
+
+class _Stream:
+    def __init__(self, data: str):
+        self._data = data.encode("utf-8")
+        self.channel = _Channel()
+
+    def read(self):
+        return self._data
+
+
+class FakeLatencyClient:
+    """Эмуляция SSH-клиента: каждый exec_command спит rtt секунд."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        self._by_command = dict(SSHService._stats_section_commands())
+        # Часы хоста: каждый опрос — как будто через 30 с после прошлого
+        self.uptime = 1000.0
+
+    def _section(self, name: str) -> str:
+        if name == "cpu":
+            return cpu_section(self.uptime)
+        return CANNED_SECTIONS.get(name, "")
+
+    def exec_command(self, command, timeout=None):
+        with self._lock:
+            self.round_trips += 1
+            self.uptime += 30.0
+        time.sleep(self.rtt)
+        if SSHService._SECTION_MARKER in command:
+            chunks = []
+            for name in self._by_command:
+                chunks.append(f"{SSHService._SECTION_MARKER} {name}")
+                chunks.append(self._section(name))
+            output = "\n".join(chunks)
+        elif "/proc/stat" in command:
+            # Команда снимка зависит от того, есть ли прошлый снимок хоста
+            output = self._section("cpu")
+        else:
+            name = next((n for n, c in self._by_command.items() if c == command), None)
+            output = self._section(name)
+        return None, _Stream(output), _Stream("")
+
+
+def run_fake(rtt_ms: float, repeats: int):
+    service = SSHService()
+    results = {}
+    for batched in (False, True):
+        client = FakeLatencyClient(rtt_ms / 1000.0)
+        service.get_connection_pooled = lambda *a, **kw: client
+        started = time.perf_counter()
+        for _ in range(repeats):
+            service.get_server_stats("bench", "root", "secret", batched=batched)
+        elapsed = (time.perf_counter() - started) / repeats
+        results[batched] = (client.round_trips // repeats, elapsed)
+    # Весь смысл пакетного режима — один round trip на сбор
+    assert results[True][0] == 1, f"batched mode made {results[True][0]} round trips"
+    return results
+
+
+def run_live(host: str, user: str, port: int, repeats: int):
+    password = getpass.getpass(f"SSH password for {user}@{host}: ")
+    service = SSHService()
+    # Прогрев: подключение не должно попадать в замер
+    service.get_server_stats(host, user, password, port=port)
+    results = {}
+    for batched in (False, True):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            service.get_server_stats(host, user, password, port=port, batched=batched)
+        elapsed = (time.perf_counter() - started) / repeats
+        round_trips = 1 if batched else len(SSHService._stats_section_commands())
+        results[batched] = (round_trips, elapsed)
+    SSHService.close_all()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batched vs sequential get_server_stats")
+    parser.add_argument("--rtt", type=float, default=150.0, help="Emulated RTT in ms (fake mode)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per mode")
+    parser.add_argument("--host", help="Benchmark a real server instead of the emulation")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--port", type=int, default=22)
+    args = parser.parse_args(argv)
+
+    if args.host:
+        results = run_live(args.host, args.user, args.port, args.repeats)
+        print(f"Live server {args.host}:{args.port}")
+    else:
+        results = run_fake(args.rtt, args.repeats)
+        print(f"Emulated link, RTT {args.rtt:.0f} ms")
+
+    seq_trips, seq_time = results[False]
+    batch_trips, batch_time = results[True]
+    print(f"  sequential: {seq_trips:3d} round trips, {seq_time * 1000:8.1f} ms")
+    print(f"  batched:    {batch_trips:3d} round trips, {batch_time * 1000:8.1f} ms")
+    print(f"  saved:      {seq_trips - batch_trips:3d} round trips, "
+          f"{(seq_time - batch_time) * 1000:8.1f} ms ({seq_time / batch_time:.1f}x faster)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())